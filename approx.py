@@ -0,0 +1,294 @@
+"""
+近似聚合：对单表的 COUNT/SUM/AVG 聚合查询只读取确定性抽样的一部分数据，按抽样比例放大结果并给出置信区间。
+
+抽样按"块"进行（整群抽样），同一查询、同一比例每次抽到的块相同，结果可重复：
+- pk_range：单列整数主键时把 [MIN, MAX] 等分为若干块，按块号的哈希选出其中k块，
+  条件为若干段 主键 BETWEEN a AND b，可以走主键范围扫描，读取量约为比例倍；
+- hash：其他有主键的表按 CRC32(主键) % 块数 < k 选块，省去聚合计算和结果传输，但仍需扫描全表。
+从B块中无放回地抽k块时，总量的估计为 B/k * Σ块合计，方差按块合计的样本方差计算（未抽中任何行的块计为0）；
+AVG按比值估计，方差用线性化近似。样本中没有出现的分组不会出现在结果中。
+不支持的查询（多表、子查询、DISTINCT、HAVING、MIN/MAX等）返回原因，由调用方改为精确执行。
+"""
+import math
+import statistics
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from profiler import column_kind
+from sql_rewrite import is_name, match_paren, split_select, strip_alias, tokenize, unquote
+
+_AGGREGATES = ("COUNT", "SUM", "AVG")
+# 块太少时块合计的样本方差不可靠，至少抽这么多块
+MIN_CHOSEN_BLOCKS = 10
+
+
+def _split_commas(tokens, b: int, e: int) -> List[Tuple[int, int]]:
+    items = []
+    depth = 0
+    start = b
+    for k in range(b, e):
+        if tokens[k].kind == "lparen":
+            depth += 1
+        elif tokens[k].kind == "rparen":
+            depth -= 1
+        elif depth == 0 and tokens[k].kind == "comma":
+            items.append((start, k))
+            start = k + 1
+    items.append((start, e))
+    return items
+
+
+def _normalized(sql: str, tokens, b: int, e: int) -> str:
+    return " ".join(t.text for t in tokens[b:e]).lower()
+
+
+def plan_approximate(sql: str, tables: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """分析查询能否近似执行，返回 (查询结构, "") 或 (None, 不能近似的原因)"""
+    text = sql.strip().rstrip(";").strip()
+    tokens = tokenize(text)
+    clauses = split_select(tokens, 0, len(tokens))
+    if clauses is None or "FROM" not in clauses:
+        return None, "只支持单个SELECT语句"
+    if "HAVING" in clauses:
+        return None, "不支持HAVING"
+    if sum(1 for t in tokens if t.kind == "word" and t.text.upper() == "SELECT") > 1:
+        return None, "不支持子查询"
+    if any(t.kind == "word" and t.text.upper() == "DISTINCT" for t in tokens):
+        return None, "不支持DISTINCT"
+
+    _, from_b, from_e = clauses["FROM"]
+    if from_e - from_b not in (1, 2, 3) or not is_name(tokens[from_b]):
+        return None, "只支持单表查询"
+    table = unquote(tokens[from_b])
+    alias = None
+    if from_e - from_b == 3 and tokens[from_b + 1].text.upper() == "AS" and is_name(tokens[from_b + 2]):
+        alias = unquote(tokens[from_b + 2])
+    elif from_e - from_b == 2 and is_name(tokens[from_b + 1]):
+        alias = unquote(tokens[from_b + 1])
+    elif from_e - from_b != 1:
+        return None, "只支持单表查询"
+    columns = tables.get(table)
+    if not isinstance(columns, list):
+        return None, f"未知的表: {table}"
+    pk = [col for col in columns if col.get("key") == "PRI"]
+    if not pk:
+        return None, f"表 {table} 没有主键，无法确定性抽样"
+
+    groups = []
+    if "GROUP BY" in clauses:
+        _, group_b, group_e = clauses["GROUP BY"]
+        groups = [_normalized(text, tokens, b, e) for b, e in _split_commas(tokens, group_b, group_e)]
+
+    outputs = []
+    _, select_b, select_e = clauses["SELECT"]
+    for item_b, item_e in _split_commas(tokens, select_b, select_e):
+        if item_b >= item_e:
+            return None, "选择列表为空"
+        expr_e = strip_alias(tokens, item_b, item_e)
+        if expr_e < item_e:
+            name = unquote(tokens[item_e - 1])
+        elif tokens[item_e - 1].kind in ("ident", "word") and (item_e - item_b == 1 or tokens[item_e - 2].kind == "dot"):
+            name = unquote(tokens[item_e - 1])
+        else:
+            name = text[tokens[item_b].start:tokens[item_e - 1].end]
+        head = tokens[item_b]
+        func = head.text.upper() if head.kind == "word" else ""
+        if item_b + 1 < expr_e and tokens[item_b + 1].kind == "lparen" and match_paren(tokens, item_b + 1) == expr_e - 1:
+            if func in ("MIN", "MAX"):
+                return None, "MIN/MAX无法从样本估计"
+            if func in _AGGREGATES:
+                arg = text[tokens[item_b + 1].end:tokens[expr_e - 1].start].strip()
+                if arg == "*" and func != "COUNT" or not arg:
+                    return None, f"不支持的聚合: {func}({arg})"
+                outputs.append({"name": name, "kind": func.lower(), "arg": arg})
+                continue
+        expr = _normalized(text, tokens, item_b, expr_e)
+        if expr not in groups:
+            return None, f"{name} 既不是COUNT/SUM/AVG聚合也不在GROUP BY中"
+        outputs.append({"name": name, "kind": "group", "expr": text[head.start:tokens[expr_e - 1].end]})
+    if not any(o["kind"] != "group" for o in outputs):
+        return None, "不是聚合查询"
+
+    order = []
+    if "ORDER BY" in clauses:
+        _, order_b, order_e = clauses["ORDER BY"]
+        names = [o["name"].lower() for o in outputs]
+        for b, e in _split_commas(tokens, order_b, order_e):
+            desc = e - b > 1 and tokens[e - 1].text.upper() == "DESC"
+            if e - b > 1 and tokens[e - 1].text.upper() in ("ASC", "DESC"):
+                e -= 1
+            key = unquote(tokens[b]) if e - b == 1 else text[tokens[b].start:tokens[e - 1].end]
+            if tokens[b].kind == "num" and e - b == 1 and 1 <= int(float(key)) <= len(outputs):
+                index = int(float(key)) - 1
+            elif key.lower() in names:
+                index = names.index(key.lower())
+            else:
+                return None, f"ORDER BY只支持输出列: {key}"
+            order.append((index, desc))
+    limit = None
+    if "LIMIT" in clauses:
+        _, limit_b, limit_e = clauses["LIMIT"]
+        if limit_e - limit_b != 1 or tokens[limit_b].kind != "num":
+            return None, "LIMIT只支持单个行数"
+        limit = int(tokens[limit_b].text)
+
+    qualifier = f"`{alias}`." if alias else ""
+    pk_exprs = [f"{qualifier}`{col['name']}`" for col in pk]
+    integer_pk = len(pk) == 1 and column_kind(pk[0].get("type")) == "numeric" and "int" in pk[0]["type"].lower()
+    where = None
+    if "WHERE" in clauses:
+        _, where_b, where_e = clauses["WHERE"]
+        where = text[tokens[where_b].start:tokens[where_e - 1].end]
+    return {
+        "table": table,
+        "from": text[tokens[from_b].start:tokens[from_e - 1].end],
+        "where": where,
+        "group_by": text[tokens[clauses["GROUP BY"][1]].start:tokens[clauses["GROUP BY"][2] - 1].end]
+        if "GROUP BY" in clauses else None,
+        "outputs": outputs,
+        "order": order,
+        "limit": limit,
+        "method": "pk_range" if integer_pk else "hash",
+        "pk": pk_exprs,
+    }, ""
+
+
+def bounds_sql(shape: Dict[str, Any]) -> str:
+    """pk_range抽样需要先取主键范围（走主键索引）"""
+    return f"SELECT MIN({shape['pk'][0]}) AS lo, MAX({shape['pk'][0]}) AS hi FROM {shape['from']}"
+
+
+def _chosen_blocks(table: str, blocks: int, k: int) -> List[int]:
+    ranked = sorted(range(blocks), key=lambda b: zlib.crc32(f"{table}:{b}".encode("utf-8")))
+    return sorted(ranked[:k])
+
+
+def sample_sql(shape: Dict[str, Any], fraction: float, bounds: Tuple[int, int] = None,
+               blocks: int = 1000) -> Tuple[Optional[str], Dict[str, Any]]:
+    """生成按块汇总的抽样查询，返回 (SQL, 抽样设计)；抽样会覆盖全部块时SQL为None，应直接精确执行"""
+    if shape["method"] == "pk_range":
+        lo, hi = int(bounds[0]), int(bounds[1])
+        blocks = max(1, min(blocks, hi - lo + 1))
+    k = min(blocks, max(MIN_CHOSEN_BLOCKS, int(round(blocks * fraction))))
+    design = {"method": shape["method"], "blocks": blocks, "chosen": k, "fraction": round(k / blocks, 6)}
+    if k >= blocks:
+        return None, design
+
+    if shape["method"] == "pk_range":
+        pk = shape["pk"][0]
+        width = -(-(hi - lo + 1) // blocks)
+        chosen = _chosen_blocks(shape["table"], blocks, k)
+        ranges = []
+        for b in chosen:
+            start, end = lo + b * width, lo + (b + 1) * width - 1
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        condition = " OR ".join(f"{pk} BETWEEN {a} AND {b}" for a, b in ranges)
+        whens = " ".join(f"WHEN {pk} <= {lo + (b + 1) * width - 1} THEN {i}" for i, b in enumerate(chosen[:-1]))
+        block_expr = f"CASE {whens} ELSE {k - 1} END" if whens else "0"
+    else:
+        key = shape["pk"][0] if len(shape["pk"]) == 1 else "CONCAT(" + ", '|', ".join(shape["pk"]) + ")"
+        block_expr = f"CRC32({key}) % {blocks}"
+        condition = f"{block_expr} < {k}"
+
+    select = [f"{o['expr']} AS _g{i}" for i, o in enumerate(shape["outputs"]) if o["kind"] == "group"]
+    select += [f"{block_expr} AS _blk", "COUNT(*) AS _n"]
+    for i, o in enumerate(shape["outputs"]):
+        if o["kind"] == "count":
+            select.append(f"COUNT({o['arg']}) AS _a{i}")
+        elif o["kind"] == "sum":
+            select.append(f"SUM({o['arg']}) AS _a{i}")
+        elif o["kind"] == "avg":
+            select += [f"SUM({o['arg']}) AS _a{i}", f"COUNT({o['arg']}) AS _c{i}"]
+    where = f"({shape['where']}) AND ({condition})" if shape["where"] else condition
+    group_by = f"{shape['group_by']}, _blk" if shape["group_by"] else "_blk"
+    return f"SELECT {', '.join(select)} FROM {shape['from']} WHERE {where} GROUP BY {group_by}", design
+
+
+def _number(value: Any) -> float:
+    return float(value) if value is not None else 0.0
+
+
+def _total(values: List[float], blocks: int, z: float) -> Tuple[float, Optional[float]]:
+    """B/k * Σ块合计 及其置信半径（k<2时无法估计方差）"""
+    k = len(values)
+    estimate = blocks / k * sum(values)
+    if k < 2:
+        return estimate, None
+    variance = blocks * blocks * (1 - k / blocks) * statistics.variance(values) / k
+    return estimate, z * math.sqrt(variance)
+
+
+def _ratio(sums: List[float], counts: List[float], blocks: int, z: float) -> Tuple[Optional[float], Optional[float]]:
+    k = len(sums)
+    if not sum(counts):
+        return None, None
+    ratio = sum(sums) / sum(counts)
+    if k < 2:
+        return ratio, None
+    residuals = [s - ratio * c for s, c in zip(sums, counts)]
+    mean_count = sum(counts) / k
+    variance = (1 - k / blocks) * statistics.variance(residuals) / k / (mean_count * mean_count)
+    return ratio, z * math.sqrt(variance)
+
+
+def estimate(shape: Dict[str, Any], design: Dict[str, Any], rows: List[Dict[str, Any]],
+             confidence: float = 0.95) -> Dict[str, Any]:
+    """由按块汇总的样本计算各分组的估计值和置信区间，结果列与原查询一致"""
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    k, blocks = design["chosen"], design["blocks"]
+    groups: Dict[tuple, Dict[int, Dict[str, Any]]] = {}
+    for row in rows:
+        key = tuple(row[f"_g{i}"] for i, o in enumerate(shape["outputs"]) if o["kind"] == "group")
+        groups.setdefault(key, {})[int(row["_blk"])] = row
+    if not groups and not shape["group_by"]:
+        # 没有GROUP BY时即使样本为空也返回一行
+        groups[()] = {}
+
+    results, intervals = [], []
+    sample_rows = 0
+    for key, by_block in groups.items():
+        cells = [by_block.get(b, {}) for b in range(k)]
+        sample_rows += sum(int(_number(cell.get("_n"))) for cell in cells)
+        row, bounds = {}, {}
+        values = iter(key)
+        for i, o in enumerate(shape["outputs"]):
+            if o["kind"] == "group":
+                row[o["name"]] = next(values)
+                continue
+            if o["kind"] == "avg":
+                value, radius = _ratio([_number(c.get(f"_a{i}")) for c in cells],
+                                       [_number(c.get(f"_c{i}")) for c in cells], blocks, z)
+            else:
+                value, radius = _total([_number(c.get(f"_a{i}")) for c in cells], blocks, z)
+            if o["kind"] == "count":
+                observed = sum(_number(c.get(f"_a{i}")) for c in cells)
+                value = int(round(value))
+                low = observed if radius is None else max(observed, value - radius)
+                bounds[o["name"]] = [int(math.floor(low)), None if radius is None else int(math.ceil(value + radius))]
+            elif value is not None:
+                value = round(value, 4)
+                bounds[o["name"]] = [None, None] if radius is None else [round(value - radius, 4), round(value + radius, 4)]
+            else:
+                bounds[o["name"]] = [None, None]
+            row[o["name"]] = value
+        results.append(row)
+        intervals.append(bounds)
+
+    paired = list(zip(results, intervals))
+    for index, desc in reversed(shape["order"]):
+        name = shape["outputs"][index]["name"]
+        paired.sort(key=lambda pair: (pair[0][name] is None, pair[0][name] if pair[0][name] is not None else 0),
+                    reverse=desc)
+    if shape["limit"] is not None:
+        paired = paired[:shape["limit"]]
+    return {
+        "success": True,
+        "results": [pair[0] for pair in paired],
+        "rowCount": len(paired),
+        "bounds": [pair[1] for pair in paired],
+        "approximate": dict(design, applied=True, confidence=confidence, sample_rows=sample_rows,
+                            note="样本中未出现的分组不会出现在结果中" if shape["group_by"] else None),
+    }
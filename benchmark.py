@@ -0,0 +1,541 @@
+"""
+离线端到端基准测试：自然语言 -> SQL -> 查询结果 全链路。
+
+使用本地模拟大模型服务(mock_llm.py)和sqlite替身库(standin_db.py)，
+回放 fixtures/college_questions.json 中的问题以及 query.log 中记录过的SQL，
+依次经过 generate_sql_from_prompt -> query_data，统计各阶段 p50/p95/p99 延迟、吞吐和内存，
+结果保存为JSON，便于不同版本之间对比。
+
+另外 imports 子命令用 `python -X importtime` 统计CLI、GUI、服务端各入口的冷启动导入耗时；
+rewrites 子命令是SQL改写（sql_rewrite.py）的等价性检查：对 fixtures/rewrite_cases.json 中的每条SQL，
+在college替身库上分别执行改写前后的版本，比较结果行的多重集合是否一致、应用的改写规则是否符合预期；
+validation 子命令按替身库的表结构校验 fixtures/validation_cases.json 中的SQL（sql_validator.py），
+检查合法写法不被误报、错误的列名能被发现。
+
+用法:
+  python benchmark.py run --iterations 5 --concurrency 4 --latency-ms 300 --jitter-ms 50
+  python benchmark.py imports --runs 5
+  python benchmark.py compare bench_results/old.json bench_results/new.json
+  python benchmark.py rewrites
+  python benchmark.py validation
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List
+
+DEFAULT_QUESTIONS = os.path.join("fixtures", "college_questions.json")
+DEFAULT_REWRITE_CASES = os.path.join("fixtures", "rewrite_cases.json")
+DEFAULT_VALIDATION_CASES = os.path.join("fixtures", "validation_cases.json")
+RESULTS_DIR = "bench_results"
+STAGES = ["schema", "prompt", "llm", "generate", "query", "total"]
+# 各入口冷启动时需要导入的模块；gui.py导入时就会执行Streamlit页面代码，因此只统计它的依赖
+IMPORT_TARGETS = {
+    "cli": "import cli",
+    "cli_pipeline": "import cli, llm_client, mcp_client",
+    "cli_refine": "import cli, refine",
+    "gui": "import streamlit, pandas, llm_client, mcp_client",
+    "server": "import main",
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法计算百分位"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """汇总一组毫秒级耗时"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(max(values), 3),
+    }
+
+
+def load_workload(questions_path: str, log_path: str = None) -> List[Dict[str, str]]:
+    """读取问题fixture，并把query.log中的每条SQL作为一个回放问题加入负载"""
+    with open(questions_path, "r", encoding="utf-8") as f:
+        items = [dict(item, source="fixture") for item in json.load(f)]
+    if log_path and os.path.exists(log_path):
+        from mcp_client import _parse_logs
+        with open(log_path, "r", encoding="utf-8") as f:
+            entries = _parse_logs(f.readlines())
+        for i, entry in enumerate(entries, 1):
+            items.append({"question": f"日志回放 #{i}", "sql": entry["sql"], "source": "query.log"})
+    return items
+
+
+def scale_fixture(db_path: str, scale: int):
+    """按倍数追加合成的学生和选课记录，放大数据量"""
+    if scale <= 1:
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        students = conn.execute("SELECT dept_name, tot_cred FROM student").fetchall()
+        sections = conn.execute("SELECT course_id, sec_id, semester, year FROM section").fetchall()
+        new_students, new_takes = [], []
+        n = 0
+        for _ in range(scale - 1):
+            for dept_name, tot_cred in students:
+                n += 1
+                sid = str(100000 + n)
+                new_students.append((sid, f"Student{n}", dept_name, tot_cred))
+                for k in range(2):
+                    new_takes.append((sid,) + tuple(sections[(n + k) % len(sections)]) + ("B",))
+        conn.executemany("INSERT INTO student VALUES (?, ?, ?, ?)", new_students)
+        conn.executemany("INSERT INTO takes VALUES (?, ?, ?, ?, ?, ?)", new_takes)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def setup_offline_env(db: str, scale: int):
+    """切换到替身库并导入服务端模块，查询日志写到临时文件，避免污染query.log和examples.jsonl"""
+    os.environ["DB_DRIVER"] = "standin"
+    os.environ["DB_NAME"] = db
+    os.environ["QUERY_LOG_FILE"] = os.path.join(tempfile.gettempdir(), "benchmark_query.log")
+    # 不读写示例库文件，Prompt只用种子示例，保证每次测量的Prompt一致
+    os.environ["EXAMPLE_STORE_FILE"] = ""
+    os.environ["PROFILE_DIR"] = os.path.join(tempfile.gettempdir(), "benchmark_profiles")
+    import standin_db
+    scale_fixture(standin_db.prepare_database(db), scale)
+    import main
+    return main
+
+
+class PipelineRunner:
+    """把llm_client和main串起来执行一条问题，并记录每个阶段的耗时"""
+
+    def __init__(self, server, llm_url: str, parameterize: bool = True):
+        import llm_client
+        self.server = server
+        self.parameterize = parameterize
+        self.llm_client = llm_client
+        self._local = threading.local()
+        llm_client.QWEN_API_URL = llm_url
+        # 列统计在计时前算好，之后每次生成SQL都用同一份画像
+        profile = server.api_profile(refresh=True, wait=60)
+        llm_client.get_profile = lambda database=None, wait=0: profile
+        original_call = llm_client.call_qwen_api
+
+        def timed_call(prompt):
+            start = time.perf_counter()
+            try:
+                return original_call(prompt)
+            finally:
+                self._local.llm_ms = (time.perf_counter() - start) * 1000
+
+        llm_client.call_qwen_api = timed_call
+
+    def run_one(self, item: Dict[str, str]) -> Dict[str, Any]:
+        timings = {}
+        status = "ok"
+        error = None
+        start = time.perf_counter()
+        try:
+            t0 = time.perf_counter()
+            schema = self.server.get_schema()["tables"]
+            timings["schema"] = (time.perf_counter() - t0) * 1000
+
+            self._local.llm_ms = 0.0
+            t0 = time.perf_counter()
+            sql = self.llm_client.generate_sql_from_prompt(item["question"], schema)
+            timings["generate"] = (time.perf_counter() - t0) * 1000
+            timings["llm"] = self._local.llm_ms
+            timings["prompt"] = timings["generate"] - timings["llm"]
+
+            t0 = time.perf_counter()
+            # 与mcp_client一样提取字面量为参数，服务端走预处理语句缓存
+            params = None
+            if self.parameterize:
+                from sql_params import parameterize_sql
+                sql, params = parameterize_sql(sql)
+            result = self.server.query_data(sql, params=params or None)
+            timings["query"] = (time.perf_counter() - t0) * 1000
+            if not result.get("success"):
+                status = "rejected" if str(result.get("error", "")).startswith(("Security", "Cost gate")) else "error"
+                error = result.get("error")
+        except Exception as e:
+            status = "error"
+            error = str(e)
+        timings["total"] = (time.perf_counter() - start) * 1000
+        return {"question": item["question"], "source": item.get("source"), "status": status,
+                "error": error, "timings": timings}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+def max_rss_kb() -> int:
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return 0
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    from mock_llm import MockLLMServer
+
+    server = setup_offline_env(args.db, args.scale)
+    workload = load_workload(args.questions, None if args.no_log else args.log)
+    llm = MockLLMServer({item["question"]: item["sql"] for item in workload},
+                        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed).start()
+    runner = PipelineRunner(server, llm.url, parameterize=not args.no_params)
+    runner.llm_client.FAST_PATH = not args.no_fast_path
+    output = sys.stdout if args.verbose else io.StringIO()
+    if not args.verbose:
+        server.logger.setLevel(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(output):
+            for _ in range(args.warmup):
+                for item in workload:
+                    runner.run_one(item)
+
+            runner.llm_client._fast_path_stats.reset()
+            if args.tracemalloc:
+                tracemalloc.start()
+            jobs = workload * args.iterations
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                records = list(pool.map(runner.run_one, jobs))
+            wall = time.perf_counter() - start
+            traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+            if args.tracemalloc:
+                tracemalloc.stop()
+    finally:
+        llm.stop()
+
+    stages = {stage: summarize([r["timings"][stage] for r in records if stage in r["timings"]]) for stage in STAGES}
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    return {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "db": args.db,
+            "scale": args.scale,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.latency_ms,
+            "llm_jitter_ms": args.jitter_ms,
+            "workload_size": len(workload),
+            "fast_path": not args.no_fast_path,
+            "parameterize": not args.no_params,
+        },
+        "stages": stages,
+        "throughput_qps": round(len(records) / wall, 3) if wall else 0.0,
+        "wall_seconds": round(wall, 3),
+        "statuses": statuses,
+        "memory": {"max_rss_kb": max_rss_kb(), "tracemalloc_peak_bytes": traced_peak},
+        "fast_path": runner.llm_client.fast_path_stats(),
+        "prepared_statements": server.statement_cache_stats(),
+        "errors": [r for r in records if r["status"] == "error"][:20],
+    }
+
+
+def save_results(results: Dict[str, Any], output: str = None, prefix: str = "pipeline") -> str:
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 输出：每行为 self(us) | cumulative(us) | 模块名（缩进表示嵌套层级）"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        modules.append({"module": stripped, "self_us": int(parts[0]), "cumulative_us": int(parts[1]),
+                        "depth": (len(name) - len(stripped)) // 2})
+    return modules
+
+
+def measure_imports(statement: str, runs: int) -> Dict[str, Any]:
+    """在全新解释器中多次执行导入语句，统计进程耗时和导入耗时的中位数"""
+    wall, imports, top = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                              capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        wall.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {"statement": statement, "error": lines[-1] if lines else f"exit {proc.returncode}"}
+        modules = parse_importtime(proc.stderr)
+        roots = [m for m in modules if m["depth"] == 0]
+        imports.append(sum(m["cumulative_us"] for m in roots) / 1000)
+        top = sorted(roots, key=lambda m: m["cumulative_us"], reverse=True)[:10]
+    return {
+        "statement": statement,
+        "runs": runs,
+        "process_ms": round(percentile(wall, 50), 2),
+        "import_ms": round(percentile(imports, 50), 2),
+        "top_modules": [{"module": m["module"], "cumulative_ms": round(m["cumulative_us"] / 1000, 2)} for m in top],
+    }
+
+
+def run_import_benchmark(args) -> Dict[str, Any]:
+    targets = args.targets or list(IMPORT_TARGETS)
+    return {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "runs": args.runs,
+        },
+        "entries": {name: measure_imports(IMPORT_TARGETS[name], args.runs) for name in targets},
+    }
+
+
+def print_import_results(results: Dict[str, Any]):
+    print("=" * 80)
+    print(f"{'入口':<14}{'进程耗时(ms)':>14}{'导入耗时(ms)':>14}  最慢的顶层模块")
+    print("-" * 80)
+    for name, entry in results["entries"].items():
+        if "error" in entry:
+            print(f"{name:<14}{'失败':>14}  {entry['error']}")
+            continue
+        slowest = ", ".join(f"{m['module']}({m['cumulative_ms']})" for m in entry["top_modules"][:3])
+        print(f"{name:<14}{entry['process_ms']:>14.2f}{entry['import_ms']:>14.2f}  {slowest}")
+    print("=" * 80)
+
+
+def print_results(results: Dict[str, Any]):
+    print("=" * 80)
+    print(f"{'阶段':<10}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    print("-" * 80)
+    for stage, s in results["stages"].items():
+        if s.get("count"):
+            print(f"{stage:<10}{s['count']:>8}{s['p50_ms']:>12.2f}{s['p95_ms']:>12.2f}{s['p99_ms']:>12.2f}{s['max_ms']:>12.2f}")
+    print("-" * 80)
+    print(f"吞吐: {results['throughput_qps']} 条/秒，耗时 {results['wall_seconds']} 秒，状态 {results['statuses']}")
+    prepared = results.get("prepared_statements")
+    if prepared and prepared["prepared"] + prepared["hits"]:
+        print(f"预处理语句: PREPARE {prepared['prepared']} 次，缓存命中 {prepared['hits']} 次"
+              f"（{prepared['hit_rate']:.1%}），淘汰 {prepared['evicted']} 次")
+    if results.get("fast_path", {}).get("attempts"):
+        from fast_path import format_stats
+        print(format_stats(results["fast_path"]))
+    memory = results["memory"]
+    print(f"内存: 峰值RSS {memory['max_rss_kb']} KB" +
+          (f"，tracemalloc峰值 {memory['tracemalloc_peak_bytes']} 字节" if memory.get("tracemalloc_peak_bytes") else ""))
+    print("=" * 80)
+
+
+def compare_results(old_path: str, new_path: str):
+    """对比两次运行的各阶段延迟、吞吐和内存"""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    def delta(a, b):
+        if not a:
+            return "   n/a"
+        return f"{(b - a) / a * 100:+7.1f}%"
+
+    if "entries" in old:
+        print("=" * 80)
+        print(f"导入耗时对比: {old_path} ({old['meta'].get('git', '')}) -> {new_path} ({new['meta'].get('git', '')})")
+        print("-" * 80)
+        for name, a in old["entries"].items():
+            b = new["entries"].get(name, {})
+            if "import_ms" not in a or "import_ms" not in b:
+                continue
+            print(f"{name:<14}导入 {a['import_ms']:.2f}->{b['import_ms']:.2f} ({delta(a['import_ms'], b['import_ms'])})  "
+                  f"进程 {a['process_ms']:.2f}->{b['process_ms']:.2f} ({delta(a['process_ms'], b['process_ms'])})")
+        print("=" * 80)
+        return
+
+    print("=" * 80)
+    print(f"对比: {old_path} ({old['meta'].get('git', '')}) -> {new_path} ({new['meta'].get('git', '')})")
+    print("-" * 80)
+    for stage in STAGES:
+        a, b = old["stages"].get(stage, {}), new["stages"].get(stage, {})
+        if not a.get("count") or not b.get("count"):
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cells.append(f"{key[:3]} {a[key]:.2f}->{b[key]:.2f} ({delta(a[key], b[key])})")
+        print(f"{stage:<10}" + "  ".join(cells))
+    print("-" * 80)
+    print(f"吞吐: {old['throughput_qps']} -> {new['throughput_qps']} 条/秒 ({delta(old['throughput_qps'], new['throughput_qps'])})")
+    print(f"峰值RSS: {old['memory']['max_rss_kb']} -> {new['memory']['max_rss_kb']} KB "
+          f"({delta(old['memory']['max_rss_kb'], new['memory']['max_rss_kb'])})")
+    print("=" * 80)
+
+
+def result_multiset(result: Dict[str, Any]) -> List[str]:
+    """查询结果转换为与行顺序无关的可比较形式"""
+    return sorted(json.dumps(row, sort_keys=True, default=str) for row in result["results"])
+
+
+def run_rewrite_checks(args) -> bool:
+    """逐条执行改写前后的SQL并比较结果，全部等价时返回True"""
+    from sql_rewrite import rewrite_sql
+
+    server = setup_offline_env(args.db, 1)
+    server.logger.setLevel(logging.WARNING)
+    schema = server.get_schema()["tables"]
+    with open(args.cases, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+
+    failures = 0
+    print("=" * 80)
+    print(f"{'用例':<28}{'改写规则':<44}{'结果'}")
+    print("-" * 80)
+    for case in cases:
+        rewritten, applied = rewrite_sql(case["sql"], schema, log=False)
+        rules = [info["rule"] for info in applied]
+        problems = []
+        if rules != case.get("expect", rules):
+            problems.append(f"期望规则 {case['expect']}")
+        t0 = time.perf_counter()
+        before = server.query_data(case["sql"])
+        t1 = time.perf_counter()
+        after = server.query_data(rewritten) if applied else before
+        t2 = time.perf_counter()
+        for label, result in (("原SQL", before), ("改写后", after)):
+            if not result.get("success"):
+                problems.append(f"{label}执行失败: {result.get('error')}")
+        if not problems and result_multiset(before) != result_multiset(after):
+            problems.append(f"结果不一致: {before['rowCount']} 行 vs {after['rowCount']} 行")
+        status = "FAIL " + "; ".join(problems) if problems else \
+            f"OK {before['rowCount']} 行 {(t1 - t0) * 1000:.1f}ms -> {(t2 - t1) * 1000:.1f}ms"
+        print(f"{case['name']:<28}{', '.join(rules) or '-':<44}{status}")
+        if problems:
+            failures += 1
+            if args.verbose:
+                print(f"  原SQL:  {case['sql']}\n  改写后: {rewritten}")
+    print("=" * 80)
+    print(f"{len(cases) - failures}/{len(cases)} 个用例通过")
+    return failures == 0
+
+
+def run_validation_checks(args) -> bool:
+    """按替身库表结构校验每条SQL，报错的引用与期望一致时通过"""
+    from sql_validator import validate_sql
+
+    server = setup_offline_env(args.db, 1)
+    server.logger.setLevel(logging.WARNING)
+    schema = server.get_schema()["tables"]
+    with open(args.cases, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+
+    failures = 0
+    print("=" * 80)
+    print(f"{'用例':<28}{'结果'}")
+    print("-" * 80)
+    for case in cases:
+        errors = [error["name"] for error in validate_sql(case["sql"], schema)]
+        ok = errors == case["errors"]
+        print(f"{case['name']:<28}{'OK' if ok else 'FAIL'} {', '.join(errors) or '-'}"
+              + ("" if ok else f"（期望 {', '.join(case['errors']) or '-'}）"))
+        if not ok:
+            failures += 1
+            if args.verbose:
+                print(f"  SQL: {case['sql']}")
+    print("=" * 80)
+    print(f"{len(cases) - failures}/{len(cases)} 个用例通过")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行全链路基准测试")
+    run.add_argument("--db", default="college", help="替身库名称，对应 fixtures/<db>.sql")
+    run.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    run.add_argument("--log", default="query.log", help="回放的查询日志")
+    run.add_argument("--no-log", action="store_true", help="不回放查询日志")
+    run.add_argument("--iterations", type=int, default=3)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--scale", type=int, default=1, help="学生/选课数据放大倍数")
+    run.add_argument("--latency-ms", type=float, default=200)
+    run.add_argument("--jitter-ms", type=float, default=0)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--tracemalloc", action="store_true", help="统计Python堆分配峰值（会增加耗时）")
+    run.add_argument("--output", help="结果JSON路径，默认写到 bench_results/")
+    run.add_argument("--verbose", action="store_true", help="显示流水线中的打印输出")
+    run.add_argument("--no-fast-path", action="store_true", help="关闭规则快速路径，所有问题都调用大模型")
+    run.add_argument("--no-params", action="store_true", help="发送原始SQL，不提取参数走预处理语句")
+
+    imports = sub.add_parser("imports", help="统计各入口冷启动导入耗时")
+    imports.add_argument("--runs", type=int, default=5)
+    imports.add_argument("--targets", nargs="*", choices=list(IMPORT_TARGETS), help="默认统计全部入口")
+    imports.add_argument("--output", help="结果JSON路径，默认写到 bench_results/")
+
+    compare = sub.add_parser("compare", help="对比两次运行结果")
+    compare.add_argument("old")
+    compare.add_argument("new")
+
+    rewrites = sub.add_parser("rewrites", help="检查SQL改写前后结果是否一致")
+    rewrites.add_argument("--db", default="college", help="替身库名称，对应 fixtures/<db>.sql")
+    rewrites.add_argument("--cases", default=DEFAULT_REWRITE_CASES)
+    rewrites.add_argument("--verbose", action="store_true", help="失败时打印改写前后的SQL")
+
+    validation = sub.add_parser("validation", help="检查执行前校验的误报和漏报")
+    validation.add_argument("--db", default="college", help="替身库名称，对应 fixtures/<db>.sql")
+    validation.add_argument("--cases", default=DEFAULT_VALIDATION_CASES)
+    validation.add_argument("--verbose", action="store_true", help="失败时打印SQL")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        results = run_benchmark(args)
+        print_results(results)
+        print(f"结果已保存: {save_results(results, args.output)}")
+    elif args.command == "imports":
+        results = run_import_benchmark(args)
+        print_import_results(results)
+        print(f"结果已保存: {save_results(results, args.output, prefix='imports')}")
+    elif args.command == "compare":
+        compare_results(args.old, args.new)
+    elif args.command == "rewrites":
+        sys.exit(0 if run_rewrite_checks(args) else 1)
+    elif args.command == "validation":
+        sys.exit(0 if run_validation_checks(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
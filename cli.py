@@ -1,6 +1,11 @@
 import os
+import sys
+import json
 import time
-from typing import Dict, Any, Callable
+import threading
+import importlib
+import contextlib
+from typing import Dict, Any, Callable, Iterable, List
 import re
 
 
@@ -38,21 +43,23 @@ def run_cli(
         get_schema_func: Callable[[], Dict[str, Any]],
         query_data_func: Callable[[str], Dict[str, Any]],
         generate_sql_func: Callable[[str, Dict[str, Any]], str],
-        get_logs_func: Callable[[], Any] = None
+        get_logs_func: Callable[[], Any] = None,
+        record_example_func: Callable[[str, str], None] = None,
+        result_cache=None
 ):
-    """运行CLI界面"""
+    """运行CLI界面；传入result_cache（refine.ResultCache）时，查询模式支持在上次结果上追问细化"""
     while True:
         display_menu()
         choice = get_user_choice()
 
         if choice == 1:
-            run_query_mode(get_schema_func, query_data_func, generate_sql_func)
+            run_query_mode(get_schema_func, query_data_func, generate_sql_func, record_example_func, result_cache)
         elif choice == 2:
             display_schema(get_schema_func)
         elif choice == 3:
             display_tables(get_schema_func)
         elif choice == 4:
-            run_query_mode_json(get_schema_func, query_data_func, generate_sql_func)
+            run_query_mode_json(get_schema_func, query_data_func, generate_sql_func, record_example_func)
         elif choice == 5:
             if get_logs_func:
                 display_logs(get_logs_func)
@@ -70,7 +77,9 @@ def run_cli(
 def run_query_mode(
         get_schema_func: Callable[[], Dict[str, Any]],
         query_data_func: Callable[[str], Dict[str, Any]],
-        generate_sql_func: Callable[[str, Dict[str, Any]], str]
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        record_example_func: Callable[[str, str], None] = None,
+        result_cache=None
 ):
     """运行查询模式"""
     clear_screen()
@@ -84,16 +93,27 @@ def run_query_mode(
     if query.lower() == "返回":
         return
 
-    process_query(query, get_schema_func, query_data_func, generate_sql_func)
+    process_query(query, get_schema_func, query_data_func, generate_sql_func, record_example_func, result_cache)
 
 
 def process_query(
         query: str,
         get_schema_func: Callable[[], Dict[str, Any]],
         query_data_func: Callable[[str], Dict[str, Any]],
-        generate_sql_func: Callable[[str, Dict[str, Any]], str]
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        record_example_func: Callable[[str, str], None] = None,
+        result_cache=None
 ):
     """处理用户查询"""
+    refined = result_cache.refine(query) if result_cache else None
+    if refined:
+        print("\n根据上次的结果在本地回答（未调用大模型，未访问数据库）:")
+        for operation in refined["refined"]["operations"]:
+            print(f"  - {operation}")
+        print(f"等价SQL: {refined['sql']}\n")
+        display_query_results(refined)
+        return
+
     print("\n正在生成SQL...")
     schema = get_schema_func()
     sql = generate_sql_func(query, schema)
@@ -107,28 +127,51 @@ def process_query(
     print("正在执行查询...")
 
     result = query_data_func(sql)
+    display_cost(result.get("cost"))
+    display_snapshot(result.get("snapshot"))
 
     if not result["success"]:
         print(f"查询执行错误: {result['error']}")
-        # 自动提示表结构字段
-        if "Unknown column" in result["error"]:
-            table = None
-            # 尝试从SQL中提取表名
-            m = re.search(r"from [`']?(\w+)[`']?", sql, re.IGNORECASE)
-            if m:
-                table = m.group(1)
-            if table:
-                schema = get_schema_func()
-                if table in schema:
-                    print(f"表 {table} 字段如下：")
-                    for col in schema[table]:
-                        print("  - ", col.get('Field') or col.get('name', '未知列名'))
+        display_validation_errors(result, sql, schema)
         input("\n按Enter键继续...")
         return
 
+    if record_example_func:
+        record_example_func(query, sql)
+    if result_cache:
+        result_cache.store(query, sql, result["results"])
     display_query_results(result)
 
 
+def display_validation_errors(result: Dict[str, Any], sql: str, schema: Dict[str, Any]):
+    """显示表名/列名错误及相近名称；服务端没有返回校验结果时用已获取的表结构在本地校验"""
+    errors = result.get("validation_errors")
+    if errors is None and "Unknown" in str(result.get("error", "")):
+        from sql_validator import validate_sql
+        errors = validate_sql(sql, schema)
+    for error in errors or []:
+        hint = f"，可能是: {', '.join(error['suggestions'])}" if error["suggestions"] else ""
+        print(f"  - {error['message']}{hint}")
+
+
+def display_cost(cost: Dict[str, Any]):
+    """显示EXPLAIN成本估算"""
+    if not cost:
+        return
+    print(f"预估扫描行数: {cost.get('estimated_rows_examined', 0)} (阈值 {cost.get('max_rows_examined', '-')})")
+    for warning in cost.get("warnings", []):
+        print(f"  [成本告警] {warning}")
+    print()
+
+
+def display_snapshot(snapshot: Dict[str, Any]):
+    """结果来自物化快照时显示刷新时间和陈旧程度"""
+    if not snapshot:
+        return
+    stale = "，已陈旧" if snapshot.get("stale") else ""
+    print(f"结果来自物化快照（刷新于 {snapshot.get('refreshed_at')}，{snapshot.get('age_seconds')} 秒前{stale}）\n")
+
+
 def display_query_results(result: Dict[str, Any]):
     """显示查询结果（分页，严格等宽表格，支持中英文对齐）"""
     import re
@@ -260,7 +303,8 @@ def display_logs(get_logs_func: Callable[[], Any]):
 def run_query_mode_json(
         get_schema_func: Callable[[], Dict[str, Any]],
         query_data_func: Callable[[str], Dict[str, Any]],
-        generate_sql_func: Callable[[str, Dict[str, Any]], str]
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        record_example_func: Callable[[str, str], None] = None
 ):
     """运行查询模式（输出JSON）"""
     clear_screen()
@@ -274,14 +318,15 @@ def run_query_mode_json(
     if query.lower() == "返回":
         return
 
-    process_query_json(query, get_schema_func, query_data_func, generate_sql_func)
+    process_query_json(query, get_schema_func, query_data_func, generate_sql_func, record_example_func)
 
 
 def process_query_json(
         query: str,
         get_schema_func: Callable[[], Dict[str, Any]],
         query_data_func: Callable[[str], Dict[str, Any]],
-        generate_sql_func: Callable[[str, Dict[str, Any]], str]
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        record_example_func: Callable[[str, str], None] = None
 ):
     """处理用户查询并输出JSON"""
     import json
@@ -298,32 +343,337 @@ def process_query_json(
     print("正在执行查询...")
 
     result = query_data_func(sql)
+    display_cost(result.get("cost"))
+    display_snapshot(result.get("snapshot"))
 
     if not result["success"]:
         print(f"查询执行错误: {result['error']}")
-        # 自动提示表结构字段
-        if "Unknown column" in result["error"]:
-            table = None
-            m = re.search(r"from [`']?(\w+)[`']?", sql, re.IGNORECASE)
-            if m:
-                table = m.group(1)
-            if table:
-                schema = get_schema_func()
-                if table in schema:
-                    print(f"表 {table} 字段如下：")
-                    for col in schema[table]:
-                        print("  - ", col.get('Field') or col.get('name', '未知列名'))
+        display_validation_errors(result, sql, schema)
         input("\n按Enter键继续...")
         return
 
+    if record_example_func:
+        record_example_func(query, sql)
     print("\nJSON结果如下：")
     print(json.dumps(result, ensure_ascii=False, indent=2))
     input("\n按Enter键继续...")
 
 
-if __name__ == "__main__":
-    from llm_client import generate_sql_from_prompt
-    from mcp_client import get_schema, query_data
+class RateLimiter:
+    """令牌桶限速，控制每秒调用大模型的次数；rate<=0 表示不限速"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 先预占令牌，不足部分按速率换算成等待时间
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def read_batch_questions(path: str) -> List[Dict[str, str]]:
+    """读取批量问题：每行一个问题，或JSONL格式 {"id": ..., "question": ...}；path为'-'时读标准输入"""
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    items = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            data = json.loads(line)
+            items.append({"id": str(data.get("id", lineno)), "question": data["question"]})
+        else:
+            items.append({"id": str(lineno), "question": line})
+    return items
+
+
+def load_checkpoint(path: str) -> set:
+    """读取已完成的问题id"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
 
-    print("欢迎使用自然语言数据库查询 CLI！")
-    run_cli(get_schema, query_data, generate_sql_from_prompt)
\ No newline at end of file
+
+def run_batch_item(
+        item: Dict[str, str],
+        schema: Dict[str, Any],
+        query_data_func: Callable[[str], Dict[str, Any]],
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        limiter: RateLimiter,
+        include_results: bool = True,
+        record_example_func: Callable[[str, str], None] = None
+) -> Dict[str, Any]:
+    """执行单个问题：生成SQL -> 执行查询，记录各阶段耗时"""
+    record = {"id": item["id"], "question": item["question"], "sql": None, "success": False}
+    timing = {}
+    start = time.perf_counter()
+    try:
+        limiter.acquire()
+        t0 = time.perf_counter()
+        sql = generate_sql_func(item["question"], schema)
+        timing["generate_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        record["sql"] = sql
+        if "错误" in sql:
+            record["error"] = f"SQL生成错误: {sql}"
+        else:
+            t0 = time.perf_counter()
+            result = query_data_func(sql)
+            timing["query_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            record["success"] = bool(result.get("success"))
+            if record["success"]:
+                if record_example_func:
+                    record_example_func(item["question"], sql)
+                record["rowCount"] = result.get("rowCount", 0)
+                if include_results:
+                    record["results"] = result.get("results", [])
+            else:
+                record["error"] = result.get("error")
+            if result.get("cost"):
+                record["cost"] = result["cost"]
+    except Exception as e:
+        record["error"] = str(e)
+    timing["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    record["timing"] = timing
+    return record
+
+
+def run_batch(
+        items: Iterable[Dict[str, str]],
+        output,
+        get_schema_func: Callable[[], Dict[str, Any]],
+        query_data_func: Callable[[str], Dict[str, Any]],
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        concurrency: int = 4,
+        rate: float = 0,
+        checkpoint_path: str = None,
+        include_results: bool = True,
+        record_example_func: Callable[[str, str], None] = None
+) -> Dict[str, Any]:
+    """并发批量执行问题，结果以JSONL逐条写出；已在检查点中（执行成功）的问题会被跳过"""
+    items = list(items)
+    done = load_checkpoint(checkpoint_path)
+    pending = [item for item in items if item["id"] not in done]
+    skipped_count = len(items) - len(pending)
+    schema = get_schema_func()
+    limiter = RateLimiter(rate)
+    lock = threading.Lock()
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+    stats = {"total": len(pending), "succeeded": 0, "failed": 0, "skipped": skipped_count}
+    totals = []
+
+    def work(item):
+        record = run_batch_item(item, schema, query_data_func, generate_sql_func, limiter, include_results,
+                                record_example_func)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with lock:
+            output.write(line + "\n")
+            output.flush()
+            # 只记录成功的问题，失败的（超时、限流等）重跑时会再试一次
+            if checkpoint and record["success"]:
+                checkpoint.write(item["id"] + "\n")
+                checkpoint.flush()
+            stats["succeeded" if record["success"] else "failed"] += 1
+            totals.append(record["timing"]["total_ms"])
+            finished = stats["succeeded"] + stats["failed"]
+            print(f"[{finished}/{stats['total']}] {item['id']} "
+                  f"{'成功' if record['success'] else '失败'} {record['timing']['total_ms']} ms", file=sys.stderr)
+
+    from concurrent.futures import ThreadPoolExecutor
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+            list(pool.map(work, pending))
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    stats["wall_seconds"] = round(time.perf_counter() - start, 2)
+    if totals:
+        ordered = sorted(totals)
+        stats["p50_ms"] = ordered[len(ordered) // 2]
+        stats["p95_ms"] = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    return stats
+
+
+def batch_main(
+        argv: List[str],
+        get_schema_func: Callable[[], Dict[str, Any]],
+        query_data_func: Callable[[str], Dict[str, Any]],
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        record_example_func: Callable[[str, str], None] = None
+) -> int:
+    """非交互批量模式入口"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="cli.py batch", description="批量执行自然语言查询，结果输出为JSONL")
+    parser.add_argument("--input", "-i", default="-", help="问题文件（每行一个问题或JSONL），'-'表示标准输入")
+    parser.add_argument("--output", "-o", default="-", help="结果JSONL文件，'-'表示标准输出")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="并发数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒最多调用大模型次数，0表示不限")
+    parser.add_argument("--checkpoint", help="检查点文件，默认为 <output>.checkpoint；中断后重跑会跳过已成功的问题，失败的问题重试")
+    parser.add_argument("--no-results", action="store_true", help="只输出SQL和行数，不输出结果数据")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint
+    if not checkpoint_path and args.output != "-":
+        checkpoint_path = args.output + ".checkpoint"
+    items = read_batch_questions(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        # 流水线中的打印信息转到stderr，保证stdout只有JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            stats = run_batch(items, output, get_schema_func, query_data_func, generate_sql_func,
+                              args.concurrency, args.rate, checkpoint_path, not args.no_results,
+                              record_example_func)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(stats, ensure_ascii=False), file=sys.stderr)
+    return 0 if stats["failed"] == 0 else 1
+
+
+def format_watch_event(event: str, data: Dict[str, Any]) -> List[str]:
+    """把监视推送的事件转成输出行：+ 新增、~ 修改、- 删除"""
+    now = data.get("refreshed_at") or time.strftime("%Y-%m-%d %H:%M:%S")
+    if event == "snapshot":
+        return [f"[{now}] 版本 {data['version']}：当前结果 {len(data['snapshot'])} 行（行键: {data.get('key') or '整行'}）"]
+    if event == "delta":
+        lines = [f"[{now}] 版本 {data['version']}：新增 {len(data['inserted'])}，修改 {len(data['updated'])}，"
+                 f"删除 {len(data['deleted'])}"]
+        for mark, rows in (("+", data["inserted"]), ("~", data["updated"]), ("-", data["deleted"])):
+            lines.extend(f"  {mark} {json.dumps(row, ensure_ascii=False, default=str)}" for row in rows)
+        return lines
+    if event == "error":
+        return [f"[{now}] 执行出错: {data.get('error')}"]
+    if event == "stopped":
+        return [f"[{now}] 监视已被删除"]
+    return []
+
+
+def watch_main(
+        argv: List[str],
+        get_schema_func: Callable[[], Dict[str, Any]],
+        generate_sql_func: Callable[[str, Dict[str, Any]], str],
+        register_watch_func: Callable[..., Dict[str, Any]],
+        watch_events_func: Callable[..., Iterable]
+) -> int:
+    """持续监视模式入口：服务端按间隔重新执行查询，这里只输出每次的新增、修改、删除"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="cli.py watch", description="持续监视查询结果的变化，Ctrl+C退出")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sql", help="要监视的SQL")
+    target.add_argument("--question", "-q", help="要监视的自然语言问题（先生成SQL）")
+    parser.add_argument("--interval", type=float, default=30, help="重新执行的间隔（秒）")
+    parser.add_argument("--key", help="行键列，逗号分隔；默认按主键，没有主键时按整行比较")
+    parser.add_argument("--json", action="store_true", help="每个事件输出一行JSON {\"event\", \"data\"}")
+    args = parser.parse_args(argv)
+
+    sql = args.sql
+    if args.question:
+        sql = generate_sql_func(args.question, get_schema_func())
+        if "错误" in sql:
+            print(f"SQL生成错误: {sql}", file=sys.stderr)
+            return 1
+    key = [k.strip() for k in args.key.split(",") if k.strip()] if args.key else None
+    registered = register_watch_func(sql, args.interval, key)
+    if not registered.get("success"):
+        print(f"注册监视失败: {registered.get('error')}", file=sys.stderr)
+        return 1
+    watch = registered["watch"]
+    print(f"监视 {watch['id']}{'（与已有订阅共享）' if not registered.get('created') else ''}: {sql}，"
+          f"每 {watch['interval']:g} 秒执行一次", file=sys.stderr)
+    try:
+        for event, data in watch_events_func(watch["id"]):
+            if args.json:
+                print(json.dumps({"event": event, "data": data}, ensure_ascii=False, default=str), flush=True)
+            else:
+                for line in format_watch_event(event, data):
+                    print(line, flush=True)
+            if event == "stopped":
+                return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def print_fast_path_stats(stream):
+    """退出时报告快速路径命中率；没有生成过SQL（llm_client未加载）时不输出"""
+    llm_client = sys.modules.get("llm_client")
+    if llm_client is None:
+        return
+    stats = llm_client.fast_path_stats()
+    if stats["attempts"]:
+        from fast_path import format_stats
+        print(format_stats(stats), file=stream)
+
+
+def _lazy(module: str, name: str) -> Callable:
+    """延迟导入：首次调用时才加载模块（及其依赖的requests等），缩短CLI冷启动时间"""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+    return call
+
+
+class _LazyResultCache:
+    """与refine.ResultCache接口相同；只记下上次的结果，第一次追问时才导入refine（pandas），不拖慢CLI冷启动"""
+
+    def __init__(self):
+        self._cache = None
+        self._last = None
+
+    def store(self, question: str, sql: str, rows: List[Dict[str, Any]], complete: bool = True):
+        if self._cache is not None:
+            self._cache.store(question, sql, rows, complete)
+        else:
+            self._last = (question, sql, rows, complete)
+
+    def refine(self, question: str, load_rows: Callable[[str], Any] = None) -> Any:
+        if self._cache is None:
+            if self._last is None:
+                return None
+            from refine import ResultCache
+            self._cache = ResultCache()
+            self._cache.store(*self._last)
+            self._last = None
+        return self._cache.refine(question, load_rows)
+
+
+def main(argv: List[str] = None) -> int:
+    """CLI入口：只通过HTTP访问MCP Server，不导入MySQLdb/FastAPI/MCP等服务端依赖"""
+    argv = sys.argv[1:] if argv is None else argv
+    get_schema = _lazy("mcp_client", "get_schema")
+    query_data = _lazy("mcp_client", "query_data")
+    get_logs = _lazy("mcp_client", "get_logs")
+    generate_sql_from_prompt = _lazy("llm_client", "generate_sql_from_prompt")
+    record_example = _lazy("llm_client", "record_example")
+
+    if argv and argv[0] == "batch":
+        code = batch_main(argv[1:], get_schema, query_data, generate_sql_from_prompt, record_example)
+        print_fast_path_stats(sys.stderr)
+        return code
+    if argv and argv[0] == "watch":
+        return watch_main(argv[1:], get_schema, generate_sql_from_prompt, _lazy("mcp_client", "register_watch"),
+                          _lazy("mcp_client", "watch_events"))
+    print("进入命令行自然语言查询模式")
+    run_cli(get_schema, query_data, generate_sql_from_prompt, get_logs, record_example, _LazyResultCache())
+    print_fast_path_stats(sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
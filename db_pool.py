@@ -0,0 +1,157 @@
+"""
+数据库连接池：复用MySQL连接，避免每个请求都重新建立TCP连接和认证。
+
+借出时对空闲较久的连接做ping检查，归还时回滚未结束的事务；
+回滚失败或调用方明确要求丢弃的连接会被关闭，不会回到池中。
+"""
+import collections
+import contextlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("mysql-mcp-server")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect: Callable[[], Any], max_size: int = 10, min_size: int = 0,
+                 acquire_timeout: float = 10.0, ping_after: float = 30.0, max_idle: float = 600.0):
+        self._connect = connect
+        self.max_size = max(max_size, 1)
+        self.min_size = min(max(min_size, 0), self.max_size)
+        self.acquire_timeout = acquire_timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self._idle = collections.deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def acquire(self, timeout: float = None):
+        """借出一个连接；池满时最多等待timeout秒（默认acquire_timeout，0为不等待）"""
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        while True:
+            conn = None
+            idle_since = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"Timed out waiting for a database connection (pool size {self.max_size})")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            idle_for = time.monotonic() - idle_since
+            if idle_for > self.max_idle:
+                self._discard(conn)
+                continue
+            if idle_for > self.ping_after:
+                try:
+                    conn.ping()
+                except Exception:
+                    logger.info("Discarding stale pooled connection")
+                    self._discard(conn)
+                    continue
+            return conn
+
+    def release(self, conn, discard: bool = False):
+        """归还连接：先回滚未结束的事务，失败或要求丢弃时关闭连接"""
+        if conn is None:
+            return
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                self._cond.notify()
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._close_quietly(conn)
+
+    def connect_direct(self):
+        """建立一条不计入连接池的连接，用于KILL QUERY等旁路操作，调用方负责关闭"""
+        return self._connect()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def warm(self, count: int = None) -> int:
+        """预先建立连接放入池中，返回当前空闲连接数"""
+        count = self.min_size if count is None else min(count, self.max_size)
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) >= count or self._size >= self.max_size:
+                    return len(self._idle)
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "closed": self._closed,
+            }
@@ -0,0 +1,173 @@
+"""
+只读副本负载均衡：query_data 等只读请求按加权最少连接分配到健康的副本上。
+
+后台线程定期对每个副本执行 SHOW REPLICA STATUS（旧版本为 SHOW SLAVE STATUS），
+连接失败、复制线程停止或延迟超过阈值的副本会被摘除；
+没有可用副本时读请求自动回落到主库，副本恢复后重新加入。
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from db_pool import ConnectionPool, PoolTimeout
+
+logger = logging.getLogger("mysql-mcp-server")
+
+PRIMARY = "primary"
+
+
+def parse_replicas(spec: str) -> List[Dict[str, Any]]:
+    """解析 DB_REPLICAS 环境变量，格式为 host[:port][*weight]，多个副本用逗号分隔"""
+    replicas = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        weight = 1
+        if "*" in item:
+            item, weight = item.rsplit("*", 1)
+        host, _, port = item.partition(":")
+        replica = {"host": host, "weight": int(weight)}
+        if port:
+            replica["port"] = int(port)
+        replicas.append(replica)
+    return replicas
+
+
+class Node:
+    def __init__(self, name: str, pool: ConnectionPool, weight: int = 1, primary: bool = False):
+        self.name = name
+        self.pool = pool
+        self.weight = max(int(weight), 1)
+        self.primary = primary
+        # 副本在第一次健康检查通过前不接收流量
+        self.healthy = primary
+        self.lag = 0 if primary else None
+        self.error = None
+        self.checked_at = None
+
+    def load(self) -> float:
+        return (self.pool.stats()["in_use"] + 1) / self.weight
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "primary": self.primary, "healthy": self.healthy, "lag_seconds": self.lag,
+                "weight": self.weight, "error": self.error, "checked_at": self.checked_at, **self.pool.stats()}
+
+
+def replication_lag(conn) -> Optional[float]:
+    """返回副本延迟秒数；不是副本时返回0，复制线程停止时返回None"""
+    cursor = conn.cursor()
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        if not isinstance(row, dict):
+            row = dict(zip([d[0] for d in cursor.description], row))
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+    finally:
+        cursor.close()
+
+
+class ReplicaSet:
+    def __init__(self, primary_pool: ConnectionPool, replicas: List[Node],
+                 max_lag: float = 30.0, check_interval: float = 5.0):
+        self.primary = Node(PRIMARY, primary_pool, primary=True)
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run_checks, daemon=True)
+        self._thread.start()
+
+    def nodes(self) -> List[Node]:
+        return [self.primary] + self.replicas
+
+    def choose(self) -> Node:
+        """加权最少连接：(借出连接数+1)/权重 最小的健康副本，没有则回落到主库"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else self.primary
+
+    def candidates(self) -> List[Node]:
+        """健康的副本，按 (借出连接数+1)/权重 从小到大排列"""
+        nodes = [node for node in self.replicas if node.healthy]
+        return sorted(nodes, key=lambda node: (node.load(), random.random()))
+
+    def acquire(self):
+        """借出一个只读连接，返回 (连接, 节点)；按负载依次尝试健康的副本，都借不到时改用主库。
+        连接失败的副本被摘除；副本连接池已满（PoolTimeout）只说明繁忙，不等待也不改变其健康状态"""
+        for node in self.candidates():
+            try:
+                return node.pool.acquire(timeout=0), node
+            except PoolTimeout:
+                continue
+            except Exception as e:
+                self.mark_down(node, str(e))
+        return self.primary.pool.acquire(), self.primary
+
+    def mark_down(self, node: Node, error: str):
+        if node.healthy:
+            logger.warning(f"Replica {node.name} removed from rotation: {error}")
+        node.healthy = False
+        node.error = error
+
+    def check(self, node: Node):
+        """检查一个副本；池中没有空闲连接时另建一条连接检查，繁忙不等于故障，也不占用业务连接"""
+        conn = None
+        direct = False
+        try:
+            try:
+                conn = node.pool.acquire(timeout=0)
+            except PoolTimeout:
+                conn, direct = node.pool.connect_direct(), True
+            lag = replication_lag(conn)
+        except Exception as e:
+            if direct:
+                conn.close()
+            elif conn is not None:
+                node.pool.release(conn, discard=True)
+            node.lag = None
+            self.mark_down(node, str(e))
+            return
+        finally:
+            node.checked_at = time.time()
+        if direct:
+            conn.close()
+        else:
+            node.pool.release(conn)
+        node.lag = lag
+        if lag is None:
+            self.mark_down(node, "replication is not running")
+        elif lag > self.max_lag:
+            self.mark_down(node, f"replication lag {lag:.0f}s exceeds {self.max_lag:.0f}s")
+        else:
+            if not node.healthy:
+                logger.info(f"Replica {node.name} back in rotation (lag {lag:.0f}s)")
+            node.healthy = True
+            node.error = None
+
+    def _run_checks(self):
+        while True:
+            for node in self.replicas:
+                if self._stop.is_set():
+                    return
+                self.check(node)
+            if self._stop.wait(self.check_interval):
+                return
+
+    def in_use(self) -> int:
+        return sum(node.pool.stats()["in_use"] for node in self.replicas)
+
+    def close(self):
+        self._stop.set()
+        for node in self.replicas:
+            node.pool.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [node.stats() for node in self.replicas]
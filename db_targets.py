@@ -0,0 +1,216 @@
+"""
+多数据库路由：按名称管理多个连接目标，每个目标有独立的连接池和表结构缓存。
+
+目标配置来自JSON文件（DB_TARGETS_FILE），格式：
+    {
+      "default": "college",
+      "targets": {
+        "college": {"host": "...", "port": 3306, "user": "...", "password_env": "COLLEGE_DB_PASSWORD", "db": "college"},
+        "hr": {"host": "...", "user": "...", "password": "...", "db": "hr", "pool_size": 4}
+      }
+    }
+password_env 表示从环境变量读取密码；pool_size / pool_min 可覆盖全局连接池大小。
+目标可带只读副本列表 "replicas": [{"host": "...", "port": 3306, "weight": 2}]，
+副本未填写的字段沿用主库配置，只读请求按 db_replicas.ReplicaSet 的策略分配。
+
+连接池在第一次使用时才创建；超过idle_seconds未使用、或活跃目标数超过max_active时，
+最久未使用且没有借出连接的目标会被关闭，下次访问时重新建立。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from db_pool import ConnectionPool
+from db_replicas import Node, ReplicaSet, PRIMARY
+
+logger = logging.getLogger("mysql-mcp-server")
+
+# 只用于连接池配置、不传给驱动connect()的字段
+POOL_KEYS = ("pool_size", "pool_min", "password_env", "replicas", "weight", "name")
+
+
+class UnknownDatabase(KeyError):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = name
+
+    def __str__(self):
+        return f"Unknown database: {self.name}"
+
+
+def load_targets(path: str) -> Dict[str, Any]:
+    """读取目标配置文件，返回 {"default": 名称, "targets": {名称: 配置}}"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    targets = data.get("targets") or {}
+    if not targets:
+        raise ValueError(f"No targets defined in {path}")
+    default = data.get("default") or next(iter(targets))
+    if default not in targets:
+        raise ValueError(f"Default target {default} is not defined in {path}")
+    return {"default": default, "targets": targets}
+
+
+def connect_kwargs(config: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉连接池字段并解析password_env，得到传给驱动的参数"""
+    kwargs = {k: v for k, v in config.items() if k not in POOL_KEYS}
+    if config.get("password_env"):
+        kwargs["password"] = os.getenv(config["password_env"], "")
+    if "port" in kwargs:
+        kwargs["port"] = int(kwargs["port"])
+    return kwargs
+
+
+class Target:
+    def __init__(self, name: str, config: Dict[str, Any], pool: ConnectionPool,
+                 replicas: Optional[ReplicaSet] = None):
+        self.name = name
+        self.config = config
+        self.pool = pool
+        self.replicas = replicas
+        self.last_used = time.monotonic()
+        # 表结构缓存，与连接池同生命周期
+        self.schema = None
+        self.schema_loaded_at = 0.0
+        self.schema_lock = threading.Lock()
+
+    @property
+    def database(self) -> str:
+        return self.config.get("db", self.name)
+
+    def in_use(self) -> int:
+        in_use = self.pool.stats()["in_use"]
+        if self.replicas:
+            in_use += self.replicas.in_use()
+        return in_use
+
+    def close(self):
+        if self.replicas:
+            self.replicas.close()
+        self.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.pool.stats()
+        if self.replicas:
+            stats["replicas"] = self.replicas.stats()
+        return stats
+
+
+class TargetRegistry:
+    def __init__(self, targets: Dict[str, Dict[str, Any]], default: str,
+                 connect: Callable[[Dict[str, Any]], Any], pool_size: int = 10, pool_min: int = 0,
+                 max_active: int = 16, idle_seconds: float = 600.0,
+                 replica_max_lag: float = 30.0, replica_check_interval: float = 5.0):
+        self.configs = targets
+        self.default = default
+        self._connect = connect
+        self.pool_size = pool_size
+        self.pool_min = pool_min
+        self.max_active = max(max_active, 1)
+        self.idle_seconds = idle_seconds
+        self.replica_max_lag = replica_max_lag
+        self.replica_check_interval = replica_check_interval
+        self._active = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        return list(self.configs)
+
+    def get(self, name: Optional[str] = None) -> Target:
+        """取得目标，必要时创建连接池；顺带回收空闲目标"""
+        name = name or self.default
+        if name not in self.configs:
+            raise UnknownDatabase(name)
+        evicted = []
+        with self._lock:
+            target = self._active.get(name)
+            if target is None:
+                config = self.configs[name]
+                pool = self._make_pool(config)
+                replicas = None
+                if config.get("replicas"):
+                    nodes = []
+                    for replica in config["replicas"]:
+                        merged = {**config, **replica}
+                        node_name = replica.get("name") or f"{merged.get('host')}:{merged.get('port', 3306)}"
+                        nodes.append(Node(node_name, self._make_pool(merged), replica.get("weight", 1)))
+                    replicas = ReplicaSet(pool, nodes, self.replica_max_lag, self.replica_check_interval)
+                target = Target(name, config, pool, replicas)
+                self._active[name] = target
+                logger.info(f"Opened database target {name}")
+            target.last_used = time.monotonic()
+            evicted = self._evict_locked()
+        for old in evicted:
+            old.close()
+        return target
+
+    def _make_pool(self, config: Dict[str, Any]) -> ConnectionPool:
+        kwargs = connect_kwargs(config)
+        return ConnectionPool(lambda: self._connect(kwargs),
+                              max_size=int(config.get("pool_size", self.pool_size)),
+                              min_size=int(config.get("pool_min", self.pool_min)))
+
+    def _evict_locked(self) -> List[Target]:
+        now = time.monotonic()
+        candidates = sorted(
+            (t for t in self._active.values()
+             if t.name != self.default and t.in_use() == 0),
+            key=lambda t: t.last_used)
+        evicted = []
+        for target in candidates:
+            over_limit = len(self._active) > self.max_active
+            if not over_limit and now - target.last_used < self.idle_seconds:
+                break
+            del self._active[target.name]
+            evicted.append(target)
+            logger.info(f"Evicted idle database target {target.name}")
+        return evicted
+
+    def acquire(self, name: Optional[str] = None, read_only: bool = False):
+        """从目标借出连接；read_only时优先分配到副本。记录连接所属的池和节点以便归还"""
+        target = self.get(name)
+        if read_only and target.replicas:
+            conn, node = target.replicas.acquire()
+            owner = (node.pool, node.name)
+        else:
+            conn = target.pool.acquire()
+            owner = (target.pool, PRIMARY)
+        with self._lock:
+            self._owners[id(conn)] = owner
+        return conn
+
+    def served_by(self, conn) -> Optional[str]:
+        """连接来自哪个节点（primary 或副本名称）"""
+        with self._lock:
+            owner = self._owners.get(id(conn))
+        return owner[1] if owner else None
+
+    def side_connection(self, conn):
+        """到与conn相同节点的一条独立连接（不占用连接池），用于KILL QUERY"""
+        with self._lock:
+            owner = self._owners.get(id(conn))
+        if owner is None:
+            raise ValueError("Connection is not borrowed from any pool")
+        return owner[0].connect_direct()
+
+    def release(self, conn, discard: bool = False):
+        with self._lock:
+            owner = self._owners.pop(id(conn), None)
+        if owner is not None:
+            owner[0].release(conn, discard)
+
+    def close(self):
+        with self._lock:
+            targets = list(self._active.values())
+            self._active.clear()
+        for target in targets:
+            target.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = {name: t.stats() for name, t in self._active.items()}
+        return {"default": self.default, "configured": len(self.configs), "active": active}
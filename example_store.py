@@ -0,0 +1,273 @@
+"""
+少样本示例库：保存执行成功的 问题/SQL 对，生成SQL时按问题相似度挑选最相关的示例放进Prompt。
+
+- 相似度：问题文本的TF-IDF向量余弦相似度。中文按单字和相邻二字切分（不需要分词），英文按单词，
+  倒排索引在本地计算，示例变化后重建；
+- 预算：按估算的token数累加，最多k条且不超过token预算；
+- 过期：表结构（表名和列名）变化后用 sql_validator 重新校验全部示例，引用了已不存在的表或列的示例被删除；
+- 持久化：只追加的JSONL日志（新增/更新示例、被使用、删除各记一行），多个进程共用同一文件时在文件锁内
+  先读入其他进程追加的记录再追加，互不覆盖；加载时过时记录太多则压缩为每个示例一行。
+  超过上限时淘汰最久未被使用的示例。
+内置的种子示例在相关示例不足时补位，同样要通过当前表结构的校验。
+"""
+import contextlib
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from sql_validator import validate_sql
+
+# 日志行数超过示例数的两倍且不少于该值时，加载时压缩
+_COMPACT_MIN_LINES = 200
+
+SEED_EXAMPLES = [
+    {"question": "列出所有学生的姓名和总学分", "sql": "SELECT name, tot_cred FROM student;"},
+    {"question": "查询所有课程的名称和学分", "sql": "SELECT title, credits FROM course;"},
+    {"question": "找出所有有多个先修课程的课程",
+     "sql": "SELECT course_id FROM prereq GROUP BY course_id HAVING COUNT(*) > 1;"},
+    {"question": "查询所有有多个导师的学生姓名",
+     "sql": "SELECT s.name FROM student s JOIN advisor a ON s.ID = a.s_ID GROUP BY s.ID, s.name HAVING COUNT(a.i_ID) > 1;"},
+    {"question": "查找课程'International Finance'的先修课程标题",
+     "sql": "SELECT c2.title FROM course c1 JOIN prereq p ON c1.course_id = p.course_id "
+            "JOIN course c2 ON p.prereq_id = c2.course_id WHERE c1.title = 'International Finance';"},
+]
+
+_CJK_RE = re.compile(r"[一-鿿]+")
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+
+
+def terms(text: str) -> List[str]:
+    """中文取单字和相邻二字，其他取单词"""
+    text = text.lower()
+    result = []
+    for run in _CJK_RE.findall(text):
+        result.extend(run)
+        result.extend(run[i:i + 2] for i in range(len(run) - 1))
+    result.extend(_WORD_RE.findall(_CJK_RE.sub(" ", text)))
+    return result
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文每字约1个，其他约4个字符1个"""
+    cjk = sum(len(run) for run in _CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """跨进程互斥；锁在单独的文件上，日志文件被压缩替换后仍是同一把锁（没有fcntl的平台上不加锁）"""
+    with open(f"{path}.lock", "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def schema_fingerprint(schema: Dict[str, Any]) -> str:
+    tables = schema.get("tables") if isinstance(schema.get("tables"), dict) else schema
+    shape = sorted((table.lower(), sorted(str(col.get("name") or col.get("Field")).lower()
+                                          for col in cols if isinstance(col, dict)))
+                   for table, cols in tables.items() if isinstance(cols, list))
+    return hashlib.sha1(json.dumps(shape).encode("utf-8")).hexdigest()
+
+
+class ExampleStore:
+    def __init__(self, path: str, max_examples: int = 500, seeds: List[Dict[str, str]] = None):
+        self.path = path
+        self.max_examples = max_examples
+        self.examples: List[Dict[str, Any]] = []
+        self.seeds = [dict(seed, source="seed") for seed in (seeds if seeds is not None else SEED_EXAMPLES)]
+        self._active_seeds = list(self.seeds)
+        self._schema_key = None
+        self._index = None
+        self._by_question: Dict[str, Dict[str, Any]] = {}
+        self._inode = None
+        self._offset = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        with self._lock, _file_lock(self.path):
+            lines = self._read_new()
+            if lines > max(2 * len(self.examples), _COMPACT_MIN_LINES):
+                self._compact()
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record.get("op", "add")
+        existing = self._by_question.get(record["question"])
+        if op == "use":
+            if existing:
+                existing["last_used"] = max(existing["last_used"], record["at"])
+                existing["uses"] = existing.get("uses", 0) + 1
+        elif op == "delete":
+            if existing:
+                self.examples.remove(existing)
+                del self._by_question[record["question"]]
+        elif existing:
+            existing.update(sql=record["sql"], added_at=record["added_at"], last_used=record["last_used"])
+        else:
+            example = {"question": record["question"], "sql": record["sql"], "added_at": record["added_at"],
+                       "last_used": record["last_used"], "uses": record.get("uses", 0)}
+            self.examples.append(example)
+            self._by_question[example["question"]] = example
+
+    def _read_new(self) -> int:
+        """读入日志中上次读取之后追加的记录（调用方持有文件锁），返回读到的行数；
+        文件被其他进程压缩替换过时从头重新读取"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self.examples, self._by_question = [], {}
+            self._inode, self._offset = stat.st_ino, 0
+        if stat.st_size == self._offset:
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+        lines = [line for line in data.decode("utf-8").splitlines() if line.strip()]
+        for line in lines:
+            self._apply(json.loads(line))
+        self._index = None
+        return len(lines)
+
+    def _append(self, records: List[Dict[str, Any]]):
+        """应用并追加记录；先读入其他进程追加的记录，不会覆盖它们写入的示例"""
+        if not self.path:
+            for record in records:
+                self._apply(record)
+            return
+        with _file_lock(self.path):
+            self._read_new()
+            for record in records:
+                self._apply(record)
+            with open(self.path, "ab") as f:
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+                self._offset = f.tell()
+                self._inode = os.fstat(f.fileno()).st_ino
+        self._index = None
+
+    def _compact(self):
+        """把日志重写为每个示例一行（调用方持有文件锁）"""
+        self.examples.sort(key=lambda e: e["last_used"], reverse=True)
+        for example in self.examples[self.max_examples:]:
+            del self._by_question[example["question"]]
+        del self.examples[self.max_examples:]
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self.examples).encode("utf-8"))
+        os.replace(tmp, self.path)
+        stat = os.stat(self.path)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+        self._index = None
+
+    def _sync(self):
+        if self.path:
+            with _file_lock(self.path):
+                self._read_new()
+
+    def add(self, question: str, sql: str):
+        """记录一条执行成功的问题/SQL；同一问题只保留最新的SQL"""
+        question = " ".join(question.split())
+        now = time.time()
+        with self._lock:
+            self._append([{"question": question, "sql": sql, "added_at": now, "last_used": now, "uses": 0}])
+            if len(self.examples) > self.max_examples:
+                ranked = sorted(self.examples, key=lambda e: e["last_used"], reverse=True)
+                self._append([{"op": "delete", "question": e["question"]} for e in ranked[self.max_examples:]])
+
+    def refresh_schema(self, schema: Dict[str, Any]) -> int:
+        """表结构变化时删除不再有效的示例，返回删除的数量"""
+        key = schema_fingerprint(schema)
+        with self._lock:
+            if key == self._schema_key:
+                return 0
+            invalid = [e for e in self.examples if validate_sql(e["sql"], schema)]
+            self._active_seeds = [s for s in self.seeds if not validate_sql(s["sql"], schema)]
+            self._schema_key = key
+            self._index = None
+            if invalid:
+                self._append([{"op": "delete", "question": e["question"]} for e in invalid])
+            return len(invalid)
+
+    def _build_index(self):
+        docs = self.examples + self._active_seeds
+        postings = {}
+        for doc_id, example in enumerate(docs):
+            counts = {}
+            for term in terms(example["question"]):
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc_id, count))
+        idf = {term: math.log((1 + len(docs)) / (1 + len(plist))) + 1 for term, plist in postings.items()}
+        norms = [0.0] * len(docs)
+        for term, plist in postings.items():
+            for doc_id, count in plist:
+                norms[doc_id] += (count * idf[term]) ** 2
+        self._index = {"docs": docs, "postings": postings, "idf": idf, "norms": [math.sqrt(n) or 1.0 for n in norms]}
+
+    def search(self, question: str) -> List[tuple]:
+        """按余弦相似度返回 [(分数, 示例)]，分数从高到低"""
+        with self._lock:
+            if self._index is None:
+                self._build_index()
+            index = self._index
+            query = {}
+            for term in terms(question):
+                if term in index["idf"]:
+                    query[term] = query.get(term, 0) + 1
+            scores = {}
+            for term, count in query.items():
+                weight = count * index["idf"][term]
+                for doc_id, doc_count in index["postings"][term]:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * doc_count * index["idf"][term]
+            query_norm = math.sqrt(sum((c * index["idf"][t]) ** 2 for t, c in query.items())) or 1.0
+            ranked = [(score / (index["norms"][doc_id] * query_norm), index["docs"][doc_id])
+                      for doc_id, score in scores.items()]
+            ranked.sort(key=lambda item: -item[0])
+            return ranked
+
+    def select(self, question: str, schema: Optional[Dict[str, Any]] = None, k: int = 3,
+               token_budget: int = 400) -> List[Dict[str, str]]:
+        """挑选最相关的至多k条示例，总token数不超过预算；相关示例不足时用种子示例补位"""
+        with self._lock:
+            self._sync()
+            if schema:
+                self.refresh_schema(schema)
+            ranked = self.search(question)
+            seen = {id(example) for _, example in ranked}
+            ranked += [(0.0, seed) for seed in self._active_seeds if id(seed) not in seen]
+            picked = []
+            used = 0
+            for _, example in ranked:
+                if len(picked) >= k:
+                    break
+                cost = estimate_tokens(example["question"]) + estimate_tokens(example["sql"]) + 4
+                if used + cost > token_budget:
+                    continue
+                picked.append(example)
+                used += cost
+            now = time.time()
+            used_records = [{"op": "use", "question": e["question"], "at": now}
+                            for e in picked if e.get("source") != "seed"]
+            if used_records:
+                self._append(used_records)
+            return [{"user": example["question"], "sql": example["sql"]} for example in picked]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            return {"examples": len(self.examples), "active_seeds": len(self._active_seeds), "path": self.path}
@@ -0,0 +1,299 @@
+"""
+规则快速路径：常见的模板化问题直接在本地生成SQL，不调用大模型。
+
+问题先去掉"请/列出/查询"等前缀，再按以下模板匹配，表名和列名通过表结构实体匹配
+（表名/列名本身、列注释、内置的中文同义词，可用 FAST_PATH_SYNONYMS 指向的JSON文件扩展）：
+- list：       [所有]<表>[的]<列>[和<列>...]，如"列出所有学生的姓名"；不写列时列出全部非敏感列
+- count：      <表>的数量 / 有多少<表>
+- aggregate：  <表>的(平均|最高|最低|总)<列>
+- group_count：每个<列>的<表>数量
+- filter：     <列>为<值>的<表>[的<列>...]；<值>必须能对应到库中的取值（内置或自定义的取值同义词，
+               或列统计画像中的常见值），如"物理"对应 'Physics'，否则交给大模型
+只有整句都被模板和实体完全解释、且没有歧义时才算命中，其余情况返回None交给大模型。
+"""
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+TABLE_SYNONYMS = {
+    "学生": "student", "课程": "course", "课": "course", "教师": "instructor", "老师": "instructor",
+    "院系": "department", "系": "department", "学院": "department", "教室": "classroom",
+    "开课记录": "section", "选课记录": "takes", "授课记录": "teaches", "导师关系": "advisor",
+    "先修关系": "prereq", "时间段": "time_slot",
+}
+# 同一个词对应多个列时按顺序取表中第一个存在的列
+COLUMN_SYNONYMS = {
+    "姓名": ["name"], "名字": ["name"], "名称": ["title", "name", "dept_name"], "标题": ["title"],
+    "课程名": ["title"], "课程名称": ["title"], "学分": ["credits", "tot_cred"], "总学分": ["tot_cred"],
+    "院系": ["dept_name"], "系": ["dept_name"], "系名": ["dept_name"], "所在系": ["dept_name"],
+    "编号": ["id", "course_id", "sec_id", "time_slot_id"], "学号": ["id"], "工号": ["id"],
+    "课程号": ["course_id"], "课程编号": ["course_id"], "预算": ["budget"], "楼": ["building"],
+    "教学楼": ["building"], "大楼": ["building"], "房间号": ["room_number"], "容量": ["capacity"],
+    "学期": ["semester"], "年份": ["year"], "成绩": ["grade"], "星期": ["day"], "工资": ["salary"],
+}
+# 常见取值的中文说法 -> 库中的值（college示例库）；FAST_PATH_SYNONYMS 文件中的 "values" 可扩展
+VALUE_SYNONYMS = {
+    "计算机": "Comp. Sci.", "计算机科学": "Comp. Sci.", "物理": "Physics", "电子工程": "Elec. Eng.",
+    "电气工程": "Elec. Eng.", "生物": "Biology", "历史": "History", "金融": "Finance", "音乐": "Music",
+    "春季": "Spring", "春季学期": "Spring", "秋季": "Fall", "秋季学期": "Fall", "夏季": "Summer", "夏季学期": "Summer",
+}
+VALUE_SUFFIXES = ("系", "学院", "专业")
+# 与main.FORBIDDEN_FIELDS一致：涉及敏感列的问题不走快速路径
+SENSITIVE_COLUMNS = {"password", "salary", "ssn", "credit_card"}
+
+_PREFIXES = ("请", "帮我", "给我")
+_VERBS = ("列出", "列举", "查询", "查看", "显示", "给出", "返回", "找出", "查找", "获取", "统计", "看看")
+_QUANTIFIERS = ("所有的", "所有", "全部的", "全部")
+_SEPARATOR_RE = re.compile(r"以及|和|与|及|跟|、|,|，")
+_COUNT_RES = [
+    re.compile(r"^(?:一共|总共|共)?有多少(?:个|名|门|位|间|条)?(?P<t>.+)$"),
+    re.compile(r"^(?P<t>.+?)(?:一共|总共|共)?有多少(?:个|名|门|位|间|条)?$"),
+    re.compile(r"^(?P<t>.+?)的?(?:总数量|数量|总数|个数|数目)$"),
+]
+_GROUP_COUNT_RE = re.compile(r"^(?:每个|每一个|各个|各)(?P<c>.+?)的(?P<t>.+?)(?:数量|总数|个数|数目|数)$")
+_AGGREGATES = {"平均": "AVG", "最高": "MAX", "最大": "MAX", "最低": "MIN", "最小": "MIN", "总": "SUM"}
+_FILTER_RE = re.compile(r"^(?P<c>.+?)(?:为|是|等于)(?P<v>.+?)的(?P<rest>.+)$")
+_NUMERIC_TYPES = ("int", "decimal", "numeric", "float", "double", "real")
+_QUOTES = "'\"`‘’“”「」"
+
+_lexicon_cache = {}
+
+
+def _load_custom_synonyms() -> Dict[str, Any]:
+    path = os.getenv("FAST_PATH_SYNONYMS")
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _column_name(col: Dict[str, Any]) -> str:
+    return str(col.get("name") or col.get("Field"))
+
+
+def build_lexicon(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """表结构转换为 词 -> 表 / 表中的 词 -> 列 的查找表"""
+    tables = schema.get("tables") if isinstance(schema.get("tables"), dict) else schema
+    custom = _load_custom_synonyms()
+    lexicon = {"tables": {}, "columns": {}, "types": {},
+               "values": {k.lower(): v for k, v in dict(VALUE_SYNONYMS, **custom.get("values", {})).items()}}
+    for table, columns in tables.items():
+        if not isinstance(columns, list):
+            continue
+        names = {_column_name(col).lower(): _column_name(col) for col in columns if isinstance(col, dict)}
+        terms = {}
+        for col in columns:
+            if not isinstance(col, dict):
+                continue
+            name = _column_name(col)
+            lexicon["types"][(table, name)] = str(col.get("type") or col.get("Type") or "").lower()
+            for term in (name, name.replace("_", " "), col.get("comment") or col.get("Comment")):
+                if term:
+                    terms[str(term).lower()] = name
+        for term, candidates in list(COLUMN_SYNONYMS.items()) + list(custom.get("columns", {}).items()):
+            found = next((names[c.lower()] for c in candidates if c.lower() in names), None)
+            if found:
+                terms.setdefault(term, found)
+        lexicon["columns"][table] = terms
+        lexicon["tables"][table.lower()] = table
+        lexicon["tables"][table.lower().replace("_", " ")] = table
+    lowered = {t.lower(): t for t in lexicon["columns"]}
+    for term, table in list(TABLE_SYNONYMS.items()) + list(custom.get("tables", {}).items()):
+        if table.lower() in lowered:
+            lexicon["tables"].setdefault(term, lowered[table.lower()])
+    return lexicon
+
+
+def _lexicon_for(schema: Dict[str, Any]) -> Dict[str, Any]:
+    cached = _lexicon_cache.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    lexicon = build_lexicon(schema)
+    if len(_lexicon_cache) >= 8:
+        _lexicon_cache.pop(next(iter(_lexicon_cache)))
+    _lexicon_cache[id(schema)] = (schema, lexicon)
+    return lexicon
+
+
+def _strip_prefix(text: str, prefixes: tuple) -> str:
+    for prefix in prefixes:
+        if text.startswith(prefix):
+            return text[len(prefix):]
+    return text
+
+
+def normalize_question(question: str) -> str:
+    text = question.strip().rstrip("。.？?！!；;").strip()
+    text = _strip_prefix(text, _PREFIXES)
+    text = _strip_prefix(text, _VERBS)
+    return _strip_prefix(text, _QUANTIFIERS)
+
+
+class _Matcher:
+    def __init__(self, lexicon: Dict[str, Any], load_profile: Callable[[], Dict[str, Any]] = None):
+        self.lexicon = lexicon
+        self.load_profile = load_profile
+
+    def table(self, text: str) -> Optional[str]:
+        return self.lexicon["tables"].get(_strip_prefix(text.strip(), _QUANTIFIERS).lower())
+
+    def column(self, table: str, text: str) -> Optional[str]:
+        column = self.lexicon["columns"][table].get(text.strip().lower())
+        if column is None or column.lower() in SENSITIVE_COLUMNS:
+            return None
+        return column
+
+    def columns(self, table: str, text: str) -> Optional[List[str]]:
+        result = []
+        for part in _SEPARATOR_RE.split(text):
+            column = self.column(table, part)
+            if column is None:
+                return None
+            if column not in result:
+                result.append(column)
+        return result
+
+    def is_numeric(self, table: str, column: str) -> bool:
+        return any(t in self.lexicon["types"].get((table, column), "") for t in _NUMERIC_TYPES)
+
+    def visible_columns(self, table: str) -> List[str]:
+        return [c for (t, c) in self.lexicon["types"] if t == table and c.lower() not in SENSITIVE_COLUMNS]
+
+    def split_table(self, text: str) -> Optional[tuple]:
+        """开头最长的表名 + 剩余部分（去掉"的"）"""
+        for end in range(len(text), 0, -1):
+            table = self.table(text[:end])
+            if table:
+                rest = text[end:]
+                return table, rest[1:] if rest.startswith("的") else rest
+        return None
+
+    def projection(self, table: str, rest: str) -> Optional[tuple]:
+        """表后面的部分：空（全部列）、列清单，或 聚合词+列"""
+        if not rest:
+            return "list", ", ".join(self.visible_columns(table))
+        columns = self.columns(table, rest)
+        if columns:
+            return "list", ", ".join(columns)
+        for word, func in _AGGREGATES.items():
+            if rest.startswith(word):
+                column = self.column(table, rest[len(word):].lstrip("的"))
+                if column and (func in ("MAX", "MIN") or self.is_numeric(table, column)):
+                    return "aggregate", f"{func}({column}) AS {func.lower()}_{column}"
+        return None
+
+    def literal(self, table: str, column: str, value: str) -> Optional[str]:
+        value = value.strip().strip(_QUOTES)
+        if not value:
+            return None
+        if self.is_numeric(table, column):
+            return value if re.fullmatch(r"-?\d+(\.\d+)?", value) else None
+        stored = self.known_value(table, column, value)
+        if stored is None:
+            return None
+        return "'" + str(stored).replace("\\", "\\\\").replace("'", "''") + "'"
+
+    def known_value(self, table: str, column: str, value: str) -> Optional[Any]:
+        """问题中的取值对应的库中取值（可去掉"系/学院/专业"后缀）：取值同义词，或列统计画像中的常见值"""
+        words = [value] + [value[:-len(s)] for s in VALUE_SUFFIXES if value.endswith(s) and len(value) > len(s)]
+        profile = (self.load_profile() if self.load_profile else None) or {}
+        top = ((profile.get(table) or {}).get("columns", {}).get(column) or {}).get("top") or []
+        common = {str(t["value"]).lower(): t["value"] for t in top}
+        for word in words:
+            if word.lower() in self.lexicon["values"]:
+                return self.lexicon["values"][word.lower()]
+            if word.lower() in common:
+                return common[word.lower()]
+        return None
+
+    def match(self, text: str) -> Optional[Dict[str, str]]:
+        m = _GROUP_COUNT_RE.match(text)
+        if m:
+            table = self.table(m.group("t"))
+            column = table and self.column(table, m.group("c"))
+            if column:
+                return {"template": "group_count",
+                        "sql": f"SELECT {column}, COUNT(*) AS total FROM {table} GROUP BY {column};"}
+        for pattern in _COUNT_RES:
+            m = pattern.match(text)
+            table = m and self.table(m.group("t"))
+            if table:
+                return {"template": "count", "sql": f"SELECT COUNT(*) AS total FROM {table};"}
+        split = self.split_table(text)
+        if split:
+            projection = self.projection(*split)
+            if projection:
+                return {"template": projection[0], "sql": f"SELECT {projection[1]} FROM {split[0]};"}
+        m = _FILTER_RE.match(text)
+        if m:
+            split = self.split_table(m.group("rest"))
+            projection = split and self.projection(*split)
+            column = split and self.column(split[0], m.group("c"))
+            literal = column and self.literal(split[0], column, m.group("v"))
+            if projection and projection[0] == "list" and literal:
+                return {"template": "filter",
+                        "sql": f"SELECT {projection[1]} FROM {split[0]} WHERE {column} = {literal};"}
+        return None
+
+
+def match_question(question: str, schema: Dict[str, Any],
+                   load_profile: Callable[[], Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+    """问题命中模板时返回 {"template": 模板名, "sql": SQL}，否则返回None；
+    load_profile返回各表的列统计画像（表名 -> 画像），只在filter模板核对取值时调用"""
+    if not question or not schema:
+        return None
+    text = normalize_question(question)
+    if not text:
+        return None
+    return _Matcher(_lexicon_for(schema), load_profile).match(text)
+
+
+class FastPathStats:
+    """命中率和节省的时间：节省时间按未命中时走大模型的平均耗时估算"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.attempts = 0
+        self.hits = 0
+        self.by_template = {}
+        self.match_ms = 0.0
+        self.llm_calls = 0
+        self.llm_ms = 0.0
+
+    def record_hit(self, template: str, match_ms: float):
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+            self.by_template[template] = self.by_template.get(template, 0) + 1
+            self.match_ms += match_ms
+
+    def record_miss(self, match_ms: float, llm_ms: float):
+        with self._lock:
+            self.attempts += 1
+            self.match_ms += match_ms
+            self.llm_calls += 1
+            self.llm_ms += llm_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_llm = self.llm_ms / self.llm_calls if self.llm_calls else None
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.attempts, 4) if self.attempts else 0.0,
+                "by_template": dict(self.by_template),
+                "avg_match_ms": round(self.match_ms / self.attempts, 3) if self.attempts else 0.0,
+                "avg_llm_ms": round(avg_llm, 2) if avg_llm is not None else None,
+                "saved_ms": round(self.hits * avg_llm, 2) if avg_llm is not None else None,
+            }
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    saved = "未知（尚无大模型调用）" if stats["saved_ms"] is None else f"约 {stats['saved_ms'] / 1000:.2f} 秒"
+    return (f"快速路径命中 {stats['hits']}/{stats['attempts']}（{stats['hit_rate']:.1%}），"
+            f"平均匹配 {stats['avg_match_ms']} ms，节省 {saved}")
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import json
+import time
 from typing import Dict, Any
 import sys
 import os
@@ -8,8 +9,21 @@ import os
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from llm_client import generate_sql_from_prompt
-from mcp_client import get_schema, query_data, get_logs, get_tables
+from llm_client import generate_sql_from_prompt, record_example, fast_path_stats
+from fast_path import format_stats
+from mcp_client import get_schema, query_data, query_page, export_url, get_logs, get_tables, ping, register_watch, watch_changes
+from refine import REFINE_MAX_ROWS, ResultCache
+from sql_text import paginate_sql
+from watch import apply_delta
+
+# 表结构缓存有效期（秒），侧边栏可手动刷新
+SCHEMA_CACHE_TTL = int(os.getenv("GUI_SCHEMA_TTL", 300))
+# 监视查询页拉取增量的最长间隔（秒）和保留显示的最近变化数
+WATCH_POLL_SECONDS = float(os.getenv("GUI_WATCH_POLL_SECONDS", 5))
+WATCH_RECENT_CHANGES = 10
+HEALTH_CACHE_TTL = int(os.getenv("GUI_HEALTH_TTL", 10))
+# 结果表格每页行数选项，数据按页从服务端获取
+PAGE_SIZE_OPTIONS = [20, 50, 100, 200]
 
 # 页面配置
 st.set_page_config(
@@ -115,14 +129,46 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(ttl=SCHEMA_CACHE_TTL, show_spinner=False)
+def load_schema():
+    """获取表结构（所有页面共享缓存）"""
+    return get_schema()
+
+@st.cache_data(ttl=SCHEMA_CACHE_TTL, show_spinner=False)
+def load_tables():
+    """获取表列表（所有页面共享缓存）"""
+    return get_tables()
+
+@st.cache_data(ttl=HEALTH_CACHE_TTL, show_spinner=False)
+def check_health():
+    """轻量检查服务和数据库连接状态"""
+    return ping()
+
+def refresh_schema_cache():
+    """清除表结构、表列表和连接状态缓存"""
+    load_schema.clear()
+    load_tables.clear()
+    check_health.clear()
+
 def check_database_connection():
-    """检查数据库连接状态"""
+    """检查数据库连接状态，成功时返回缓存的表结构"""
     try:
-        schema = get_schema()
+        schema = load_schema()
         return True, schema
     except Exception as e:
         return False, str(e)
 
+def display_cost(cost: Dict[str, Any]):
+    """显示EXPLAIN成本估算"""
+    if not cost:
+        return
+    with st.expander(f"执行成本估算：预估扫描 {cost.get('estimated_rows_examined', 0)} 行", expanded=bool(cost.get("warnings"))):
+        st.write(f"**阈值:** {cost.get('max_rows_examined', '-')} 行")
+        for warning in cost.get("warnings", []):
+            st.warning(warning)
+        if not cost.get("warnings"):
+            st.success("未发现全表扫描或笛卡尔积连接")
+
 def natural_language_query_page():
     """自然语言查询页面"""
     st.header("自然语言查询")
@@ -150,6 +196,8 @@ def natural_language_query_page():
                 process_query(natural_query.strip())
             else:
                 st.warning("请输入查询内容")
+        
+        render_query_result()
     
     with col2:
         st.subheader("示例查询")
@@ -249,7 +297,7 @@ def table_list_page():
     
     # 获取表列表
     try:
-        tables = get_tables()
+        tables = load_tables()
     except Exception as e:
         st.error(f"❌ 获取表列表失败: {str(e)}")
         return
@@ -312,6 +360,8 @@ def json_query_page():
             process_json_query(natural_query.strip())
         else:
             st.warning("请输入查询内容")
+    
+    render_json_result()
 
 def query_logs_page():
     """查询日志页面"""
@@ -349,8 +399,154 @@ def query_logs_page():
     except Exception as e:
         st.error(f"❌ 获取日志失败: {str(e)}")
 
+def watch_query_page():
+    """监视查询页面：服务端按间隔重新执行查询，页面只拉取新增、修改、删除的行"""
+    st.header("监视查询")
+    
+    mode = st.radio("输入方式:", ["自然语言", "SQL"], horizontal=True)
+    text = st.text_area(
+        "要监视的查询:",
+        height=100,
+        placeholder="例如：统计每个系的学生人数" if mode == "自然语言" else "例如：SELECT dept_name, COUNT(*) AS n FROM student GROUP BY dept_name"
+    )
+    interval = st.number_input("执行间隔（秒）:", min_value=1, value=30, step=5)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("开始监视", type="primary", use_container_width=True):
+            if text.strip():
+                start_watch(text.strip(), mode == "自然语言", interval)
+            else:
+                st.warning("请输入查询内容")
+    with col2:
+        # 只取消本页订阅；监视可能被其他用户共享，无人订阅后由服务端自动清理
+        if st.button("停止监视", use_container_width=True, disabled="watch" not in st.session_state):
+            st.session_state.pop("watch", None)
+            st.rerun()
+    
+    render_watch()
+
+def start_watch(text: str, natural: bool, interval: float):
+    """注册监视（相同查询已被监视时共享），保存到会话中"""
+    sql = text
+    if natural:
+        with st.spinner("正在生成SQL..."):
+            schema = load_schema()
+            sql = generate_sql_from_prompt(text, schema) if schema else "错误: 无法获取数据库结构"
+        if "错误" in sql:
+            st.error(f"❌ SQL生成失败: {sql}")
+            return
+    try:
+        registered = register_watch(sql, interval)
+    except Exception as e:
+        st.error(f"❌ 注册监视失败: {str(e)}")
+        return
+    if not registered.get("success"):
+        st.error(f"❌ 注册监视失败: {registered.get('error')}")
+        return
+    watch = registered["watch"]
+    st.session_state.watch = {"id": watch["id"], "sql": sql, "interval": watch["interval"], "shared": not registered["created"],
+                              "version": None, "key": None, "rows": [], "changes": []}
+
+def render_watch():
+    """拉取上次版本之后的增量并应用到本地结果，然后定时重新运行页面"""
+    state = st.session_state.get("watch")
+    if not state:
+        return
+    try:
+        changes = watch_changes(state["id"], state["version"])
+    except Exception as e:
+        st.error(f"❌ 监视已停止或无法访问: {str(e)}")
+        st.session_state.pop("watch", None)
+        return
+    if "snapshot" in changes:
+        state["rows"] = changes["snapshot"]
+        state["changes"] = []
+    for delta in changes.get("deltas", []):
+        state["rows"] = apply_delta(state["rows"], delta, changes["key"])
+        state["changes"] = ([delta] + state["changes"])[:WATCH_RECENT_CHANGES]
+    state["version"], state["key"] = changes["version"], changes["key"]
+    
+    st.subheader("监视中的SQL")
+    st.markdown(f'<div class="sql-box">{state["sql"]}</div>', unsafe_allow_html=True)
+    st.caption(f"每 {state['interval']:g} 秒执行一次{'（与其他订阅共享）' if state['shared'] else ''}，"
+               f"行键: {', '.join(state['key']) if state['key'] else '整行'}，"
+               f"版本 {state['version']}，上次执行 {changes.get('refreshed_at') or '-'}")
+    if changes.get("error"):
+        st.error(f"❌ 最近一次执行失败: {changes['error']}")
+    
+    st.subheader(f"当前结果（{len(state['rows'])} 行）")
+    if state["rows"]:
+        st.dataframe(pd.DataFrame(state["rows"]), use_container_width=True)
+    elif state["version"]:
+        st.info("没有找到匹配的结果")
+    else:
+        st.info("等待第一次执行完成...")
+    
+    if state["changes"]:
+        st.subheader("最近的变化")
+        for delta in state["changes"]:
+            title = (f"版本 {delta['version']}（{delta['refreshed_at']}）：新增 {len(delta['inserted'])}，"
+                     f"修改 {len(delta['updated'])}，删除 {len(delta['deleted'])}")
+            with st.expander(title, expanded=False):
+                for label, rows in (("新增", delta["inserted"]), ("修改后", delta["updated"]), ("删除", delta["deleted"])):
+                    if rows:
+                        st.write(f"**{label}**")
+                        st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    
+    time.sleep(min(state["interval"], WATCH_POLL_SECONDS))
+    st.rerun()
+
+def fetch_result_page(state_key: str) -> Dict[str, Any]:
+    """按需从服务端拉取当前页，会话中只保留当前页数据；本地细化得到的结果直接在本地分页"""
+    state = st.session_state[state_key]
+    key = (state["page"], state["page_size"])
+    if state.get("loaded") != key:
+        if state.get("refined"):
+            rows = state["refined"]["results"]
+            start = state["page"] * state["page_size"]
+            page_rows = rows[start:start + state["page_size"]]
+            state["result"] = {"success": True, "results": page_rows, "rowCount": len(page_rows),
+                               "page": state["page"], "page_size": state["page_size"],
+                               "has_more": start + state["page_size"] < len(rows)}
+        else:
+            state["result"] = query_page(state["sql"], state["page"], state["page_size"])
+        state["loaded"] = key
+    return state["result"]
+
+def load_full_rows(sql: str):
+    """追问需要完整的上次结果时才取一次（最多REFINE_MAX_ROWS+1行，不受每页行数上限限制），超出时返回None"""
+    result = query_data(paginate_sql(sql, 0, REFINE_MAX_ROWS + 1))
+    if not result["success"] or len(result["results"]) > REFINE_MAX_ROWS:
+        return None
+    return result["results"]
+
+def render_page_controls(state_key: str, result: Dict[str, Any]):
+    """分页控件：上一页/下一页/每页行数"""
+    state = st.session_state[state_key]
+    page, page_size = state["page"], state["page_size"]
+    col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
+    with col1:
+        if st.button("上一页", key=f"{state_key}_prev", disabled=page == 0):
+            state["page"] -= 1
+            st.rerun()
+    with col2:
+        if st.button("下一页", key=f"{state_key}_next", disabled=not result.get("has_more")):
+            state["page"] += 1
+            st.rerun()
+    with col3:
+        start = page * page_size
+        st.write(f"第 {page + 1} 页，显示第 {start + 1}-{start + result['rowCount']} 行")
+    with col4:
+        size = st.selectbox("每页行数", PAGE_SIZE_OPTIONS, index=PAGE_SIZE_OPTIONS.index(page_size),
+                            key=f"{state_key}_size", label_visibility="collapsed")
+        if size != page_size:
+            state["page_size"] = size
+            state["page"] = 0
+            st.rerun()
+
 def process_query(natural_query: str):
-    """处理自然语言查询"""
+    """处理自然语言查询：生成SQL并拉取第一页结果"""
     # 初始化计数器
     if 'query_count' not in st.session_state:
         st.session_state.query_count = 0
@@ -358,12 +554,37 @@ def process_query(natural_query: str):
         st.session_state.success_count = 0
     
     st.session_state.query_count += 1
+    st.session_state.pop("query_result", None)
+    
+    # 追问能用上次的结果回答时在本地细化，不生成SQL；上次只取了第一页时先取一次完整结果
+    cache = st.session_state.setdefault("result_cache", ResultCache())
+    loaded = []
+
+    def load_rows(sql: str):
+        loaded.append(sql)
+        return load_full_rows(sql)
+
+    try:
+        refined = cache.refine(natural_query, load_rows=load_rows)
+    except Exception:
+        refined = None
+    if refined:
+        st.session_state.query_result = {
+            "query": natural_query,
+            "sql": refined["sql"],
+            "page": 0,
+            "page_size": PAGE_SIZE_OPTIONS[0],
+            "refined": refined,
+            "reloaded": bool(loaded),
+        }
+        st.session_state.success_count += 1
+        return
     
     # 显示查询进度
     with st.spinner("正在生成SQL..."):
         try:
             # 获取数据库结构
-            schema = get_schema()
+            schema = load_schema()
             if not schema:
                 st.error("❌ 无法获取数据库结构")
                 return
@@ -374,62 +595,91 @@ def process_query(natural_query: str):
             if "错误" in generated_sql:
                 st.error(f"❌ SQL生成失败: {generated_sql}")
                 return
-            
-            # 显示生成的SQL
-            st.subheader("生成的SQL语句")
-            st.markdown(f'<div class="sql-box">{generated_sql}</div>', unsafe_allow_html=True)
-            
-            # 执行查询
-            with st.spinner("正在执行查询..."):
-                result = query_data(generated_sql)
-                
-                if result["success"]:
-                    st.session_state.success_count += 1
-                    
-                    # 显示查询结果
-                    st.subheader("查询结果")
-                    
-                    if result["rowCount"] == 0:
-                        st.info("没有找到匹配的数据")
-                    else:
-                        # 转换为DataFrame并显示
-                        df = pd.DataFrame(result["results"])
-                        st.dataframe(df, use_container_width=True)
-                        
-                        # 显示统计信息
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("返回行数", result["rowCount"])
-                        with col2:
-                            st.metric("列数", len(df.columns))
-                        with col3:
-                            st.metric("查询状态", "✅ 成功")
-                        
-                        # 提供下载功能
-                        csv = df.to_csv(index=False)
-                        st.download_button(
-                            label="下载CSV文件",
-                            data=csv,
-                            file_name=f"query_result_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
-                        
-                        # 显示结果统计
-                        st.markdown('<div class="result-box">✅ 查询执行成功！</div>', unsafe_allow_html=True)
-                else:
-                    st.error(f"❌ 查询执行失败: {result['error']}")
-                    st.markdown(f'<div class="error-box">❌ 查询执行失败: {result["error"]}</div>', unsafe_allow_html=True)
-                    
         except Exception as e:
             st.error(f"❌ 处理查询时发生错误: {str(e)}")
             st.markdown(f'<div class="error-box">❌ 系统错误: {str(e)}</div>', unsafe_allow_html=True)
+            return
+
+    st.session_state.query_result = {
+        "query": natural_query,
+        "sql": generated_sql,
+        "page": 0,
+        "page_size": PAGE_SIZE_OPTIONS[0],
+    }
+    with st.spinner("正在执行查询..."):
+        try:
+            result = fetch_result_page("query_result")
+            if result["success"]:
+                st.session_state.success_count += 1
+                record_example(natural_query, generated_sql)
+                # 只保存第一页，追问需要时再取完整结果
+                cache.store(natural_query, generated_sql, result["results"], complete=not result["has_more"])
+        except Exception:
+            pass
+
+def render_query_result():
+    """显示自然语言查询的当前页结果"""
+    state = st.session_state.get("query_result")
+    if not state:
+        return
+    
+    # 显示生成的SQL
+    st.subheader("生成的SQL语句")
+    st.markdown(f'<div class="sql-box">{state["sql"]}</div>', unsafe_allow_html=True)
+    if state.get("refined"):
+        operations = "；".join(state["refined"]["refined"]["operations"])
+        source = "重新取回了上次查询的完整结果" if state.get("reloaded") else "未访问数据库"
+        st.info(f"根据上次的结果在本地细化（未调用大模型，{source}）：{operations}")
+    
+    try:
+        with st.spinner("正在加载结果..."):
+            result = fetch_result_page("query_result")
+    except Exception as e:
+        st.error(f"❌ 处理查询时发生错误: {str(e)}")
+        st.markdown(f'<div class="error-box">❌ 系统错误: {str(e)}</div>', unsafe_allow_html=True)
+        return
+    display_cost(result.get("cost"))
+    
+    if result["success"]:
+        # 显示查询结果
+        st.subheader("查询结果")
+        
+        if result["rowCount"] == 0 and state["page"] == 0:
+            st.info("没有找到匹配的数据")
+        else:
+            # 只渲染当前页
+            df = pd.DataFrame(result["results"])
+            st.dataframe(df, use_container_width=True)
+            render_page_controls("query_result", result)
+            
+            # 显示统计信息
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("本页行数", result["rowCount"])
+            with col2:
+                st.metric("列数", len(df.columns))
+            with col3:
+                st.metric("查询状态", "✅ 成功")
+            
+            # 完整结果由服务端边查边写，浏览器直接下载
+            st.link_button("下载CSV文件", export_url(state["sql"], "csv"))
+            
+            # 显示结果统计
+            st.markdown('<div class="result-box">✅ 查询执行成功！</div>', unsafe_allow_html=True)
+    else:
+        st.error(f"❌ 查询执行失败: {result['error']}")
+        st.markdown(f'<div class="error-box">❌ 查询执行失败: {result["error"]}</div>', unsafe_allow_html=True)
+        for error in result.get("validation_errors") or []:
+            hint = f"，可能是: {', '.join(error['suggestions'])}" if error["suggestions"] else ""
+            st.warning(f"{error['message']}{hint}")
 
 def process_json_query(natural_query: str):
-    """处理JSON结果查询"""
+    """处理JSON结果查询：生成SQL并拉取第一页结果"""
+    st.session_state.pop("json_result", None)
     with st.spinner("正在生成SQL..."):
         try:
             # 获取数据库结构
-            schema = get_schema()
+            schema = load_schema()
             if not schema:
                 st.error("❌ 无法获取数据库结构")
                 return
@@ -440,58 +690,6 @@ def process_json_query(natural_query: str):
             if "错误" in generated_sql:
                 st.error(f"❌ SQL生成失败: {generated_sql}")
                 return
-            
-            # 显示生成的SQL
-            st.subheader("生成的SQL语句")
-            st.markdown(f'<div class="sql-box">{generated_sql}</div>', unsafe_allow_html=True)
-            
-            # 执行查询
-            with st.spinner("正在执行查询..."):
-                result = query_data(generated_sql)
-                
-                if result["success"]:
-                    # 显示JSON结果
-                    st.subheader("JSON查询结果")
-                    
-                    # 格式化JSON
-                    json_result = {
-                        "query": natural_query,
-                        "generated_sql": generated_sql,
-                        "success": True,
-                        "row_count": result["rowCount"],
-                        "column_count": len(result["results"][0]) if result["results"] else 0,
-                        "data": result["results"]
-                    }
-                    
-                    # 显示格式化的JSON
-                    st.markdown(f'<div class="json-box">{json.dumps(json_result, indent=2, ensure_ascii=False)}</div>', unsafe_allow_html=True)
-                    
-                    # 提供JSON下载
-                    json_str = json.dumps(json_result, indent=2, ensure_ascii=False)
-                    st.download_button(
-                        label="下载JSON文件",
-                        data=json_str,
-                        file_name=f"query_result_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json",
-                        mime="application/json"
-                    )
-                    
-                    # 同时显示表格形式
-                    if result["rowCount"] > 0:
-                        st.subheader("表格形式结果")
-                        df = pd.DataFrame(result["results"])
-                        st.dataframe(df, use_container_width=True)
-                    
-                    st.markdown('<div class="result-box">✅ JSON查询执行成功！</div>', unsafe_allow_html=True)
-                else:
-                    error_result = {
-                        "query": natural_query,
-                        "generated_sql": generated_sql,
-                        "success": False,
-                        "error": result["error"]
-                    }
-                    st.markdown(f'<div class="json-box">{json.dumps(error_result, indent=2, ensure_ascii=False)}</div>', unsafe_allow_html=True)
-                    st.markdown(f'<div class="error-box">❌ 查询执行失败: {result["error"]}</div>', unsafe_allow_html=True)
-                    
         except Exception as e:
             error_result = {
                 "query": natural_query,
@@ -500,6 +698,82 @@ def process_json_query(natural_query: str):
             }
             st.markdown(f'<div class="json-box">{json.dumps(error_result, indent=2, ensure_ascii=False)}</div>', unsafe_allow_html=True)
             st.error(f"❌ 处理查询时发生错误: {str(e)}")
+            return
+
+    st.session_state.json_result = {
+        "query": natural_query,
+        "sql": generated_sql,
+        "page": 0,
+        "page_size": PAGE_SIZE_OPTIONS[0],
+    }
+
+def render_json_result():
+    """显示JSON结果查询的当前页结果"""
+    state = st.session_state.get("json_result")
+    if not state:
+        return
+    natural_query, generated_sql = state["query"], state["sql"]
+    
+    # 显示生成的SQL
+    st.subheader("生成的SQL语句")
+    st.markdown(f'<div class="sql-box">{generated_sql}</div>', unsafe_allow_html=True)
+    
+    try:
+        with st.spinner("正在执行查询..."):
+            result = fetch_result_page("json_result")
+    except Exception as e:
+        error_result = {
+            "query": natural_query,
+            "success": False,
+            "error": str(e)
+        }
+        st.markdown(f'<div class="json-box">{json.dumps(error_result, indent=2, ensure_ascii=False)}</div>', unsafe_allow_html=True)
+        st.error(f"❌ 处理查询时发生错误: {str(e)}")
+        return
+    display_cost(result.get("cost"))
+    
+    if result["success"]:
+        # 显示JSON结果
+        st.subheader("JSON查询结果")
+        
+        # 格式化JSON（当前页）
+        json_result = {
+            "query": natural_query,
+            "generated_sql": generated_sql,
+            "success": True,
+            "page": result["page"],
+            "page_size": result["page_size"],
+            "has_more": result["has_more"],
+            "row_count": result["rowCount"],
+            "column_count": len(result["results"][0]) if result["results"] else 0,
+            "cost": result.get("cost"),
+            "data": result["results"]
+        }
+        
+        # 显示格式化的JSON
+        st.markdown(f'<div class="json-box">{json.dumps(json_result, indent=2, ensure_ascii=False, default=str)}</div>', unsafe_allow_html=True)
+        
+        # 完整JSON由服务端流式导出
+        st.link_button("下载JSON文件", export_url(generated_sql, "json"))
+        
+        # 同时显示表格形式
+        if result["rowCount"] > 0 or state["page"] > 0:
+            st.subheader("表格形式结果")
+            df = pd.DataFrame(result["results"])
+            st.dataframe(df, use_container_width=True)
+            render_page_controls("json_result", result)
+        
+        st.markdown('<div class="result-box">✅ JSON查询执行成功！</div>', unsafe_allow_html=True)
+    else:
+        error_result = {
+            "query": natural_query,
+            "generated_sql": generated_sql,
+            "success": False,
+            "error": result["error"],
+            "validation_errors": result.get("validation_errors")
+        }
+        st.markdown(f'<div class="json-box">{json.dumps(error_result, indent=2, ensure_ascii=False)}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="error-box">❌ 查询执行失败: {result["error"]}</div>', unsafe_allow_html=True)
 
 def main():
     # 主标题
@@ -509,14 +783,25 @@ def main():
     with st.sidebar:
         st.header("📊 系统状态")
         
-        # 显示数据库连接状态
-        connected, schema_or_error = check_database_connection()
-        if connected:
+        # 显示数据库连接状态（轻量健康检查，不拉取表结构）
+        try:
+            health = check_health()
+        except Exception as e:
+            health = {"status": "error", "error": str(e)}
+        if health.get("status") == "ok":
             st.success("✅ 数据库连接正常")
-            st.write(f"数据库表数量: {len(schema_or_error)}")
+            st.caption(f"数据库: {health.get('database', '')}，响应 {health.get('latency_ms', '-')} ms")
         else:
             st.error("❌ 数据库连接失败")
-            st.write(f"错误: {schema_or_error}")
+            st.write(f"错误: {health.get('error', '未知错误')}")
+
+        if st.button("刷新表结构缓存", use_container_width=True):
+            refresh_schema_cache()
+            st.rerun()
+
+        fast_path = fast_path_stats()
+        if fast_path["attempts"]:
+            st.caption(format_stats(fast_path))
         
         st.divider()
         
@@ -538,9 +823,10 @@ def main():
                 "数据库表结构", 
                 "表列表",
                 "JSON结果查询",
-                "查询日志"
+                "查询日志",
+                "监视查询"
             ],
-            index=["自然语言查询", "数据库表结构", "表列表", "JSON结果查询", "查询日志"].index(current_page)
+            index=["自然语言查询", "数据库表结构", "表列表", "JSON结果查询", "查询日志", "监视查询"].index(current_page)
         )
         
         # 更新当前页面状态
@@ -560,6 +846,8 @@ def main():
         **JSON结果查询**: 输入自然语言，获取JSON格式的查询结果
         
         **查询日志**: 查看历史查询记录
+        
+        **监视查询**: 定时重新执行查询，只显示新增、修改、删除的行
         """)
     
     # 根据选择显示对应页面
@@ -573,6 +861,8 @@ def main():
         json_query_page()
     elif page == "查询日志":
         query_logs_page()
+    elif page == "监视查询":
+        watch_query_page()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
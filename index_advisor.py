@@ -0,0 +1,305 @@
+"""
+基于查询日志的索引建议：只输出报告，不会执行任何DDL。
+
+流程：
+  1. 读取查询日志（多行SQL按 mcp_client.get_logs 的规则拼接），按指纹（字面量替换为 ? 的规范化SQL）聚合执行次数；
+  2. 解析每类SQL的过滤条件（列 = 常量、IN列表、范围、BETWEEN、LIKE前缀）和连接键（列 = 列），按别名还原到表；
+  3. 对照表结构中的key字段去掉前导列已有索引的候选（MUL/UNI，或主键的第一列）；
+  4. 对每类SQL执行EXPLAIN，假设建立索引后该表的访问行数 = 原行数 / 等值列不同值个数之积（范围条件再除以3），
+     按嵌套循环重新估算扫描行数，收益 = (原估算 - 新估算) × 执行次数；
+  5. 同一张表上互为前缀的候选合并，按总收益排序输出 CREATE INDEX 语句（仅作为文本）。
+
+列的不同值个数通过 SELECT COUNT(DISTINCT ...) 查询取得（--no-ndv 时按10估算），
+这些统计查询不会被当作负载再次计入。
+
+用法:
+  python index_advisor.py --log query.log --top 10
+  python index_advisor.py --database hr --json bench_results/index_advice.json
+"""
+import argparse
+import json
+import math
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sql_rewrite import column_ref_end, is_name, table_refs, tokenize, unquote
+from sql_text import fingerprint_sql
+
+DEFAULT_NDV = 10
+RANGE_SELECTIVITY = 3
+MAX_INDEX_COLUMNS = 3
+NDV_ALIAS = "advisor_ndv"
+FULL_SCAN_TYPES = ("ALL", "INDEX", "")
+_EQ_OPS = ("=", "<=>")
+_RANGE_OPS = ("<", ">", "<=", ">=")
+
+
+def load_workload(logs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """按指纹聚合日志中的SQL，返回 [{fingerprint, sql(最近一次), count}]，执行次数多的在前"""
+    groups = {}
+    for entry in logs:
+        sql = entry["sql"].strip()
+        if not sql.lower().startswith("select") or NDV_ALIAS in sql:
+            continue
+        key = fingerprint_sql(sql)
+        group = groups.setdefault(key, {"fingerprint": key, "sql": sql, "count": 0})
+        group["sql"] = sql
+        group["count"] += 1
+    return sorted(groups.values(), key=lambda g: -g["count"])
+
+
+def schema_keys(schema: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """{表: {列: key}}，表名和列名小写"""
+    keys = {}
+    for table, columns in schema.items():
+        if isinstance(columns, list):
+            keys[table.lower()] = {str(col.get("name") or col.get("Field")).lower(): col.get("key") or col.get("Key") or ""
+                                   for col in columns}
+    return keys
+
+
+def leading_indexed(keys: Dict[str, Dict[str, str]], table: str, column: str) -> bool:
+    """DESCRIBE的Key字段只说明列是否为某个索引的第一列（主键则标记全部主键列，取第一列）"""
+    columns = keys.get(table, {})
+    key = columns.get(column, "")
+    if key in ("MUL", "UNI"):
+        return True
+    primary = [name for name, k in columns.items() if k == "PRI"]
+    return key == "PRI" and primary[:1] == [column]
+
+
+def _resolve(names: List[str], refs: Dict[str, Optional[str]], keys: Dict[str, Dict[str, str]]) -> Optional[Tuple[str, str]]:
+    column = names[-1].lower()
+    if len(names) >= 2:
+        table = refs.get(names[-2].lower())
+        return (table, column) if table and column in keys.get(table, {}) else None
+    tables = {t for t in refs.values() if t and column in keys.get(t, {})}
+    return (tables.pop(), column) if len(tables) == 1 else None
+
+
+def extract_predicates(sql: str, keys: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, List[str]]]:
+    """解析SQL中的过滤条件和连接键，返回 {表: {"eq": [...], "range": [...], "join": [...]}}"""
+    tokens = tokenize(sql)
+    refs, consumed = table_refs(tokens, 0, len(tokens))
+    found = {}
+
+    def add(ref, kind):
+        if ref:
+            columns = found.setdefault(ref[0], {"eq": [], "range": [], "join": []})[kind]
+            if ref[1] not in columns:
+                columns.append(ref[1])
+
+    def column_at(k):
+        if k >= len(tokens) or k in consumed or not is_name(tokens[k]) or k and tokens[k - 1].kind == "dot":
+            return None, k
+        end = column_ref_end(tokens, k, len(tokens))
+        if end < len(tokens) and tokens[end].kind == "lparen":
+            return None, k
+        return _resolve([unquote(t) for t in tokens[k:end] if t.kind != "dot"], refs, keys), end
+
+    def is_literal(k):
+        return k < len(tokens) and (tokens[k].kind in ("str", "num") or tokens[k].text == "?"
+                                    or tokens[k].text.startswith("@"))
+
+    k = 0
+    while k < len(tokens):
+        ref, end = column_at(k)
+        if ref is None or end >= len(tokens):
+            k = max(end, k + 1)
+            continue
+        op = tokens[end]
+        word = op.text.upper() if op.kind == "word" else op.text
+        if word in _EQ_OPS:
+            other, _ = column_at(end + 1)
+            if other:
+                add(ref, "join")
+                add(other, "join")
+            elif is_literal(end + 1):
+                add(ref, "eq")
+        elif word in _RANGE_OPS and is_literal(end + 1):
+            add(ref, "range")
+        elif word == "BETWEEN":
+            add(ref, "range")
+        elif word == "LIKE" and end + 1 < len(tokens) and tokens[end + 1].kind == "str" \
+                and not tokens[end + 1].text[1:].startswith(("%", "_")):
+            add(ref, "range")
+        elif word == "IN" and end + 1 < len(tokens) and tokens[end + 1].kind == "lparen":
+            add(ref, "join" if end + 2 < len(tokens) and tokens[end + 2].text.upper() == "SELECT" else "eq")
+        k = end
+    return found
+
+
+def candidate_columns(predicates: Dict[str, List[str]]) -> List[str]:
+    """等值过滤列在前，其次连接键，最后一个范围列"""
+    columns = []
+    for column in predicates["eq"] + predicates["join"] + predicates["range"][:1]:
+        if column not in columns:
+            columns.append(column)
+    return columns[:MAX_INDEX_COLUMNS]
+
+
+def rows_examined(plan: List[Dict[str, Any]]) -> int:
+    """与服务端成本估算相同的嵌套循环模型：前序表输出行数放大后续表的扫描行数"""
+    total = 0
+    prefix = {}
+    for row in plan:
+        select_id = row.get("id") or 0
+        rows = int(row.get("rows") or 0)
+        outer = prefix.get(select_id, 1)
+        total += outer * rows
+        prefix[select_id] = outer * max(rows * float(row.get("filtered") or 100.0) / 100.0, 1)
+    return int(total)
+
+
+def plan_with_index(plan: List[Dict[str, Any]], refs: Dict[str, Optional[str]], table: str,
+                    columns: List[str], predicates: Dict[str, List[str]], ndv: Callable[[str, str], int]):
+    """假设table上有columns索引，改写执行计划中该表全表扫描行的行数；没有可改善的行时返回None"""
+    selectivity = 1.0
+    for column in columns:
+        selectivity *= RANGE_SELECTIVITY if column in predicates["range"] and column not in predicates["eq"] \
+            else max(ndv(table, column), 1)
+    only_join = not predicates["eq"] and not predicates["range"]
+    seen = set()
+    changed = False
+    estimated = []
+    for row in plan:
+        row = dict(row)
+        select_id = row.get("id") or 0
+        first = select_id not in seen
+        seen.add(select_id)
+        name = str(row.get("table") or "").lower()
+        if (refs.get(name, name) == table and (row.get("type") or "").upper() in FULL_SCAN_TYPES
+                and not (only_join and first)):
+            rows = int(row.get("rows") or 0)
+            row["rows"] = max(1, math.ceil(rows / selectivity))
+            row["type"] = "ref"
+            changed = changed or row["rows"] < rows
+        estimated.append(row)
+    return estimated if changed else None
+
+
+def index_name(table: str, columns: List[str]) -> str:
+    return re.sub(r"\W", "_", f"idx_{table}_{'_'.join(columns)}")[:64]
+
+
+def merge_prefixes(candidates: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """同一张表上列是另一候选前缀的候选并入较长的那个（较长的索引同样能服务这些查询）"""
+    ordered = sorted(candidates.values(), key=lambda c: -len(c["columns"]))
+    merged = []
+    for cand in ordered:
+        target = next((m for m in merged if m["table"] == cand["table"]
+                       and m["columns"][:len(cand["columns"])] == cand["columns"]), None)
+        if target is None:
+            merged.append(cand)
+            continue
+        target["rows_before"] += cand["rows_before"]
+        target["rows_after"] += cand["rows_after"]
+        target["executions"] += cand["executions"]
+        target["queries"].extend(cand["queries"])
+    return merged
+
+
+def advise(workload: List[Dict[str, Any]], schema: Dict[str, Any], explain: Callable[[str], Dict[str, Any]],
+           ndv: Callable[[str, str], int]) -> List[Dict[str, Any]]:
+    """返回按扫描行数减少量排序的索引建议"""
+    keys = schema_keys(schema)
+    candidates = {}
+    for item in workload:
+        predicates = extract_predicates(item["sql"], keys)
+        if not predicates:
+            continue
+        result = explain(item["sql"])
+        if not result.get("success"):
+            continue
+        plan = result["plan"]
+        tokens = tokenize(item["sql"])
+        refs, _ = table_refs(tokens, 0, len(tokens))
+        before = rows_examined(plan)
+        for table, preds in predicates.items():
+            columns = candidate_columns(preds)
+            if not columns or leading_indexed(keys, table, columns[0]):
+                continue
+            estimated = plan_with_index(plan, refs, table, columns, preds, ndv)
+            if estimated is None:
+                continue
+            after = rows_examined(estimated)
+            if after >= before:
+                continue
+            cand = candidates.setdefault((table, tuple(columns)), {
+                "table": table, "columns": columns, "rows_before": 0, "rows_after": 0, "executions": 0, "queries": []})
+            cand["rows_before"] += before * item["count"]
+            cand["rows_after"] += after * item["count"]
+            cand["executions"] += item["count"]
+            cand["queries"].append(item["fingerprint"])
+
+    advice = merge_prefixes(candidates)
+    for cand in advice:
+        cand["reduction"] = cand["rows_before"] - cand["rows_after"]
+        cand["reduction_pct"] = round(100.0 * cand["reduction"] / cand["rows_before"], 1) if cand["rows_before"] else 0.0
+        cand["ddl"] = (f"CREATE INDEX `{index_name(cand['table'], cand['columns'])}` ON `{cand['table']}` "
+                       f"({', '.join(f'`{c}`' for c in cand['columns'])})")
+    advice.sort(key=lambda c: (-c["reduction"], c["table"]))
+    return advice
+
+
+def ndv_estimator(query: Callable[[str], Dict[str, Any]], enabled: bool = True) -> Callable[[str, str], int]:
+    """列的不同值个数，带缓存；无法查询（例如敏感字段被拦截）时按DEFAULT_NDV估算"""
+    cache = {}
+
+    def ndv(table: str, column: str) -> int:
+        if (table, column) not in cache:
+            value = DEFAULT_NDV
+            if enabled:
+                result = query(f"SELECT COUNT(DISTINCT `{column}`) AS {NDV_ALIAS} FROM `{table}`")
+                if result.get("success") and result.get("results"):
+                    value = int(result["results"][0][NDV_ALIAS] or 1)
+            cache[(table, column)] = value
+        return cache[(table, column)]
+
+    return ndv
+
+
+def print_advice(advice: List[Dict[str, Any]], top: int):
+    if not advice:
+        print("没有发现可以通过新增索引明显减少扫描行数的查询。")
+        return
+    print("=" * 100)
+    print(f"{'#':<4}{'建议索引':<56}{'查询类':>6}{'执行次数':>8}{'扫描行数(前 -> 后)':>22}{'减少':>8}")
+    print("-" * 100)
+    for n, cand in enumerate(advice[:top], 1):
+        target = f"{cand['table']}({', '.join(cand['columns'])})"
+        rows = f"{cand['rows_before']} -> {cand['rows_after']}"
+        print(f"{n:<4}{target:<56}{len(cand['queries']):>6}{cand['executions']:>8}{rows:>22}{cand['reduction_pct']:>7}%")
+    print("=" * 100)
+    print("建议语句（仅供评审，本工具不会执行）：")
+    for cand in advice[:top]:
+        print(f"  {cand['ddl']};")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="基于查询日志的索引建议（只读，不执行DDL）")
+    parser.add_argument("--log", default="query.log", help="查询日志文件（服务端可用时优先通过 /logs 读取）")
+    parser.add_argument("--limit", type=int, default=100000, help="最多分析最近多少条日志")
+    parser.add_argument("--database", help="目标数据库（多数据库模式）")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--no-ndv", action="store_true", help="不查询列的不同值个数，按固定选择率估算")
+    parser.add_argument("--json", help="把完整建议写到JSON文件")
+    args = parser.parse_args(argv)
+
+    from mcp_client import explain_query, get_logs, get_schema, query_data
+
+    workload = load_workload(get_logs(args.log, args.limit))
+    print(f"日志中共有 {sum(g['count'] for g in workload)} 条查询，{len(workload)} 类")
+    advice = advise(workload, get_schema(args.database),
+                    lambda sql: explain_query(sql, database=args.database),
+                    ndv_estimator(lambda sql: query_data(sql, database=args.database), not args.no_ndv))
+    print_advice(advice, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(advice, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,403 @@
+"""
+后台查询任务：长时间运行的分析查询提交后立即返回任务ID，由有界工作线程池按优先级执行。
+
+结果逐行写入磁盘（<id>.jsonl，每行一个JSON数组），同时记录每行的字节偏移（<id>.idx，
+8字节无符号整数），分页读取时通过mmap按偏移直接定位，不需要把整个结果读入内存。
+任务状态保存在 <id>.json 中，同一目录下的多个worker进程都能查询状态和结果；
+取消请求写入 <id>.cancel 标记，由执行该任务的进程发现后终止查询。
+每个进程定期更新 <owner>.owner 心跳文件，任务记录所属进程；所属进程已退出（心跳超时）时，
+遗留的排队中/执行中任务被标记为失败；正常停止时排队中的任务标记为已取消。
+过期、超出数量或磁盘上限的已结束任务会被清理。
+"""
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("mysql-mcp-server")
+
+ACTIVE_STATES = ("queued", "running")
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, manager: "JobManager", meta: Dict[str, Any]):
+        self.manager = manager
+        self.meta = meta
+        self.cancelled = threading.Event()
+        self._cancel_hooks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    def on_cancel(self, hook: Callable[[], Any]):
+        """由执行函数注册取消回调（例如KILL QUERY）；已取消时立即调用"""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._cancel_hooks.append(hook)
+                return
+        hook()
+
+    def clear_cancel_hooks(self):
+        with self._lock:
+            self._cancel_hooks.clear()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            hooks = list(self._cancel_hooks)
+            self._cancel_hooks.clear()
+        for hook in hooks:
+            hook()
+
+    def update(self, **fields):
+        self.meta.update(fields)
+        self.manager.save_meta(self.meta)
+
+    def open_writer(self, columns: List[str]) -> "ResultWriter":
+        self.update(columns=columns)
+        return ResultWriter(self.manager.data_path(self.id), self.manager.index_path(self.id),
+                            self.manager.max_result_bytes)
+
+
+class ResultWriter:
+    """逐行追加结果并记录偏移；超过max_bytes时抛出异常"""
+    def __init__(self, data_path: str, index_path: str, max_bytes: int = 0):
+        self.data = open(data_path, "wb")
+        self.index = open(index_path, "wb")
+        self.max_bytes = max_bytes
+        self.offset = 0
+        self.rows = 0
+        self._offsets = array("Q")
+
+    def write_rows(self, rows):
+        for row in rows:
+            line = json.dumps(list(row), ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+            self._offsets.append(self.offset)
+            self.data.write(line)
+            self.offset += len(line)
+            self.rows += 1
+        if self.max_bytes and self.offset > self.max_bytes:
+            raise ValueError(f"Result exceeds the job result limit of {self.max_bytes} bytes")
+        # 先让数据落盘再追加偏移，读取方看到的偏移对应的行都已完整写入
+        self.data.flush()
+        self._offsets.tofile(self.index)
+        self.index.flush()
+        self._offsets = array("Q")
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+def read_result_page(data_path: str, index_path: str, start: int, count: int) -> List[list]:
+    """通过mmap读取第start行起的count行；任务运行中时只返回偏移已写入索引、数据已完整落盘的行"""
+    # 先取索引长度再取数据长度：写入方先写数据后写偏移，索引中的偏移都不超过此时的数据长度
+    total = os.path.getsize(index_path) // 8
+    data_size = os.path.getsize(data_path)
+    if start >= total or count <= 0 or data_size == 0:
+        return []
+    end = min(start + count, total)
+    with open(index_path, "rb") as fi, open(data_path, "rb") as fd:
+        with mmap.mmap(fi.fileno(), total * 8, access=mmap.ACCESS_READ) as mi, \
+                mmap.mmap(fd.fileno(), data_size, access=mmap.ACCESS_READ) as md:
+            offsets = array("Q")
+            # 多读一个偏移作为最后一行的结束位置，读到索引末尾时读到数据末尾（之后可能是正在写入的行）
+            offsets.frombytes(mi[start * 8:min(end + 1, total) * 8])
+            stop = offsets[-1] if end < total else data_size
+            chunk = md[min(offsets[0], data_size):min(stop, data_size)]
+    # 每行以换行结束，最后一段是未写完的行或空串
+    return [json.loads(line) for line in chunk.split(b"\n")[:-1][:end - start]]
+
+
+class JobManager:
+    def __init__(self, execute: Callable[[Job], None], jobs_dir: str, workers: int = 2,
+                 queue_limit: int = 100, retention_seconds: float = 86400, max_jobs: int = 200,
+                 max_total_bytes: int = 1 << 30, max_result_bytes: int = 0, owner_timeout: float = 30):
+        self.execute = execute
+        self.jobs_dir = jobs_dir
+        self.workers = max(workers, 1)
+        self.queue_limit = queue_limit
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self.max_total_bytes = max_total_bytes
+        self.max_result_bytes = max_result_bytes
+        self.owner_timeout = owner_timeout
+        # 本进程的标识，写入任务状态，并通过心跳文件让其他进程判断本进程是否仍在运行
+        self.owner = uuid.uuid4().hex
+        self._queue = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._threads = []
+
+    def start(self):
+        """启动工作线程和取消标记监视线程"""
+        if self._threads:
+            return
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._heartbeat()
+        self.recover()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._watch, name="job-watcher", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            running = [job for job in self._jobs.values() if job.meta["status"] == "running"]
+            queued = [job for job in self._jobs.values() if job.meta["status"] == "queued"]
+            self._queue.clear()
+            for job in queued:
+                self._jobs.pop(job.id, None)
+            self._cond.notify_all()
+        for job in queued:
+            job.cancel()
+            job.update(status="cancelled", finished_at=time.time(), queue_position=None,
+                       error="Server shut down before the job started")
+        for job in running:
+            job.cancel()
+
+    # 文件路径
+    def meta_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def data_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.jsonl")
+
+    def index_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.idx")
+
+    def cancel_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.cancel")
+
+    def owner_path(self, owner: str) -> str:
+        return os.path.join(self.jobs_dir, f"{owner}.owner")
+
+    def save_meta(self, meta: Dict[str, Any]):
+        path = self.meta_path(meta["id"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务状态；任务可能由其他worker进程执行，所以以磁盘上的状态为准"""
+        if not all(c.isalnum() for c in job_id):
+            return None
+        try:
+            with open(self.meta_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        metas = []
+        if not os.path.isdir(self.jobs_dir):
+            return metas
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".json"):
+                meta = self.get(name[:-5])
+                if meta:
+                    metas.append(meta)
+        metas.sort(key=lambda m: m["submitted_at"], reverse=True)
+        return metas[:limit]
+
+    def submit(self, priority: int = 0, **params) -> Dict[str, Any]:
+        """提交任务，priority越大越先执行；队列已满时抛出QueueFull"""
+        self.cleanup()
+        meta = {"id": uuid.uuid4().hex, "status": "queued", "priority": int(priority),
+                "submitted_at": time.time(), "started_at": None, "finished_at": None,
+                "row_count": 0, "columns": None, "error": None, "owner": self.owner, **params}
+        with self._cond:
+            if self._stopped:
+                raise QueueFull("Job manager is shutting down")
+            if len(self._queue) >= self.queue_limit:
+                raise QueueFull(f"Job queue is full ({self.queue_limit} jobs waiting)")
+            job = Job(self, meta)
+            self.save_meta(meta)
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (-job.meta["priority"], next(self._seq), job.id))
+            meta["queue_position"] = len(self._queue)
+            self._cond.notify()
+        return dict(meta)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消排队或执行中的任务；任务由其他进程执行时写入取消标记"""
+        meta = self.get(job_id)
+        if meta is None or meta["status"] not in ACTIVE_STATES:
+            return meta
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None:
+            if not self._owner_alive(meta.get("owner"), time.time()):
+                # 所属进程已退出，没有人会读取取消标记
+                meta.update(status="cancelled", finished_at=time.time(), queue_position=None,
+                            error="Job was cancelled")
+                self.save_meta(meta)
+                return meta
+            open(self.cancel_path(job_id), "w").close()
+            return meta
+        job.cancel()
+        if job.meta["status"] == "queued":
+            job.update(status="cancelled", finished_at=time.time())
+        return dict(job.meta)
+
+    def delete(self, job_id: str) -> bool:
+        """删除已结束任务的状态和结果文件"""
+        meta = self.get(job_id)
+        if meta is None or meta["status"] in ACTIVE_STATES:
+            return False
+        self._remove_files(job_id)
+        return True
+
+    def results(self, job_id: str, page: int = 0, page_size: int = 100) -> Optional[Dict[str, Any]]:
+        meta = self.get(job_id)
+        if meta is None:
+            return None
+        rows = []
+        if os.path.exists(self.index_path(job_id)):
+            raw = read_result_page(self.data_path(job_id), self.index_path(job_id), page * page_size, page_size + 1)
+            columns = meta.get("columns") or []
+            rows = [dict(zip(columns, row)) for row in raw]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        return {"success": meta["status"] == "succeeded", "status": meta["status"], "error": meta.get("error"),
+                "results": rows, "rowCount": len(rows), "total_rows": meta.get("row_count", 0),
+                "page": page, "page_size": page_size, "has_more": has_more}
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs.get(job_id)
+            if job is None or job.cancelled.is_set():
+                with self._cond:
+                    self._jobs.pop(job_id, None)
+                continue
+            job.update(status="running", started_at=time.time(), queue_position=None)
+            try:
+                self.execute(job)
+                if job.cancelled.is_set():
+                    raise JobCancelled()
+                job.update(status="succeeded", finished_at=time.time())
+            except Exception as e:
+                if job.cancelled.is_set():
+                    job.update(status="cancelled", finished_at=time.time(), error="Job was cancelled")
+                else:
+                    logger.warning(f"Job {job_id} failed: {e}")
+                    job.update(status="failed", finished_at=time.time(), error=str(e))
+            finally:
+                with self._cond:
+                    self._jobs.pop(job_id, None)
+                if os.path.exists(self.cancel_path(job_id)):
+                    os.remove(self.cancel_path(job_id))
+            self.cleanup()
+
+    def _heartbeat(self):
+        with open(self.owner_path(self.owner), "a"):
+            pass
+        os.utime(self.owner_path(self.owner))
+
+    def _owner_alive(self, owner: Optional[str], now: float) -> bool:
+        if owner == self.owner:
+            return True
+        try:
+            return owner is not None and now - os.path.getmtime(self.owner_path(owner)) <= self.owner_timeout
+        except OSError:
+            return False
+
+    def recover(self):
+        """所属进程已退出（重启或崩溃）的排队中/执行中任务不会再执行，标记为失败；同时删除过期的心跳文件"""
+        now = time.time()
+        for meta in self.list(limit=1 << 30):
+            if meta["status"] in ACTIVE_STATES and not self._owner_alive(meta.get("owner"), now):
+                logger.warning(f"Job {meta['id']} was {meta['status']} in a process that has exited")
+                meta.update(status="failed", finished_at=now, queue_position=None,
+                            error="Server restarted before the job finished")
+                self.save_meta(meta)
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".owner") and not self._owner_alive(name[:-6], now):
+                try:
+                    os.remove(os.path.join(self.jobs_dir, name))
+                except OSError:
+                    pass
+
+    def _watch(self):
+        """更新心跳、发现其他进程写入的取消标记，并定期回收已退出进程遗留的任务"""
+        last_recover = time.monotonic()
+        while not self._stopped:
+            time.sleep(1)
+            self._heartbeat()
+            if time.monotonic() - last_recover >= self.owner_timeout / 3:
+                last_recover = time.monotonic()
+                self.recover()
+            with self._cond:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                if not job.cancelled.is_set() and os.path.exists(self.cancel_path(job.id)):
+                    job.cancel()
+                    if job.meta["status"] == "queued":
+                        job.update(status="cancelled", finished_at=time.time())
+
+    def _remove_files(self, job_id: str):
+        for path in (self.data_path(job_id), self.index_path(job_id), self.meta_path(job_id),
+                     self.cancel_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self):
+        """按保留时间、任务数量和磁盘占用清理已结束的任务，最早结束的先删"""
+        finished = [m for m in self.list(limit=1 << 30) if m["status"] in FINISHED_STATES]
+        finished.sort(key=lambda m: m.get("finished_at") or 0)
+        now = time.time()
+        total = sum(self._size(m["id"]) for m in finished)
+        remaining = len(finished)
+        for meta in finished:
+            expired = now - (meta.get("finished_at") or now) > self.retention_seconds
+            if not expired and remaining <= self.max_jobs and total <= self.max_total_bytes:
+                break
+            total -= self._size(meta["id"])
+            remaining -= 1
+            self._remove_files(meta["id"])
+
+    def _size(self, job_id: str) -> int:
+        size = 0
+        for path in (self.data_path(job_id), self.index_path(job_id)):
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"queued": len(self._queue), "active": len(self._jobs), "workers": self.workers}
@@ -1,20 +1,103 @@
 import requests
 import json
 import os
+import time
 from typing import Dict, Any
-from mcp_client import get_sample_rows
+from mcp_client import get_profile
+from sql_rewrite import rewrite_sql
+from sql_validator import validate_sql, format_errors
+from example_store import ExampleStore
+from fast_path import FastPathStats, match_question
+from profiler import describe_table
 
 # 通义千问API配置
 QWEN_API_KEY = os.getenv("QWEN_API_KEY", "sk-1b77e5585d7247a1959baa1d8249264f")
-QWEN_API_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+QWEN_API_URL = os.getenv("QWEN_API_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions")
+# 生成后按固定规则改写已知的慢写法（见sql_rewrite.py）
+SQL_REWRITE = os.getenv("SQL_REWRITE", "1") != "0"
+# 生成后按表结构校验表名和列名，有错误时带上错误说明重新生成一次
+SQL_VALIDATE = os.getenv("SQL_VALIDATE", "1") != "0"
+# 少样本示例库：执行成功的问题/SQL对保存在该文件，每次最多挑选EXAMPLE_K条、总计不超过EXAMPLE_TOKEN_BUDGET个token
+EXAMPLE_STORE_FILE = os.getenv("EXAMPLE_STORE_FILE", "examples.jsonl")
+EXAMPLE_STORE_MAX = int(os.getenv("EXAMPLE_STORE_MAX", "500"))
+EXAMPLE_K = int(os.getenv("EXAMPLE_K", "3"))
+EXAMPLE_TOKEN_BUDGET = int(os.getenv("EXAMPLE_TOKEN_BUDGET", "400"))
+
+# 列统计画像（见profiler.py）在本地缓存的秒数；画像未就绪时只在PROFILE_RETRY_SECONDS秒后重试，不阻塞生成
+PROFILE_CACHE_SECONDS = float(os.getenv("PROFILE_CACHE_SECONDS", "300"))
+PROFILE_RETRY_SECONDS = float(os.getenv("PROFILE_RETRY_SECONDS", "10"))
+
+# 常见的模板化问题在本地直接生成SQL，不调用大模型（见fast_path.py），设置 FAST_PATH=0 关闭
+FAST_PATH = os.getenv("FAST_PATH", "1") != "0"
+
+_example_store = None
+_fast_path_stats = FastPathStats()
+_profile_cache = {"profile": None, "expires": 0.0}
+
+
+def get_example_store() -> ExampleStore:
+    global _example_store
+    if _example_store is None:
+        _example_store = ExampleStore(EXAMPLE_STORE_FILE, EXAMPLE_STORE_MAX)
+    return _example_store
+
+
+def record_example(question: str, sql: str):
+    """执行成功后调用，把问题和SQL加入示例库供之后的查询参考"""
+    if not question or not sql or sql.startswith(("错误", "解析错误")):
+        return
+    try:
+        get_example_store().add(question, sql)
+    except OSError as e:
+        print(f"保存示例失败: {e}")
+
+
+def load_profile() -> Dict[str, Any]:
+    """返回各表的列统计（表名 -> 统计），服务端尚未计算完成或请求失败时返回空字典"""
+    now = time.time()
+    if now < _profile_cache["expires"]:
+        return _profile_cache["profile"] or {}
+    try:
+        result = get_profile()
+    except Exception:
+        result = {}
+    ready = result.get("status") == "ready"
+    _profile_cache["profile"] = result.get("tables") if ready else None
+    _profile_cache["expires"] = now + (PROFILE_CACHE_SECONDS if ready else PROFILE_RETRY_SECONDS)
+    return _profile_cache["profile"] or {}
+
+
+def fast_path_stats() -> Dict[str, Any]:
+    """快速路径的命中率和估算节省的时间"""
+    return _fast_path_stats.snapshot()
 
 
 def generate_sql_from_prompt(prompt: str, schema: Dict[str, Any], history: list = None) -> str:
+    """
+    根据自然语言提示和数据库模式生成SQL：先尝试规则快速路径，未命中再调用大模型。
+    """
+    if not FAST_PATH:
+        return generate_sql_with_llm(prompt, schema, history)
+    start = time.perf_counter()
+    hit = match_question(prompt, schema, load_profile)
+    match_ms = (time.perf_counter() - start) * 1000
+    if hit:
+        _fast_path_stats.record_hit(hit["template"], match_ms)
+        print(f"快速路径 [{hit['template']}]: 未调用大模型")
+        return hit["sql"]
+    start = time.perf_counter()
+    sql = generate_sql_with_llm(prompt, schema, history)
+    _fast_path_stats.record_miss(match_ms, (time.perf_counter() - start) * 1000)
+    return sql
+
+
+def generate_sql_with_llm(prompt: str, schema: Dict[str, Any], history: list = None) -> str:
     """
     根据自然语言提示和数据库模式生成高效、准确的SQL。
     支持few-shot示例和上下文。
     """
-    # 1. 构造数据库Schema描述
+    # 1. 构造数据库Schema描述，附带各表的列统计摘要（不发送原始数据行）
+    profile = load_profile()
     schema_description = "数据库结构如下：\n"
     for table_name, columns in schema.items():
         if not isinstance(columns, list) or not columns:
@@ -31,38 +114,12 @@ def generate_sql_from_prompt(prompt: str, schema: Dict[str, Any], history: list
         if fk:
             schema_description += f"  外键: {', '.join(fk)}\n"
 
-        try:
-            samples = get_sample_rows(table_name, 2)
-            if samples:
-                schema_description += "  示例: " + "; ".join(
-                    ", ".join(f"{k}:{v}" for k, v in row.items()) for row in samples
-                ) + "\n"
-        except Exception:
-            pass
+        summary = describe_table(profile.get(table_name))
+        if summary:
+            schema_description += f"  统计: {summary}\n"
     
-    # 2. Few-shot示例（可扩展）
-    few_shot_examples = [
-        {
-            "user": "列出所有学生的姓名和年龄",
-            "sql": "SELECT name, age FROM student;"
-        },
-        {
-            "user": "查询所有课程的名称和学分",
-            "sql": "SELECT name, credit FROM course;"
-        },
-        {
-            "user": "找出所有有多个先修课程的课程",
-            "sql": "SELECT course_id FROM prerequisite GROUP BY course_id HAVING COUNT(*) > 1;"
-        },
-        {
-            "user": "查询所有有多个导师的学生姓名",
-            "sql": "SELECT s.name FROM student s JOIN advisor a ON s.id = a.s_id GROUP BY s.id HAVING COUNT(a.t_id) > 1;"
-        },
-        {
-            "user": "查找课程'International Finance'的先修课程标题",
-            "sql": "SELECT c2.title FROM course c1 JOIN prerequisite p ON c1.id = p.course_id JOIN course c2 ON p.prereq_id = c2.id WHERE c1.title = 'International Finance';"
-        }
-    ]
+    # 2. Few-shot示例：从执行成功的历史查询中挑选与当前问题最相关的几条（见example_store.py）
+    few_shot_examples = get_example_store().select(prompt, schema, k=EXAMPLE_K, token_budget=EXAMPLE_TOKEN_BUDGET)
     
     # # 3. 多轮上下文（如有）
     # context_str = ""
@@ -83,8 +140,9 @@ def generate_sql_from_prompt(prompt: str, schema: Dict[str, Any], history: list
     prompt_parts = [
         "你是一个专业的SQL生成助手。",
         schema_description,
-        "--- 示例 ---"
     ]
+    if few_shot_examples:
+        prompt_parts.append("--- 示例 ---")
     for ex in few_shot_examples:
         prompt_parts.append(f"用户: {ex['user']}\nSQL: {ex['sql']}")
     # if context_str:
@@ -97,7 +155,29 @@ def generate_sql_from_prompt(prompt: str, schema: Dict[str, Any], history: list
     
     # 调用API
     response = call_qwen_api(full_prompt)
-    return parse_sql_response(response)
+    sql = parse_sql_response(response)
+    if sql.startswith(("错误", "解析错误")):
+        return sql
+    if SQL_VALIDATE:
+        errors = validate_sql(sql, schema)
+        if errors:
+            print(f"生成的SQL未通过校验，重新生成: {format_errors(errors)}")
+            retry_prompt = "\n".join([
+                full_prompt, sql,
+                "--- 校验错误 ---",
+                f"上面的SQL存在以下问题：{format_errors(errors)}",
+                "请只使用数据库结构中存在的表和字段，修正后重新输出SQL。",
+                "SQL:",
+            ])
+            retried = parse_sql_response(call_qwen_api(retry_prompt))
+            if retried.startswith(("错误", "解析错误")):
+                return sql
+            sql = retried
+    if SQL_REWRITE:
+        sql, applied = rewrite_sql(sql, schema)
+        for info in applied:
+            print(f"SQL改写 [{info['rule']}]: {info['original']}")
+    return sql
 
 
 def call_qwen_api(prompt: str) -> Dict[str, Any]:
@@ -0,0 +1,316 @@
+"""
+FastAPI服务并发压测工具：按负载配比文件以给定并发和请求速率驱动
+/query_data、/schema、/tables、/sample_rows、/logs 等接口，
+记录HDR风格的延迟直方图、错误率和逐秒吞吐，并支持两次运行结果对比。
+
+延迟按"计划发出时间"计算（修正协调遗漏），同时记录实际服务时间。
+
+用法:
+  python loadtest.py run --url http://localhost:8000 --concurrency 16 --rate 200 --duration 30
+  python loadtest.py compare bench_results/loadtest_a.json bench_results/loadtest_b.json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import requests
+
+from benchmark import git_revision, save_results
+
+DEFAULT_MIX = "fixtures/loadtest_mix.json"
+REPORT_PERCENTILES = [50, 90, 95, 99, 99.9]
+
+
+class LatencyHistogram:
+    """对数-线性分桶的延迟直方图（HDR风格），以微秒记录，相对误差约1.6%"""
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return shift * cls.SUB_BUCKET_HALF + (value >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> int:
+        """桶的代表值（桶区间中点）"""
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        shift = index // cls.SUB_BUCKET_HALF - 1
+        mantissa = index - shift * cls.SUB_BUCKET_HALF
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, micros: int):
+        micros = max(int(micros), 0)
+        index = self._index(micros)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.total += 1
+            self.sum += micros
+            self.max = max(self.max, micros)
+            self.min = micros if self.min is None else min(self.min, micros)
+
+    def merge(self, other: "LatencyHistogram"):
+        with self._lock:
+            for index, count in other.counts.items():
+                self.counts[index] = self.counts.get(index, 0) + count
+            self.total += other.total
+            self.sum += other.sum
+            self.max = max(self.max, other.max)
+            if other.min is not None:
+                self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, pct: float) -> int:
+        if not self.total:
+            return 0
+        target = max(int(round(pct / 100.0 * self.total + 0.5)), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        result = {"count": self.total}
+        if not self.total:
+            return result
+        result["min_ms"] = round(self.min / 1000, 3)
+        result["mean_ms"] = round(self.sum / self.total / 1000, 3)
+        result["max_ms"] = round(self.max / 1000, 3)
+        for pct in REPORT_PERCENTILES:
+            result[f"p{pct:g}_ms"] = round(self.percentile(pct) / 1000, 3)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"summary": self.summary(), "buckets": {str(k): v for k, v in sorted(self.counts.items())},
+                "min_us": self.min, "max_us": self.max, "sum_us": self.sum}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        hist = cls()
+        hist.counts = {int(k): v for k, v in data.get("buckets", {}).items()}
+        hist.total = sum(hist.counts.values())
+        hist.min = data.get("min_us")
+        hist.max = data.get("max_us") or 0
+        hist.sum = data.get("sum_us") or 0
+        return hist
+
+
+def load_mix(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        endpoints = json.load(f)["endpoints"]
+    for endpoint in endpoints:
+        endpoint.setdefault("method", "GET")
+        endpoint.setdefault("weight", 1)
+        endpoint.setdefault("name", endpoint["path"])
+    return endpoints
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, endpoints: List[Dict[str, Any]], concurrency: int, rate: float,
+                 duration: float, max_requests: int = 0, timeout: float = 30, seed: int = 0):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = endpoints
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._weights = [e["weight"] for e in endpoints]
+        self._lock = threading.Lock()
+        self._next = 0
+        self.histograms = {e["name"]: LatencyHistogram() for e in endpoints}
+        self.service_histograms = {e["name"]: LatencyHistogram() for e in endpoints}
+        self.errors: Dict[str, Dict[str, int]] = {e["name"]: {} for e in endpoints}
+        self.timeline: Dict[int, Dict[str, int]] = {}
+
+    def _claim(self):
+        """领取下一个请求：返回(序号, 计划发出时间, 接口)，到达时长或请求数上限时返回None"""
+        with self._lock:
+            seq = self._next
+            if self.max_requests and seq >= self.max_requests:
+                return None
+            scheduled = self._start + seq / self.rate if self.rate else time.perf_counter()
+            if scheduled - self._start >= self.duration:
+                return None
+            self._next += 1
+            endpoint = self._random.choices(self.endpoints, weights=self._weights)[0]
+        return seq, scheduled, endpoint
+
+    def _record(self, endpoint: Dict[str, Any], scheduled: float, sent: float, done: float, error: str):
+        name = endpoint["name"]
+        self.histograms[name].record((done - scheduled) * 1_000_000)
+        self.service_histograms[name].record((done - sent) * 1_000_000)
+        second = int(done - self._start)
+        with self._lock:
+            slot = self.timeline.setdefault(second, {"requests": 0, "errors": 0})
+            slot["requests"] += 1
+            if error:
+                slot["errors"] += 1
+                self.errors[name][error] = self.errors[name].get(error, 0) + 1
+
+    def _worker(self):
+        session = requests.Session()
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                break
+            _, scheduled, endpoint = claimed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            error = None
+            try:
+                resp = session.request(endpoint["method"], self.base_url + endpoint["path"],
+                                       params=endpoint.get("params"), json=endpoint.get("json"),
+                                       timeout=self.timeout)
+                if resp.status_code >= 400:
+                    error = f"HTTP {resp.status_code}"
+                elif endpoint["path"] == "/query_data" and not resp.json().get("success", False):
+                    error = "query failed"
+            except requests.exceptions.Timeout:
+                error = "timeout"
+            except requests.exceptions.RequestException as e:
+                error = type(e).__name__
+            self._record(endpoint, scheduled, sent, time.perf_counter(), error)
+        session.close()
+
+    def run(self) -> Dict[str, Any]:
+        self._start = time.perf_counter()
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - self._start
+
+        overall = LatencyHistogram()
+        overall_service = LatencyHistogram()
+        per_endpoint = {}
+        total_errors = 0
+        for name, hist in self.histograms.items():
+            overall.merge(hist)
+            overall_service.merge(self.service_histograms[name])
+            errors = sum(self.errors[name].values())
+            total_errors += errors
+            per_endpoint[name] = {
+                "latency": hist.to_dict(),
+                "service_time": self.service_histograms[name].summary(),
+                "errors": self.errors[name],
+                "error_rate": round(errors / hist.total, 4) if hist.total else 0.0,
+            }
+        return {
+            "meta": {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "git": git_revision(),
+                "url": self.base_url,
+                "concurrency": self.concurrency,
+                "target_rate": self.rate,
+                "duration": self.duration,
+            },
+            "requests": overall.total,
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(overall.total / wall, 3) if wall else 0.0,
+            "error_rate": round(total_errors / overall.total, 4) if overall.total else 0.0,
+            "latency": overall.to_dict(),
+            "service_time": overall_service.summary(),
+            "endpoints": per_endpoint,
+            "timeline": [dict(second=s, **self.timeline[s]) for s in sorted(self.timeline)],
+        }
+
+
+def print_results(results: Dict[str, Any]):
+    print("=" * 90)
+    print(f"{'接口':<18}{'请求数':>8}{'错误率':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'p99.9(ms)':>11}{'max(ms)':>10}")
+    print("-" * 90)
+    rows = [(name, data["latency"]["summary"], data["error_rate"]) for name, data in results["endpoints"].items()]
+    rows.append(("总计", results["latency"]["summary"], results["error_rate"]))
+    for name, s, error_rate in rows:
+        if not s.get("count"):
+            continue
+        print(f"{name:<18}{s['count']:>8}{error_rate:>8.2%}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['p99.9_ms']:>11.2f}{s['max_ms']:>10.2f}")
+    print("-" * 90)
+    print(f"吞吐: {results['throughput_rps']} 请求/秒，耗时 {results['wall_seconds']} 秒")
+    print("=" * 90)
+
+
+def compare_results(old_path: str, new_path: str):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+7.1f}%" if a else "   n/a"
+
+    print("=" * 90)
+    print(f"对比: {old_path} ({old['meta'].get('git', '')}) -> {new_path} ({new['meta'].get('git', '')})")
+    print("-" * 90)
+    names = ["总计"] + [name for name in new["endpoints"] if name in old["endpoints"]]
+    for name in names:
+        if name == "总计":
+            a, b = old["latency"]["summary"], new["latency"]["summary"]
+        else:
+            a, b = old["endpoints"][name]["latency"]["summary"], new["endpoints"][name]["latency"]["summary"]
+        if not a.get("count") or not b.get("count"):
+            continue
+        cells = [f"{key[:-3]} {a[key]:.2f}->{b[key]:.2f} ({delta(a[key], b[key])})" for key in ("p50_ms", "p99_ms")]
+        print(f"{name:<18}" + "  ".join(cells))
+    print("-" * 90)
+    print(f"吞吐: {old['throughput_rps']} -> {new['throughput_rps']} 请求/秒 ({delta(old['throughput_rps'], new['throughput_rps'])})")
+    print(f"错误率: {old['error_rate']:.2%} -> {new['error_rate']:.2%}")
+    print("=" * 90)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastAPI服务并发压测工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="执行压测")
+    run.add_argument("--url", default="http://localhost:8000")
+    run.add_argument("--mix", default=DEFAULT_MIX, help="负载配比文件")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--rate", type=float, default=0, help="目标请求速率(请求/秒)，0表示不限速")
+    run.add_argument("--duration", type=float, default=30, help="压测时长(秒)")
+    run.add_argument("--requests", type=int, default=0, help="请求总数上限，0表示不限")
+    run.add_argument("--timeout", type=float, default=30)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", help="结果JSON路径，默认写到 bench_results/")
+
+    compare = sub.add_parser("compare", help="对比两次压测结果")
+    compare.add_argument("old")
+    compare.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        generator = LoadGenerator(args.url, load_mix(args.mix), args.concurrency, args.rate,
+                                  args.duration, args.requests, args.timeout, args.seed)
+        results = generator.run()
+        print_results(results)
+        print(f"结果已保存: {save_results(results, args.output, prefix='loadtest')}")
+    elif args.command == "compare":
+        compare_results(args.old, args.new)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,45 @@
 import os
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "cli":
+    # 命令行模式只通过HTTP访问服务端，直接进入CLI，不加载下面的服务端依赖
+    from cli import main as cli_main
+    sys.exit(cli_main(sys.argv[2:]))
+
+import io
+import csv
+import json
+import signal
+import asyncio
 import logging
-from typing import Any, Dict
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 import MySQLdb
 import re
+import time
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from mcp.server.fastmcp import FastMCP
+import anyio
+from mcp.server.fastmcp import FastMCP, Context
+from mcp.server.sse import SseServerTransport
+from mcp.server.stdio import stdio_server
 from datetime import datetime
+from db_targets import TargetRegistry, UnknownDatabase, load_targets
+from db_replicas import parse_replicas
+from singleflight import SingleFlight, FlightCancelled
+from sql_text import normalize_sql, paginate_sql
+from sql_validator import validate_sql, format_errors
+from sql_params import check_params, execute_prepared, inline_params, statement_cache_stats
+from jobs import JobManager, JobCancelled, QueueFull
+from profiler import ProfileStore, profile_table, schema_version
+from approx import bounds_sql, estimate, plan_approximate, sample_sql
+from watch import WatchLimit, WatchManager
+from snapshots import SnapshotLimit, SnapshotManager
 
 # Create MCP server instance
 mcp = FastMCP("mysql-server")
@@ -21,13 +53,130 @@ DB_CONFIG = {
     "port": int(os.getenv("DB_PORT", 3306))
 }
 
+# mysql=真实MySQL服务器；standin=基于sqlite的本地替身库（DB_NAME对应fixtures/下的SQL文件），用于离线测试
+DB_DRIVER = os.getenv("DB_DRIVER", "mysql").lower()
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "query.log")
+
+# 连接池与表结构缓存；启动时预热，预热完成前 /ready 返回503
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 300))
+# 收到SIGTERM后先让 /ready 返回503，等待DRAIN_SECONDS秒让负载均衡摘除本实例，再开始优雅退出
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", 5))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", 5))
+# worker进程数（serve.py启动时设置）；监视只保存在单个进程的内存中，多worker时不可用
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 1))
+# 多数据库：目标配置文件（未设置时只有DB_CONFIG一个目标），活跃目标上限和空闲回收时间
+DB_TARGETS_FILE = os.getenv("DB_TARGETS_FILE")
+DB_MAX_ACTIVE_TARGETS = int(os.getenv("DB_MAX_ACTIVE_TARGETS", 16))
+DB_TARGET_IDLE_SECONDS = float(os.getenv("DB_TARGET_IDLE_SECONDS", 600))
+# 只读副本：未使用目标配置文件时由DB_REPLICAS指定（host[:port][*weight]，逗号分隔）
+DB_REPLICAS = os.getenv("DB_REPLICAS", "")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 30))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", 5))
+# 合并同时到达的相同查询（目标库、规范化SQL、扫描行数预算都相同），只执行一次
+QUERY_COALESCE = os.getenv("QUERY_COALESCE", "1").lower() not in ("0", "false", "off")
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", 32))
+# 查询默认时限（秒，0为不限制），请求可用timeout参数覆盖；超时或客户端断开后用KILL QUERY取消执行
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", 0))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 0.5))
+# 后台任务：结果目录（多worker共享）、执行线程数、排队上限和已结束任务的保留策略
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", 100))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 86400))
+JOB_MAX_STORED = int(os.getenv("JOB_MAX_STORED", 200))
+JOB_MAX_DISK_MB = int(os.getenv("JOB_MAX_DISK_MB", 1024))
+JOB_MAX_RESULT_MB = int(os.getenv("JOB_MAX_RESULT_MB", 0))
+# 进程心跳超过该秒数未更新时，视为已退出，其排队中/执行中的任务标记为失败
+JOB_OWNER_TIMEOUT = float(os.getenv("JOB_OWNER_TIMEOUT", 30))
+# MCP query_data每批读取并推送给客户端的行数
+MCP_CHUNK_ROWS = int(os.getenv("MCP_CHUNK_ROWS", 500))
+# 参数化查询（sql + params）在每条连接上缓存的预处理语句个数，超出时按LRU执行DEALLOCATE
+PREPARED_CACHE_SIZE = int(os.getenv("PREPARED_CACHE_SIZE", 64))
+# 列统计画像（GET /profile）：保存目录、每张表抽样行数、保留的高频值个数和直方图桶数
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", 10000))
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", 5))
+PROFILE_BUCKETS = int(os.getenv("PROFILE_BUCKETS", 10))
+# 近似聚合（approximate=true）：默认抽样比例、分块数、置信水平，以及渐进模式依次使用的抽样比例
+APPROX_FRACTION = float(os.getenv("APPROX_FRACTION", 0.01))
+APPROX_BLOCKS = int(os.getenv("APPROX_BLOCKS", 1000))
+APPROX_CONFIDENCE = float(os.getenv("APPROX_CONFIDENCE", 0.95))
+APPROX_STAGES = [float(f) for f in os.getenv("APPROX_STAGES", "0.01,0.1").split(",") if f.strip()]
+# 持续监视查询
+WATCH_MAX = int(os.getenv("WATCH_MAX", 50))
+WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", 5))
+WATCH_IDLE_SECONDS = float(os.getenv("WATCH_IDLE_SECONDS", 300))
+WATCH_MAX_ROWS = int(os.getenv("WATCH_MAX_ROWS", 10000))
+WATCH_HISTORY = int(os.getenv("WATCH_HISTORY", 100))
+# 物化快照
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_MAX = int(os.getenv("SNAPSHOT_MAX", 20))
+SNAPSHOT_MAX_ROWS = int(os.getenv("SNAPSHOT_MAX_ROWS", 50000))
+SNAPSHOT_MIN_INTERVAL = float(os.getenv("SNAPSHOT_MIN_INTERVAL", 60))
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger("mysql-mcp-server")
 
-app = FastAPI()
+server_state = {"ready": False, "draining": False, "started_at": time.time()}
+
+def warm_up() -> bool:
+    """预热连接池和表结构缓存，成功后标记为就绪"""
+    try:
+        db_targets.get().pool.warm(DB_POOL_MIN)
+        cached_schema(refresh=True)
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+        return False
+    server_state["ready"] = True
+    logger.info(f"Warm-up finished: pool={db_targets.stats()}")
+    return True
+
+def keep_warming():
+    """预热失败时在后台定期重试，直到数据库可用"""
+    while not server_state["draining"] and not warm_up():
+        time.sleep(WARMUP_RETRY_SECONDS)
+
+def install_drain_handler():
+    """包装uvicorn的SIGTERM处理：先进入排空状态，延迟DRAIN_SECONDS后再交给uvicorn优雅退出"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    original = signal.getsignal(signal.SIGTERM)
+    if not callable(original):
+        return
+    loop = asyncio.get_running_loop()
+
+    def handle_sigterm(sig, frame):
+        if server_state["draining"]:
+            original(sig, frame)
+            return
+        server_state["draining"] = True
+        server_state["ready"] = False
+        logger.info(f"SIGTERM received, draining for {DRAIN_SECONDS}s before shutdown")
+        loop.call_soon_threadsafe(loop.call_later, DRAIN_SECONDS, original, sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+@asynccontextmanager
+async def lifespan(app):
+    # 预热完成后uvicorn才开始接受请求
+    if not await asyncio.to_thread(warm_up):
+        threading.Thread(target=keep_warming, daemon=True).start()
+    install_drain_handler()
+    job_manager.start()
+    snapshot_manager.start()
+    yield
+    server_state["ready"] = False
+    snapshot_manager.stop()
+    watch_manager.stop()
+    job_manager.stop()
+    db_targets.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -36,8 +185,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# MCP SSE传输挂载在同一个FastAPI应用上，与HTTP接口共用连接池和表结构缓存
+mcp_sse = SseServerTransport("/mcp/messages/")
+
+class MCPSSEEndpoint:
+    """ASGI端点：每个SSE连接对应一个MCP会话"""
+    async def __call__(self, scope, receive, send):
+        async with mcp_sse.connect_sse(scope, receive, send) as (read_stream, write_stream):
+            await mcp._mcp_server.run(read_stream, write_stream,
+                                      mcp._mcp_server.create_initialization_options())
+
+app.add_route("/mcp/sse", MCPSSEEndpoint(), methods=["GET"])
+app.mount("/mcp/messages/", app=mcp_sse.handle_post_message)
+
 FORBIDDEN_FIELDS = ['password', 'salary', 'ssn', 'credit_card']
 
+# EXPLAIN成本闸门配置：off=不检查，warn=只返回告警，reject=超过阈值直接拒绝
+EXPLAIN_GATE = os.getenv("EXPLAIN_GATE", "warn").lower()
+EXPLAIN_MAX_ROWS = int(os.getenv("EXPLAIN_MAX_ROWS", 1000000))
+EXPLAIN_FULL_SCAN_ROWS = int(os.getenv("EXPLAIN_FULL_SCAN_ROWS", 100000))
+
+# 执行前按缓存的表结构校验表名和列名：off=不校验，warn=只记录告警，reject=直接返回结构化错误
+SQL_VALIDATION = os.getenv("SQL_VALIDATION", "reject").lower()
+
+# 分页查询单页最大行数，以及流式导出每批从游标读取的行数
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 1000))
+
 def security_check(sql: str) -> (bool, str):
     """安全控制判断总函数."""
     is_readonly, reason = is_readonly_query(sql)
@@ -103,61 +277,511 @@ def is_injection_attempt(sql: str) -> (bool, str):
             
     return False, ""
 
+def explain_plan(cursor, sql: str) -> list:
+    """在当前连接上执行EXPLAIN，返回执行计划行"""
+    cursor.execute(f"EXPLAIN {sql.strip().rstrip(';')}")
+    return list(cursor.fetchall())
+
+def estimate_query_cost(plan: list, max_rows: int = None) -> Dict[str, Any]:
+    """根据EXPLAIN结果估算扫描行数，识别大表全表扫描和笛卡尔积连接"""
+    max_rows = max_rows or EXPLAIN_MAX_ROWS
+    estimated = 0
+    full_scans = []
+    cartesian_joins = []
+    # 同一个id内的行按嵌套循环连接顺序排列，前序表的输出行数放大后续表的扫描次数
+    prefix = {}
+    for row in plan:
+        select_id = row.get("id") or 0
+        table = row.get("table") or ""
+        rows = int(row.get("rows") or 0)
+        filtered = float(row.get("filtered") or 100.0)
+        access_type = (row.get("type") or "").upper()
+        extra = row.get("Extra") or ""
+
+        first_in_select = select_id not in prefix
+        outer = prefix.get(select_id, 1)
+        estimated += outer * rows
+        prefix[select_id] = outer * max(rows * filtered / 100.0, 1)
+
+        if access_type == "ALL" and rows >= EXPLAIN_FULL_SCAN_ROWS:
+            full_scans.append({"table": table, "rows": rows})
+        if (not first_in_select and access_type == "ALL" and not row.get("possible_keys")
+                and filtered >= 100.0 and "join buffer" in extra.lower()):
+            cartesian_joins.append({"table": table, "rows": rows})
+
+    estimated = int(estimated)
+    warnings = []
+    if estimated > max_rows:
+        warnings.append(f"Estimated rows examined {estimated} exceeds threshold {max_rows}.")
+    for scan in full_scans:
+        warnings.append(f"Full table scan on '{scan['table']}' (~{scan['rows']} rows).")
+    for join in cartesian_joins:
+        warnings.append(f"Possible cartesian join with '{join['table']}' (no join condition).")
+    return {
+        "estimated_rows_examined": estimated,
+        "max_rows_examined": max_rows,
+        "full_scans": full_scans,
+        "cartesian_joins": cartesian_joins,
+        "warnings": warnings,
+        "over_budget": estimated > max_rows or bool(full_scans) or bool(cartesian_joins),
+    }
+
+def cost_gate(cost: Dict[str, Any]) -> (bool, str):
+    """成本闸门判断：reject模式下超过阈值的查询不予执行"""
+    if EXPLAIN_GATE == "reject" and cost["over_budget"]:
+        return False, "Cost gate: " + " ".join(cost["warnings"])
+    return True, ""
+
 class QueryRequest(BaseModel):
     sql: str
+    params: Optional[List[Any]] = None
+    max_rows_examined: Optional[int] = None
+    database: Optional[str] = None
+    timeout: Optional[float] = None
+    approximate: bool = False
+    sample_fraction: Optional[float] = None
+
+class PageRequest(QueryRequest):
+    page: int = 0
+    page_size: int = 50
+
+class WatchRequest(BaseModel):
+    sql: str
+    interval: float = 30
+    key: Optional[List[str]] = None
+    database: Optional[str] = None
+    max_rows_examined: Optional[int] = None
+
+class SnapshotRequest(BaseModel):
+    sql: str
+    interval: float = 3600
+    max_age: Optional[float] = None
+    database: Optional[str] = None
+    max_rows_examined: Optional[int] = None
+    wait: float = 0
+
+class JobRequest(BaseModel):
+    sql: Optional[str] = None
+    question: Optional[str] = None
+    priority: int = 0
+    database: Optional[str] = None
+    max_rows_examined: Optional[int] = None
+
+@app.exception_handler(UnknownDatabase)
+def handle_unknown_database(request: Request, exc: UnknownDatabase):
+    return JSONResponse({"success": False, "error": str(exc)}, status_code=404)
+
+@app.get("/databases")
+def api_databases():
+    """列出可用的数据库目标及当前已打开的连接池"""
+    return {"databases": db_targets.names(), **db_targets.stats()}
+
+@app.get("/metrics")
+def api_metrics():
+    """运行指标：查询合并次数与合并率、取消次数、后台任务、预处理语句缓存命中率"""
+    with cancel_lock:
+        cancellations = dict(cancel_stats)
+    return {"query_coalescing": query_flights.stats(), "cancellations": cancellations, "jobs": job_manager.stats(),
+            "prepared_statements": statement_cache_stats(), "watches": watch_manager.stats(),
+            "snapshots": snapshot_manager.stats()}
+
+@app.get("/live")
+def api_live():
+    """存活探针：进程和事件循环可响应即可，不访问数据库"""
+    return {"status": "alive", "pid": os.getpid(), "uptime_seconds": round(time.time() - server_state["started_at"], 1)}
+
+@app.get("/ready")
+def api_ready():
+    """就绪探针：连接池和表结构缓存已预热且未进入排空状态，不访问数据库"""
+    ready = server_state["ready"] and not server_state["draining"]
+    body = {"status": "ready" if ready else ("draining" if server_state["draining"] else "starting"),
+            "pool": db_targets.stats()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/health")
+def api_health():
+    """轻量健康检查：只执行SELECT 1，不拉取表结构"""
+    result = ping_database()
+    return JSONResponse(result, status_code=200 if result["status"] == "ok" else 503)
 
 @app.get("/schema")
-def api_get_schema():
-    return get_schema()
+def api_get_schema(refresh: bool = False, database: Optional[str] = None):
+    return cached_schema(refresh, database)
 
 @app.get("/tables")
-def api_get_tables():
-    return get_tables()
+def api_get_tables(database: Optional[str] = None):
+    return list_tables(database)
 
 @app.post("/query_data")
-def api_query_data(req: QueryRequest):
-    return query_data(req.sql)
+async def api_query_data(req: QueryRequest, request: Request):
+    # 安全检查、表结构校验和写查询日志是同步的，放到线程池，不阻塞事件循环
+    blocked = await run_in_threadpool(check_query, req.sql, req.database, req.params)
+    if blocked:
+        return blocked
+    cached = await run_in_threadpool(snapshot_result, req.sql, req.database, req.params)
+    if cached:
+        return JSONResponse(cached)
+    if req.approximate:
+        result = await run_in_threadpool(approximate_query, req.sql, req.sample_fraction, req.max_rows_examined,
+                                         req.database, req.timeout, req.params, True)
+        return JSONResponse(jsonable_encoder(result))
+    return await serve_query(request, req.sql, req.max_rows_examined, req.database, req.timeout, req.params)
+
+@app.post("/query_data/progressive")
+async def api_query_progressive(req: QueryRequest, request: Request):
+    """以SSE依次推送逐步增大抽样比例的近似结果（event: estimate），最后推送精确结果（event: exact）"""
+    blocked = await run_in_threadpool(check_query, req.sql, req.database, req.params)
+    if blocked:
+        return blocked
+    stages = sorted({f for f in ([req.sample_fraction] if req.sample_fraction else APPROX_STAGES) if 0 < f < 1})
+
+    def event(name: str, result: Dict[str, Any]) -> str:
+        return f"event: {name}\ndata: {json.dumps(jsonable_encoder(result), ensure_ascii=False)}\n\n"
+
+    async def events():
+        for fraction in stages:
+            if await request.is_disconnected():
+                return
+            result = await run_in_threadpool(approximate_query, req.sql, fraction, req.max_rows_examined,
+                                             req.database, req.timeout, req.params, True)
+            if not result.get("approximate", {}).get("applied"):
+                # 不能近似时 approximate_query 已经精确执行过
+                yield event("exact" if result["success"] else "error", result)
+                return
+            yield event("estimate", result)
+        if await request.is_disconnected():
+            return
+        result = await run_in_threadpool(wait_query, req.sql, req.max_rows_examined, None, req.database,
+                                         req.timeout, req.params)
+        yield event("exact" if result["success"] else "error", result)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/explain")
+def api_explain(req: QueryRequest):
+    return explain_query(req.sql, req.max_rows_examined, req.database, req.params)
+
+@app.post("/query_page")
+async def api_query_page(req: PageRequest, request: Request):
+    page, page_size = page_bounds(req.page, req.page_size)
+    is_safe, reason = security_check(req.sql)
+    if not is_safe:
+        logger.warning(f"Blocked unsafe query: {req.sql}. Reason: {reason}")
+        return {"success": False, "error": reason}
+    sql = paginate_sql(req.sql, page * page_size, page_size + 1)
+    blocked = await run_in_threadpool(check_query, sql, req.database, req.params)
+    if blocked:
+        return blocked
+    return await serve_query(request, sql, req.max_rows_examined, req.database, req.timeout, req.params,
+                             finish=lambda result: page_result(result, page, page_size))
+
+@app.get("/export")
+def api_export(sql: str, format: str = "csv", max_rows_examined: Optional[int] = None,
+               database: Optional[str] = None):
+    """流式导出完整查询结果，边读游标边写出，不在服务端缓存整个结果集"""
+    if format not in ("csv", "json"):
+        return JSONResponse({"success": False, "error": f"Unsupported export format: {format}"}, status_code=400)
+    opened = open_export_cursor(sql, max_rows_examined, database)
+    if not opened["success"]:
+        return JSONResponse(opened, status_code=400)
+    filename = f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/json"
+    return StreamingResponse(
+        stream_export(opened["conn"], opened["cursor"], format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"',
+                 "X-Served-By": opened["served_by"] or ""}
+    )
 
 @app.get("/logs")
 def api_get_logs(request: Request, limit: int = 100):
     if request.query_params.get("raw") == "1":
-        if not os.path.exists("query.log"):
+        if not os.path.exists(QUERY_LOG_FILE):
             return {"raw_lines": []}
-        with open("query.log", "r", encoding="utf-8") as f:
+        with open(QUERY_LOG_FILE, "r", encoding="utf-8") as f:
             lines = f.readlines()
         return {"raw_lines": lines}
 
     # Fallback for simple clients
     logs = []
-    if not os.path.exists("query.log"):
+    if not os.path.exists(QUERY_LOG_FILE):
         return {"logs": []}
-    with open("query.log", "r", encoding="utf-8") as f:
+    with open(QUERY_LOG_FILE, "r", encoding="utf-8") as f:
         for line in f:
             if " - SQL: " in line:
                 ts, sql = line.strip().split(" - SQL: ", 1)
                 logs.append({"timestamp": ts, "sql": sql})
     return {"logs": logs[-limit:]}
 
+@app.post("/jobs")
+def api_submit_job(req: JobRequest):
+    """提交后台查询任务（SQL或自然语言问题），立即返回任务ID"""
+    if not req.sql and not req.question:
+        return JSONResponse({"success": False, "error": "Either sql or question is required"}, status_code=400)
+    if req.sql:
+        is_safe, reason = security_check(req.sql)
+        if not is_safe:
+            logger.warning(f"Blocked unsafe job: {req.sql}. Reason: {reason}")
+            return JSONResponse({"success": False, "error": reason}, status_code=400)
+        invalid = validate_query(req.sql, req.database)
+        if invalid:
+            return JSONResponse(invalid, status_code=400)
+    db_targets.get(req.database)
+    try:
+        job = job_manager.submit(priority=req.priority, sql=req.sql, question=req.question,
+                                 database=req.database, max_rows_examined=req.max_rows_examined)
+    except QueueFull as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=429)
+    return {"success": True, "job": job}
+
+@app.get("/jobs")
+def api_list_jobs(limit: int = 50):
+    return {"jobs": job_manager.list(limit)}
+
+@app.get("/jobs/{job_id}")
+def api_get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"success": False, "error": f"Unknown job: {job_id}"}, status_code=404)
+    return {"success": True, "job": job}
+
+@app.get("/jobs/{job_id}/results")
+def api_job_results(job_id: str, page: int = 0, page_size: int = 100):
+    page, page_size = page_bounds(page, page_size)
+    result = job_manager.results(job_id, page, page_size)
+    if result is None:
+        return JSONResponse({"success": False, "error": f"Unknown job: {job_id}"}, status_code=404)
+    return result
+
+@app.get("/jobs/{job_id}/events")
+async def api_job_events(job_id: str, request: Request):
+    """以SSE推送任务状态变化，任务结束后关闭连接"""
+    if job_manager.get(job_id) is None:
+        return JSONResponse({"success": False, "error": f"Unknown job: {job_id}"}, status_code=404)
+
+    async def events():
+        last = None
+        while not await request.is_disconnected():
+            job = job_manager.get(job_id)
+            if job is None:
+                break
+            state = (job["status"], job.get("row_count"))
+            if state != last:
+                last = state
+                yield f"event: status\ndata: {json.dumps(job, ensure_ascii=False, default=str)}\n\n"
+            if job["status"] not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/jobs/{job_id}")
+def api_cancel_job(job_id: str):
+    """取消排队或执行中的任务；已结束的任务则删除其结果文件"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"success": False, "error": f"Unknown job: {job_id}"}, status_code=404)
+    if job["status"] in ("queued", "running"):
+        return {"success": True, "job": job_manager.cancel(job_id)}
+    return {"success": job_manager.delete(job_id), "deleted": job_id}
+
+@app.post("/watches")
+def api_register_watch(req: WatchRequest):
+    """注册持续监视的查询，按interval秒在服务端重新执行；相同的查询已在监视时共享同一个监视"""
+    if SERVER_WORKERS > 1:
+        # 后续请求可能落到没有该监视的worker上，不如直接拒绝
+        return JSONResponse({"success": False, "error": "Watches are kept in a single process; "
+                             f"start the server with one worker to use them (SERVER_WORKERS={SERVER_WORKERS})"},
+                            status_code=503)
+    blocked = check_query(req.sql, req.database)
+    if blocked:
+        return JSONResponse(blocked, status_code=400)
+    db_targets.get(req.database)
+    try:
+        watch, created = watch_manager.register(req.sql, req.database, req.interval, req.key, req.max_rows_examined)
+    except WatchLimit as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=429)
+    return {"success": True, "created": created, "watch": watch.info()}
+
+@app.get("/watches")
+def api_list_watches():
+    return {"watches": watch_manager.list()}
+
+@app.get("/watches/{watch_id}")
+def api_get_watch(watch_id: str):
+    watch = watch_manager.get(watch_id)
+    if watch is None:
+        return JSONResponse({"success": False, "error": f"Unknown watch: {watch_id}"}, status_code=404)
+    return {"success": True, "watch": watch.info()}
+
+@app.get("/watches/{watch_id}/changes")
+def api_watch_changes(watch_id: str, since: Optional[int] = None):
+    """since版本之后的增量（inserted/updated/deleted）；since为空或已落后太多时返回完整快照"""
+    watch = watch_manager.get(watch_id)
+    if watch is None:
+        return JSONResponse({"success": False, "error": f"Unknown watch: {watch_id}"}, status_code=404)
+    watch.touch()
+    return JSONResponse(jsonable_encoder({"success": True, **watch.changes_since(since)}))
+
+@app.get("/watches/{watch_id}/events")
+async def api_watch_events(watch_id: str, request: Request, since: Optional[int] = None):
+    """以SSE推送监视结果：先推送完整快照（event: snapshot），之后每次结果变化推送增量（event: delta）"""
+    watch = watch_manager.get(watch_id)
+    if watch is None:
+        return JSONResponse({"success": False, "error": f"Unknown watch: {watch_id}"}, status_code=404)
+
+    def event(name: str, data: Dict[str, Any]) -> str:
+        return f"event: {name}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+    async def events():
+        version, error = since, None
+        watch.touch(1)
+        try:
+            while not await request.is_disconnected() and not watch.stopped.is_set():
+                changes = watch.changes_since(version)
+                if changes["version"] and changes["version"] != version:
+                    deltas = changes.pop("deltas", None)
+                    if deltas is None:
+                        yield event("snapshot", changes)
+                    for delta in deltas or []:
+                        yield event("delta", dict(delta, id=watch.id))
+                    version = changes["version"]
+                if changes["error"] != error:
+                    error = changes["error"]
+                    if error:
+                        yield event("error", {"id": watch.id, "error": error, "refreshed_at": changes["refreshed_at"]})
+                await asyncio.sleep(0.5)
+            if watch.stopped.is_set():
+                yield event("stopped", {"id": watch.id})
+        finally:
+            watch.touch(-1)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/watches/{watch_id}")
+def api_remove_watch(watch_id: str):
+    """停止并删除监视（共享该监视的所有订阅者都会收到 event: stopped）"""
+    if not watch_manager.remove(watch_id):
+        return JSONResponse({"success": False, "error": f"Unknown watch: {watch_id}"}, status_code=404)
+    return {"success": True, "deleted": watch_id}
+
+@app.post("/snapshots")
+def api_register_snapshot(req: SnapshotRequest):
+    """把查询注册为物化快照，每interval秒刷新（0为只按需刷新）；之后匹配的query_data直接返回快照结果。
+    wait>0时最多等待wait秒完成首次刷新"""
+    blocked = check_query(req.sql, req.database)
+    if blocked:
+        return JSONResponse(blocked, status_code=400)
+    database = db_targets.get(req.database).name
+    try:
+        snapshot, created = snapshot_manager.register(req.sql, database, req.interval, req.max_age,
+                                                      req.max_rows_examined)
+    except SnapshotLimit as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=429)
+    if req.wait > 0 and snapshot.data is None:
+        snapshot_manager.refresh(snapshot.id).join(req.wait)
+    return JSONResponse(jsonable_encoder({"success": True, "created": created, "snapshot": snapshot.info()}))
+
+@app.get("/snapshots")
+def api_list_snapshots():
+    return {"snapshots": snapshot_manager.list()}
+
+@app.get("/snapshots/{snapshot_id}")
+def api_get_snapshot(snapshot_id: str):
+    snapshot = snapshot_manager.get(snapshot_id)
+    if snapshot is None:
+        return JSONResponse({"success": False, "error": f"Unknown snapshot: {snapshot_id}"}, status_code=404)
+    return {"success": True, "snapshot": snapshot.info()}
+
+@app.post("/snapshots/{snapshot_id}/refresh")
+def api_refresh_snapshot(snapshot_id: str, wait: float = 0):
+    """按需刷新快照；刷新期间读取方继续得到旧结果。wait秒内未完成时返回202"""
+    thread = snapshot_manager.refresh(snapshot_id)
+    if thread is None:
+        return JSONResponse({"success": False, "error": f"Unknown snapshot: {snapshot_id}"}, status_code=404)
+    if wait > 0:
+        thread.join(wait)
+    snapshot = snapshot_manager.get(snapshot_id)
+    info = snapshot.info() if snapshot else {"id": snapshot_id}
+    if thread.is_alive():
+        return JSONResponse({"success": True, "status": "running", "snapshot": info}, status_code=202)
+    return {"success": not info.get("last_error"), "status": "ready", "snapshot": info}
+
+@app.delete("/snapshots/{snapshot_id}")
+def api_remove_snapshot(snapshot_id: str):
+    """删除快照及其保存的结果，之后匹配的查询照常执行"""
+    if not snapshot_manager.remove(snapshot_id):
+        return JSONResponse({"success": False, "error": f"Unknown snapshot: {snapshot_id}"}, status_code=404)
+    return {"success": True, "deleted": snapshot_id}
+
 @app.get("/sample_rows")
-def api_sample_rows(table: str, n: int = 3):
-    conn = get_connection()
+def api_sample_rows(table: str, n: int = 3, database: Optional[str] = None):
+    conn = get_connection(database, read_only=True)
+    node = served_by(conn)
     cursor = None
     try:
         cursor = conn.cursor(MySQLdb.cursors.DictCursor)
         cursor.execute(f"SELECT * FROM `{table}` LIMIT {n}")
         rows = cursor.fetchall()
-        return {"rows": rows}
+        return {"rows": rows, "served_by": node}
     except Exception as e:
-        return {"rows": [], "error": str(e)}
+        return {"rows": [], "error": str(e), "served_by": node}
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_connection(conn)
 
-# 保持原有MCP server功能
-@mcp.resource("mysql://schema")
-def get_schema() -> Dict[str, Any]:
-    conn = get_connection()
+profile_store = ProfileStore(PROFILE_DIR)
+
+def compute_profile(database: str, schema: Dict[str, Any], version: str) -> Dict[str, Any]:
+    """逐表抽样计算列统计，敏感字段不读取"""
+    conn = get_connection(database, read_only=True)
+    node = served_by(conn)
+    cursor = None
+    try:
+        cursor = conn.cursor(MySQLdb.cursors.Cursor)
+        tables = {}
+        for table, columns in schema["tables"].items():
+            tables[table] = profile_table(cursor, table, columns, PROFILE_SAMPLE_ROWS, PROFILE_TOP_K,
+                                          PROFILE_BUCKETS, FORBIDDEN_FIELDS)
+        return {"database": schema["database"], "schema_version": version,
+                "profiled_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "served_by": node, "tables": tables}
+    finally:
+        if cursor:
+            cursor.close()
+        release_connection(conn)
+
+@app.get("/profile")
+def api_profile(database: Optional[str] = None, table: Optional[str] = None, refresh: bool = False,
+                wait: float = 0):
+    """
+    列统计画像（空值比例、近似不同值个数、最小/最大值、高频值、直方图），按表结构版本缓存。
+    尚未计算时在后台开始计算并返回202，wait>0时最多等待wait秒。
+    """
+    target = db_targets.get(database)
+    schema = cached_schema(database=target.name)
+    version = schema_version(schema["tables"])
+    profile = None if refresh else profile_store.get(target.name, version)
+    if profile is None:
+        thread = profile_store.start(target.name, version, lambda: compute_profile(target.name, schema, version))
+        if wait > 0:
+            thread.join(wait)
+        state = profile_store.status(target.name, version)
+        profile = profile_store.get(target.name, version) if state["status"] != "failed" else None
+        if profile is None or refresh and state["status"] == "running":
+            return JSONResponse({"success": state["status"] != "failed", "schema_version": version, **state},
+                                status_code=202 if state["status"] == "running" else 500)
+    tables = profile["tables"]
+    if table is not None:
+        if table not in tables:
+            return JSONResponse({"success": False, "error": f"Unknown table: {table}"}, status_code=404)
+        tables = {table: tables[table]}
+    return {"success": True, "status": "ready", **profile, "tables": tables}
+
+def fetch_schema(database: str = None) -> Dict[str, Any]:
+    """从数据库读取全部表结构（SHOW TABLES + 每张表一次DESCRIBE）"""
+    target = db_targets.get(database)
+    conn = get_connection(target.name)
     cursor = None
     try:
         cursor = conn.cursor(MySQLdb.cursors.DictCursor)
@@ -179,70 +803,627 @@ def get_schema() -> Dict[str, Any]:
                     "extra": column["Extra"]
                 })
             schema[table_name] = table_schema
-        return {"database": DB_CONFIG["db"], "tables": schema}
+        return {"database": target.database, "tables": schema}
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_connection(conn)
+
+def cached_schema(refresh: bool = False, database: str = None) -> Dict[str, Any]:
+    """每个数据库目标各自带TTL的表结构缓存，并发请求只会触发一次刷新"""
+    target = db_targets.get(database)
+    if not refresh and target.schema is not None and time.time() - target.schema_loaded_at < SCHEMA_CACHE_TTL:
+        return target.schema
+    with target.schema_lock:
+        if not refresh and target.schema is not None and time.time() - target.schema_loaded_at < SCHEMA_CACHE_TTL:
+            return target.schema
+        target.schema = fetch_schema(target.name)
+        target.schema_loaded_at = time.time()
+        return target.schema
+
+# 保持原有MCP server功能
+@mcp.resource("mysql://schema")
+def get_schema() -> Dict[str, Any]:
+    return cached_schema()
+
+@mcp.resource("mysql://{database}/schema")
+def get_database_schema(database: str) -> Dict[str, Any]:
+    return cached_schema(database=database)
 
 @mcp.resource("mysql://tables")
 def get_tables() -> Dict[str, Any]:
-    conn = get_connection()
+    return list_tables()
+
+@mcp.resource("mysql://{database}/tables")
+def get_database_tables(database: str) -> Dict[str, Any]:
+    return list_tables(database)
+
+def list_tables(database: str = None) -> Dict[str, Any]:
+    target = db_targets.get(database)
+    conn = get_connection(target.name)
     cursor = None
     try:
         cursor = conn.cursor(MySQLdb.cursors.DictCursor)
         cursor.execute("SHOW TABLES")
         tables = cursor.fetchall()
         table_names = [list(table.values())[0] for table in tables]
-        return {"database": DB_CONFIG["db"], "tables": table_names}
+        return {"database": target.database, "tables": table_names}
     except MySQLdb.Error as e:
         print(f"Database connection error: {e}")
         raise
     finally:
         if cursor:
             cursor.close()
-        conn.close()
+        release_connection(conn)
 
-def get_connection():
+def open_connection(config: Dict[str, Any] = None):
+    """建立一条新的数据库连接（不经过连接池），默认连接DB_CONFIG"""
+    config = config or DB_CONFIG
     try:
-        return MySQLdb.connect(**DB_CONFIG)
+        if DB_DRIVER == "standin":
+            import standin_db
+            return standin_db.connect(**config)
+        return MySQLdb.connect(**config)
     except MySQLdb.Error as e:
         print(f"Database connection error: {e}")
         raise
 
+def build_target_registry() -> TargetRegistry:
+    """按DB_TARGETS_FILE创建数据库目标；未配置时只有DB_CONFIG对应的一个目标"""
+    if DB_TARGETS_FILE:
+        loaded = load_targets(DB_TARGETS_FILE)
+    else:
+        config = dict(DB_CONFIG, replicas=parse_replicas(DB_REPLICAS))
+        loaded = {"default": DB_CONFIG["db"], "targets": {DB_CONFIG["db"]: config}}
+    return TargetRegistry(loaded["targets"], loaded["default"], open_connection,
+                          pool_size=DB_POOL_SIZE, pool_min=DB_POOL_MIN,
+                          max_active=DB_MAX_ACTIVE_TARGETS, idle_seconds=DB_TARGET_IDLE_SECONDS,
+                          replica_max_lag=REPLICA_MAX_LAG_SECONDS, replica_check_interval=REPLICA_CHECK_SECONDS)
+
+db_targets = build_target_registry()
+
+def get_connection(database: str = None, read_only: bool = False):
+    """从指定数据库目标（默认目标）借出连接，read_only时可能分配到只读副本；用完后必须调用release_connection归还"""
+    return db_targets.acquire(database, read_only)
+
+def served_by(conn) -> Optional[str]:
+    return db_targets.served_by(conn)
+
+def release_connection(conn, discard: bool = False):
+    db_targets.release(conn, discard)
+
+def ping_database() -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        conn = get_connection()
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return {"status": "ok", "database": db_targets.get().database,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+    finally:
+        if cursor:
+            cursor.close()
+        release_connection(conn)
+
 def is_safe_query(sql: str) -> bool:
     sql_lower = sql.lower()
     unsafe_keywords = ["insert", "update", "delete", "drop", "alter", "truncate", "create"]
     return not any(keyword in sql_lower for keyword in unsafe_keywords)
 
-@mcp.tool()
-def query_data(sql: str) -> Dict[str, Any]:
+def explain_query(sql: str, max_rows_examined: int = None, database: str = None,
+                  params: List[Any] = None) -> Dict[str, Any]:
+    """只执行EXPLAIN，返回执行计划和成本估算，不运行查询本身"""
+    is_safe, reason = security_check(sql)
+    if not is_safe:
+        logger.warning(f"Blocked unsafe query: {sql}. Reason: {reason}")
+        return {"success": False, "error": reason}
+    if params is not None:
+        invalid = check_params(sql, params)
+        if invalid:
+            return {"success": False, "error": invalid}
+        sql = inline_params(sql, params)
+
+    conn = get_connection(database, read_only=True)
+    node = served_by(conn)
+    cursor = None
+    try:
+        cursor = conn.cursor(MySQLdb.cursors.DictCursor)
+        plan = explain_plan(cursor, sql)
+        return {"success": True, "plan": plan, "cost": estimate_query_cost(plan, max_rows_examined), "served_by": node}
+    except Exception as e:
+        return {"success": False, "error": str(e), "served_by": node}
+    finally:
+        if cursor:
+            cursor.close()
+        release_connection(conn)
+
+query_flights = SingleFlight(max_workers=QUERY_WORKERS)
+
+def validate_query(sql: str, database: str = None) -> Optional[Dict[str, Any]]:
+    """按缓存的表结构校验SQL，不访问数据库（表结构未加载时跳过）；reject模式下返回错误结果"""
+    if SQL_VALIDATION == "off":
+        return None
+    target = db_targets.get(database)
+    if target.schema is None:
+        return None
+    errors = validate_sql(sql, target.schema["tables"])
+    if errors and time.time() - target.schema_loaded_at >= SCHEMA_CACHE_TTL:
+        # 缓存已过期时先刷新再确认，避免新加的列被误判
+        try:
+            errors = validate_sql(sql, cached_schema(database=database)["tables"])
+        except MySQLdb.Error:
+            return None
+    if not errors:
+        return None
+    message = f"SQL validation failed: {format_errors(errors)}"
+    logger.warning(f"{message}: {sql}")
+    if SQL_VALIDATION == "reject":
+        return {"success": False, "error": message, "validation_errors": errors}
+    return None
+
+def check_query(sql: str, database: str = None, params: List[Any] = None) -> Optional[Dict[str, Any]]:
+    """安全检查、表结构校验并记录查询日志；被拦截时返回错误结果。
+    带params时sql是 ? 占位的模板，模板和代入参数后的完整SQL都要通过安全检查，与不带参数发送时拦截的请求一致"""
     is_safe, reason = security_check(sql)
     if not is_safe:
         logger.warning(f"Blocked unsafe query: {sql}. Reason: {reason}")
         return {"success": False, "error": reason}
-        
+    if params is not None:
+        invalid = check_params(sql, params)
+        if invalid:
+            return {"success": False, "error": invalid}
+        template, sql = sql, inline_params(sql, params)
+        is_safe, reason = security_check(sql)
+        if not is_safe:
+            logger.warning(f"Blocked unsafe query: {sql}. Reason: {reason}")
+            return {"success": False, "error": reason}
+    else:
+        template = sql
+    invalid = validate_query(template, database)
+    if invalid:
+        return invalid
+
+    # 日志中记录代入参数后的完整SQL，便于排查和索引建议
     logger.info(f"Executing query: {sql}")
-    with open("query.log", "a", encoding="utf-8") as f:
+    with open(QUERY_LOG_FILE, "a", encoding="utf-8") as f:
         f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - SQL: {sql}\n")
-    conn = get_connection()
+    return None
+
+def join_query(sql: str, max_rows_examined: int = None, database: str = None, params: List[Any] = None):
+    """加入相同查询的进行中执行，没有则发起一次；返回 (flight, 是否由本次请求发起)"""
+    key = (database or db_targets.default, normalize_sql(sql), max_rows_examined,
+           None if params is None else tuple(params))
+    if not QUERY_COALESCE:
+        key = (key, object())
+    return query_flights.join(key, lambda flight: execute_query(sql, max_rows_examined, database, flight, params))
+
+cancel_stats = {"client_disconnect": 0, "deadline": 0, "kill_sent": 0, "kill_failed": 0, "dirty_discarded": 0}
+cancel_lock = threading.Lock()
+
+def count_cancel(reason: str):
+    with cancel_lock:
+        cancel_stats[reason] += 1
+
+def query_deadline(timeout: float = None) -> Optional[float]:
+    timeout = timeout if timeout is not None else QUERY_TIMEOUT_SECONDS
+    return timeout if timeout and timeout > 0 else None
+
+def kill_query(conn, thread_id: int):
+    """通过一条旁路连接向同一节点发送KILL QUERY，只终止语句，不断开被终止的连接"""
+    side = None
+    try:
+        side = db_targets.side_connection(conn)
+        cursor = side.cursor()
+        cursor.execute(f"KILL QUERY {int(thread_id)}")
+        cursor.close()
+        count_cancel("kill_sent")
+        logger.info(f"Sent KILL QUERY {thread_id}")
+    except Exception as e:
+        count_cancel("kill_failed")
+        logger.warning(f"KILL QUERY {thread_id} failed: {e}")
+    finally:
+        if side is not None:
+            try:
+                side.close()
+            except Exception:
+                pass
+
+def reset_after_kill(conn) -> bool:
+    """KILL QUERY可能在语句结束后才到达，先执行一条空查询吸收残留的终止标记，确认连接可用"""
+    for _ in range(2):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            continue
+    return False
+
+def shared_result(result: Dict[str, Any], leader: bool) -> Dict[str, Any]:
+    # 合并的请求共享同一个结果对象，返回浅拷贝以免调用方修改影响其他请求
+    return dict(result, coalesced=not leader)
+
+def query_data(sql: str, max_rows_examined: int = None, on_chunk=None, database: str = None,
+               timeout: float = None, params: List[Any] = None) -> Dict[str, Any]:
+    """执行只读查询；传入on_chunk时每读取MCP_CHUNK_ROWS行回调一次on_chunk(rows, fetched)；
+    传入params时sql为 ? 占位的模板，以预处理语句执行"""
+    blocked = check_query(sql, database, params)
+    if blocked:
+        return blocked
+    cached = snapshot_result(sql, database, params)
+    if cached:
+        return cached
+    return wait_query(sql, max_rows_examined, on_chunk, database, timeout, params)
+
+def snapshot_result(sql: str, database: str = None, params: List[Any] = None) -> Optional[Dict[str, Any]]:
+    """查询匹配已注册的物化快照时返回快照结果（snapshot字段给出刷新时间和陈旧程度），否则返回None"""
+    if params is not None:
+        sql = inline_params(sql, params)
+    return snapshot_manager.lookup(sql, database or db_targets.default)
+
+def wait_query(sql: str, max_rows_examined: int = None, on_chunk=None, database: str = None,
+               timeout: float = None, params: List[Any] = None) -> Dict[str, Any]:
+    """执行已通过检查的查询（与相同查询合并执行），在当前线程等待结果"""
+    flight, leader = join_query(sql, max_rows_examined, database, params)
+    deadline = query_deadline(timeout)
+    try:
+        return shared_result(flight.wait(deadline, listener=on_chunk), leader)
+    except TimeoutError:
+        count_cancel("deadline")
+        return {"success": False, "error": f"Query timed out after {deadline:g}s", "cancelled": True}
+    except FlightCancelled as e:
+        return {"success": False, "error": str(e), "cancelled": True}
+
+def approximate_query(sql: str, fraction: float = None, max_rows_examined: int = None, database: str = None,
+                      timeout: float = None, params: List[Any] = None, checked: bool = False) -> Dict[str, Any]:
+    """对单表COUNT/SUM/AVG聚合按确定性抽样近似执行（见approx.py），结果附带置信区间；
+    不能近似的查询精确执行，approximate.applied 为false并给出原因"""
+    if not checked:
+        blocked = check_query(sql, database, params)
+        if blocked:
+            return blocked
+    if params is not None:
+        sql, params = inline_params(sql, params), None
+    fraction = fraction or APPROX_FRACTION
+
+    def exact(reason: str) -> Dict[str, Any]:
+        result = wait_query(sql, max_rows_examined, None, database, timeout)
+        return dict(result, approximate={"applied": False, "reason": reason})
+
+    shape, reason = plan_approximate(sql, cached_schema(database=database)["tables"])
+    if shape is None:
+        return exact(reason)
+    if not 0 < fraction < 1:
+        return exact("抽样比例不小于1")
+    bounds = None
+    if shape["method"] == "pk_range":
+        result = wait_query(bounds_sql(shape), None, None, database, timeout)
+        if not result["success"]:
+            return result
+        row = result["results"][0] if result["results"] else {}
+        if row.get("lo") is None:
+            return exact("表为空")
+        bounds = (row["lo"], row["hi"])
+    sample, design = sample_sql(shape, fraction, bounds, APPROX_BLOCKS)
+    if sample is None:
+        return exact("表太小，抽样会覆盖全部数据")
+    result = wait_query(sample, max_rows_examined, None, database, timeout)
+    if not result["success"]:
+        return result
+    approximate = estimate(shape, design, result["results"], APPROX_CONFIDENCE)
+    approximate["approximate"]["sample_sql"] = sample
+    return dict(approximate, cost=result.get("cost"), served_by=result.get("served_by"),
+                coalesced=result.get("coalesced", False))
+
+async def serve_query(request: Request, sql: str, max_rows_examined: int = None, database: str = None,
+                      timeout: float = None, params: List[Any] = None, finish=None):
+    """异步等待查询结果，期间轮询客户端是否断开；断开或超时时离开执行，最后一个等待者离开会触发KILL QUERY；
+    finish用于在编码前加工结果（如分页）"""
+    flight, leader = join_query(sql, max_rows_examined, database, params)
+    waiter = asyncio.ensure_future(flight.wait_async())
+    deadline = query_deadline(timeout)
+    started = time.monotonic()
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                break
+            if await request.is_disconnected():
+                count_cancel("client_disconnect")
+                logger.info(f"Client disconnected, abandoning query: {sql}")
+                waiter.cancel()
+                return JSONResponse({"success": False, "error": "Client disconnected", "cancelled": True},
+                                    status_code=499)
+            if deadline is not None and time.monotonic() - started > deadline:
+                count_cancel("deadline")
+                waiter.cancel()
+                return JSONResponse({"success": False, "error": f"Query timed out after {deadline:g}s",
+                                     "cancelled": True}, status_code=504)
+        try:
+            result = shared_result(waiter.result(), leader)
+            if finish is not None:
+                result = finish(result)
+        except FlightCancelled as e:
+            return {"success": False, "error": str(e), "cancelled": True}
+        # 大结果集的编码放到线程池，不阻塞事件循环
+        return JSONResponse(await run_in_threadpool(jsonable_encoder, result))
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+
+def execute_query(sql: str, max_rows_examined: int = None, database: str = None, flight=None,
+                  params: List[Any] = None) -> Dict[str, Any]:
+    """在只读事务中执行查询，分批读取结果并通过flight发布每一批；所有等待者离开时KILL QUERY。
+    带params时通过连接上缓存的预处理语句执行，成本闸门EXPLAIN的是代入参数后的SQL"""
+    try:
+        conn = get_connection(database, read_only=True)
+    except UnknownDatabase:
+        raise
+    except Exception as e:
+        # 连接池等待超时（PoolTimeout）或连不上数据库：与执行出错一样返回错误结果，而不是让请求变成HTTP 500
+        logger.warning(f"Failed to get a database connection: {e}")
+        return {"success": False, "error": str(e)}
+    node = served_by(conn)
+    thread_id = conn.thread_id()
+    state = {"running": True, "killed": False, "dirty": False}
+    state_lock = threading.Lock()
+
+    def cancel():
+        with state_lock:
+            if not state["running"]:
+                return
+            state["killed"] = True
+        kill_query(conn, thread_id)
+
+    if flight is not None:
+        flight.on_cancel(cancel)
     cursor = None
     try:
-        cursor = conn.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SET TRANSACTION READ ONLY")
-        cursor.execute("START TRANSACTION")
         try:
-            cursor.execute(sql)
-            results = cursor.fetchall()
+            cursor = conn.cursor(MySQLdb.cursors.DictCursor)
+            cursor.execute("SET TRANSACTION READ ONLY")
+            cursor.execute("START TRANSACTION")
+            cost = None
+            if EXPLAIN_GATE != "off":
+                explained = sql if params is None else inline_params(sql, params)
+                cost = estimate_query_cost(explain_plan(cursor, explained), max_rows_examined)
+                passed, reason = cost_gate(cost)
+                if not passed:
+                    conn.rollback()
+                    logger.warning(f"Rejected expensive query: {explained}. Reason: {reason}")
+                    return {"success": False, "error": reason, "cost": cost, "served_by": node}
+            # 无缓冲游标：结果留在服务器端按批读取，每读到一批才发布，进度通知是真正增量的
+            cursor.close()
+            cursor = None
+            cursor = conn.cursor(MySQLdb.cursors.SSDictCursor)
+            if params is None:
+                cursor.execute(sql)
+            else:
+                execute_prepared(conn, cursor, sql, params, PREPARED_CACHE_SIZE)
+            results = []
+            while True:
+                if flight is not None and flight.cancelled:
+                    raise FlightCancelled("Query was cancelled")
+                chunk = cursor.fetchmany(MCP_CHUNK_ROWS)
+                if not chunk:
+                    break
+                results.extend(chunk)
+                if flight is not None:
+                    flight.publish(list(chunk), len(results))
             conn.commit()
-            return {"success": True, "results": results, "rowCount": len(results)}
+            return {"success": True, "results": results, "rowCount": len(results), "cost": cost, "served_by": node}
         except Exception as e:
-            conn.rollback()
-            return {"success": False, "error": str(e)}
+            try:
+                if cursor:
+                    cursor.close()
+                conn.rollback()
+            except Exception:
+                # 读到一半出错时无缓冲游标可能还有未读完的结果，连接状态不确定，归还时丢弃
+                state["dirty"] = True
+            cursor = None
+            return {"success": False, "error": str(e), "served_by": node}
     finally:
+        with state_lock:
+            state["running"] = False
         if cursor:
             cursor.close()
-        conn.close()
+        clean = not state["dirty"]
+        if state["killed"] and clean:
+            clean = reset_after_kill(conn)
+            if not clean:
+                count_cancel("dirty_discarded")
+        release_connection(conn, discard=not clean)
+
+@mcp.tool(name="query_data", description="执行只读SQL查询，按批发送进度通知（已读取的行数），最终返回全部结果")
+async def mcp_query_data(sql: str, ctx: Context, max_rows_examined: Optional[int] = None,
+                         database: Optional[str] = None, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """MCP版query_data：与HTTP请求共享合并执行，每读取一批行就向客户端发送进度（已读取的行数），
+    行数据只在最终结果中返回一次；params非空时sql中的 ? 依次绑定这些值"""
+    blocked = check_query(sql, database, params)
+    if blocked:
+        return blocked
+    cached = snapshot_result(sql, database, params)
+    if cached:
+        return cached
+
+    async def send_chunk(rows, fetched):
+        await ctx.report_progress(fetched)
+        await ctx.log("info", json.dumps({"fetched": fetched, "chunk_rows": len(rows)}), logger_name="query_data")
+
+    flight, leader = join_query(sql, max_rows_examined, database, params)
+    try:
+        return shared_result(await flight.wait_async(send_chunk), leader)
+    except FlightCancelled as e:
+        return {"success": False, "error": str(e), "cancelled": True}
+
+def page_bounds(page: int, page_size: int):
+    return max(int(page), 0), min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+def page_result(result: Dict[str, Any], page: int, page_size: int) -> Dict[str, Any]:
+    """去掉多取的一行并补充分页信息"""
+    if not result["success"]:
+        return result
+    rows = list(result["results"])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return dict(result, results=rows, rowCount=len(rows), page=page, page_size=page_size, has_more=has_more)
+
+def query_page(sql: str, page: int = 0, page_size: int = 50, max_rows_examined: int = None,
+               database: str = None, timeout: float = None, params: List[Any] = None) -> Dict[str, Any]:
+    """分页执行查询，多取一行用于判断是否还有下一页"""
+    page, page_size = page_bounds(page, page_size)
+    is_safe, reason = security_check(sql)
+    if not is_safe:
+        logger.warning(f"Blocked unsafe query: {sql}. Reason: {reason}")
+        return {"success": False, "error": reason}
+
+    result = query_data(paginate_sql(sql, page * page_size, page_size + 1), max_rows_examined,
+                        database=database, timeout=timeout, params=params)
+    return page_result(result, page, page_size)
+
+def open_export_cursor(sql: str, max_rows_examined: int = None, database: str = None) -> Dict[str, Any]:
+    """为流式导出打开只读事务和无缓冲游标；安全检查和成本闸门在开始输出前完成"""
+    is_safe, reason = security_check(sql)
+    if not is_safe:
+        logger.warning(f"Blocked unsafe export: {sql}. Reason: {reason}")
+        return {"success": False, "error": reason}
+
+    logger.info(f"Exporting query: {sql}")
+    with open(QUERY_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - SQL: {sql}\n")
+    return open_stream_cursor(sql, max_rows_examined, database)
+
+def open_stream_cursor(sql: str, max_rows_examined: int = None, database: str = None) -> Dict[str, Any]:
+    """打开只读事务、经过成本闸门后返回无缓冲游标；不做安全检查也不写查询日志，调用方须已通过check_query等检查"""
+    conn = get_connection(database, read_only=True)
+    cursor = None
+    try:
+        cursor = conn.cursor(MySQLdb.cursors.DictCursor)
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute("START TRANSACTION")
+        if EXPLAIN_GATE != "off":
+            cost = estimate_query_cost(explain_plan(cursor, sql), max_rows_examined)
+            passed, reason = cost_gate(cost)
+            if not passed:
+                raise RuntimeError(reason)
+        cursor.close()
+        # 无缓冲游标：结果留在服务器端，按批读取
+        cursor = conn.cursor(MySQLdb.cursors.SSCursor)
+        cursor.execute(sql)
+        return {"success": True, "conn": conn, "cursor": cursor, "served_by": served_by(conn)}
+    except Exception as e:
+        if cursor:
+            cursor.close()
+        release_connection(conn)
+        return {"success": False, "error": str(e)}
+
+def stream_export(conn, cursor, format: str = "csv"):
+    """按批从游标读取并输出CSV/JSON片段，结束或客户端断开时释放连接"""
+    finished = False
+    try:
+        columns = [d[0] for d in cursor.description or []]
+        first = True
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        else:
+            yield "["
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            if format == "csv":
+                writer.writerows(list(row.values()) if isinstance(row, dict) else row for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                chunk = []
+                for row in rows:
+                    item = row if isinstance(row, dict) else dict(zip(columns, row))
+                    chunk.append(json.dumps(item, ensure_ascii=False, default=str))
+                yield ("" if first else ",") + ",".join(chunk)
+                first = False
+        if format == "csv":
+            yield buffer.getvalue()
+        else:
+            yield "]"
+        conn.commit()
+        finished = True
+    finally:
+        # 中途断开的无缓冲游标还有未读完的结果，直接丢弃连接而不是读完再归还
+        if finished:
+            cursor.close()
+        release_connection(conn, discard=not finished)
+
+def generate_job_sql(question: str, database: str = None) -> str:
+    """后台任务中由自然语言问题生成SQL"""
+    from llm_client import generate_sql_from_prompt
+    return generate_sql_from_prompt(question, cached_schema(database=database)["tables"])
+
+def run_job(job):
+    """执行一个后台任务：用无缓冲游标逐批读取结果写入任务结果文件，取消时KILL QUERY"""
+    sql = job.meta.get("sql")
+    if not sql:
+        sql = generate_job_sql(job.meta["question"], job.meta.get("database"))
+        job.update(sql=sql)
+    blocked = check_query(sql, job.meta.get("database"))
+    if blocked:
+        raise ValueError(blocked["error"])
+    # check_query已做过安全检查并写入查询日志，这里直接打开游标，避免同一任务的SQL记录两次
+    opened = open_stream_cursor(sql, job.meta.get("max_rows_examined"), job.meta.get("database"))
+    if not opened["success"]:
+        raise ValueError(opened["error"])
+    conn, cursor = opened["conn"], opened["cursor"]
+    thread_id = conn.thread_id()
+    job.on_cancel(lambda: kill_query(conn, thread_id))
+    job.update(served_by=opened["served_by"])
+    writer = job.open_writer([d[0] for d in cursor.description or []])
+    finished = False
+    try:
+        while True:
+            if job.cancelled.is_set():
+                raise JobCancelled()
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            writer.write_rows(rows)
+            job.update(row_count=writer.rows)
+        conn.commit()
+        finished = True
+    finally:
+        job.clear_cancel_hooks()
+        writer.close()
+        if finished:
+            cursor.close()
+            if job.cancelled.is_set():
+                finished = reset_after_kill(conn)
+        release_connection(conn, discard=not finished)
+
+job_manager = JobManager(run_job, JOBS_DIR, workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT,
+                         retention_seconds=JOB_RETENTION_SECONDS, max_jobs=JOB_MAX_STORED,
+                         max_total_bytes=JOB_MAX_DISK_MB << 20, max_result_bytes=JOB_MAX_RESULT_MB << 20,
+                         owner_timeout=JOB_OWNER_TIMEOUT)
+
+watch_manager = WatchManager(lambda sql, database, max_rows_examined: wait_query(sql, max_rows_examined, None, database),
+                             lambda database: cached_schema(database=database)["tables"], max_watches=WATCH_MAX,
+                             min_interval=WATCH_MIN_INTERVAL, idle_seconds=WATCH_IDLE_SECONDS,
+                             max_rows=WATCH_MAX_ROWS, history=WATCH_HISTORY)
+
+# 快照结果先转成JSON类型再保存，内存中的结果与重启后从磁盘加载的一致
+snapshot_manager = SnapshotManager(
+    lambda sql, database, max_rows_examined: jsonable_encoder(wait_query(sql, max_rows_examined, None, database)),
+    SNAPSHOT_DIR, max_snapshots=SNAPSHOT_MAX, max_rows=SNAPSHOT_MAX_ROWS, min_interval=SNAPSHOT_MIN_INTERVAL)
 
 def validate_config():
     required_vars = ["DB_HOST", "DB_USER", "DB_PASSWORD", "DB_NAME"]
@@ -251,18 +1432,41 @@ def validate_config():
         logger.warning(f"Missing environment variables: {', '.join(missing)}")
         logger.warning("Using default values, which may not work in production.")
 
+async def run_mcp_stdio():
+    """通过stdio提供MCP服务；stdout只留给协议消息，其他输出转到stderr"""
+    protocol_out = anyio.wrap_file(io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8"))
+    sys.stdout = sys.stderr
+    if not await anyio.to_thread.run_sync(warm_up):
+        threading.Thread(target=keep_warming, daemon=True).start()
+    try:
+        async with stdio_server(stdout=protocol_out) as (read_stream, write_stream):
+            await mcp._mcp_server.run(read_stream, write_stream,
+                                      mcp._mcp_server.create_initialization_options())
+    finally:
+        db_targets.close()
+
+def mcp_main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python main.py mcp", description="以MCP协议提供数据库查询服务")
+    parser.add_argument("--transport", choices=["stdio", "sse"], default="stdio")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    validate_config()
+    if args.transport == "stdio":
+        anyio.run(run_mcp_stdio)
+    else:
+        # SSE端点挂载在完整的FastAPI应用上：GET /mcp/sse，POST /mcp/messages/
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
 def main():
     validate_config()
     print(f"MySQL MCP server started, connected to {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['db']}")
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1 and sys.argv[1] == "cli":
-        from cli import run_cli
-        from llm_client import generate_sql_from_prompt
-        from mcp_client import get_schema, query_data, get_logs
-        print("进入命令行自然语言查询模式")
-        run_cli(get_schema, query_data, generate_sql_from_prompt, get_logs)
-    else:
-        import uvicorn
-        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "mcp":
+        sys.exit(mcp_main(sys.argv[2:]))
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,14 +1,23 @@
 import requests
 import os
+import json
 import re
 from typing import Dict, Any, List
+from urllib.parse import urlencode
+from sql_params import parameterize_sql
 
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8000")
+# 服务端配置了多个数据库目标时，默认访问的目标名称（为空则使用服务端默认目标）
+MCP_DATABASE = os.getenv("MCP_DATABASE") or None
+# 查询时限（秒），超时后服务端取消正在执行的语句；0表示使用服务端默认值
+MCP_QUERY_TIMEOUT = float(os.getenv("MCP_QUERY_TIMEOUT", 0)) or None
+# 查询前把WHERE等条件中的字面量提取为参数，服务端以预处理语句执行（见sql_params.py）；设为0时发送原始SQL
+SQL_PARAMETERIZE = os.getenv("SQL_PARAMETERIZE", "1") != "0"
 
 
-def get_schema() -> Dict[str, Any]:
+def get_schema(database: str = None) -> Dict[str, Any]:
     """通过MCP Server获取数据库表结构信息"""
-    resp = requests.get(f"{MCP_SERVER_URL}/schema")
+    resp = requests.get(f"{MCP_SERVER_URL}/schema", params={"database": database or MCP_DATABASE})
     resp.raise_for_status()
     data = resp.json()
     # 兼容原有格式
@@ -17,28 +26,253 @@ def get_schema() -> Dict[str, Any]:
     return data
 
 
-def get_tables() -> List[str]:
+def ping() -> Dict[str, Any]:
+    """轻量检查MCP Server和数据库连接状态（只执行SELECT 1，不拉取表结构）"""
+    resp = requests.get(f"{MCP_SERVER_URL}/health", timeout=5)
+    return resp.json()
+
+
+def list_databases() -> List[str]:
+    """通过MCP Server获取可用的数据库目标名称"""
+    resp = requests.get(f"{MCP_SERVER_URL}/databases")
+    resp.raise_for_status()
+    return resp.json().get("databases", [])
+
+
+def get_tables(database: str = None) -> List[str]:
     """通过MCP Server获取数据库表列表"""
-    resp = requests.get(f"{MCP_SERVER_URL}/tables")
+    resp = requests.get(f"{MCP_SERVER_URL}/tables", params={"database": database or MCP_DATABASE})
     resp.raise_for_status()
     data = resp.json()
     return data.get("tables", [])
 
 
-def query_data(sql: str) -> Dict[str, Any]:
-    """通过MCP Server执行SQL查询并返回结果"""
-    resp = requests.post(f"{MCP_SERVER_URL}/query_data", json={"sql": sql})
+def _query_result(resp) -> Dict[str, Any]:
+    # 查询超时时服务端返回504和 {"success": False, ...}，与其他查询错误一样交给调用方展示
+    if resp.status_code != 504:
+        resp.raise_for_status()
+    return resp.json()
+
+
+def _http_timeout(timeout: float = None):
+    # HTTP超时比查询时限多留余量，让服务端先取消语句并返回错误
+    timeout = timeout or MCP_QUERY_TIMEOUT
+    return timeout + 10 if timeout else None
+
+
+def _parameterize(sql: str):
+    """返回 (发送的SQL, params)；没有可提取的字面量时params为None，服务端按普通SQL执行"""
+    if not SQL_PARAMETERIZE:
+        return sql, None
+    template, params = parameterize_sql(sql)
+    return (template, params) if params else (sql, None)
+
+
+def query_data(sql: str, max_rows_examined: int = None, database: str = None,
+               timeout: float = None, approximate: bool = False, sample_fraction: float = None) -> Dict[str, Any]:
+    """通过MCP Server执行SQL查询并返回结果；approximate=True时单表COUNT/SUM/AVG聚合按抽样近似计算，
+    结果带 bounds（每行各聚合列的置信区间）和 approximate（抽样说明）"""
+    sql, params = _parameterize(sql)
+    resp = requests.post(f"{MCP_SERVER_URL}/query_data", json={
+        "sql": sql, "params": params, "max_rows_examined": max_rows_examined, "database": database or MCP_DATABASE,
+        "timeout": timeout or MCP_QUERY_TIMEOUT, "approximate": approximate, "sample_fraction": sample_fraction
+    }, timeout=_http_timeout(timeout))
+    return _query_result(resp)
+
+
+def query_progressive(sql: str, max_rows_examined: int = None, database: str = None, timeout: float = None):
+    """渐进式近似查询：依次产出 ("estimate", 结果) 若干次，最后产出 ("exact", 结果)（出错时为 "error"）"""
+    sql, params = _parameterize(sql)
+    resp = requests.post(f"{MCP_SERVER_URL}/query_data/progressive", json={
+        "sql": sql, "params": params, "max_rows_examined": max_rows_examined, "database": database or MCP_DATABASE,
+        "timeout": timeout or MCP_QUERY_TIMEOUT
+    }, stream=True)
+    resp.raise_for_status()
+    if not resp.headers.get("content-type", "").startswith("text/event-stream"):
+        # 被安全检查等拦截时直接返回JSON错误
+        yield "error", resp.json()
+        return
+    yield from _sse_events(resp)
+
+
+def _sse_events(resp):
+    """逐个产出SSE流中的 (事件名, 数据)"""
+    event = None
+    with resp:
+        for line in resp.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
+
+def query_page(sql: str, page: int = 0, page_size: int = 50, max_rows_examined: int = None,
+               database: str = None, timeout: float = None) -> Dict[str, Any]:
+    """通过MCP Server分页执行SQL查询，只返回指定页的数据"""
+    sql, params = _parameterize(sql)
+    resp = requests.post(f"{MCP_SERVER_URL}/query_page", json={
+        "sql": sql, "params": params, "page": page, "page_size": page_size, "max_rows_examined": max_rows_examined,
+        "database": database or MCP_DATABASE, "timeout": timeout or MCP_QUERY_TIMEOUT
+    }, timeout=_http_timeout(timeout))
+    return _query_result(resp)
+
+
+def submit_job(sql: str = None, question: str = None, priority: int = 0, database: str = None,
+               max_rows_examined: int = None) -> Dict[str, Any]:
+    """提交后台查询任务（SQL或自然语言问题），返回任务信息（含id）"""
+    resp = requests.post(f"{MCP_SERVER_URL}/jobs", json={
+        "sql": sql, "question": question, "priority": priority,
+        "database": database or MCP_DATABASE, "max_rows_examined": max_rows_examined
+    })
+    if resp.status_code not in (400, 429):
+        resp.raise_for_status()
+    return resp.json()
+
+
+def get_job(job_id: str) -> Dict[str, Any]:
+    """查询后台任务状态"""
+    resp = requests.get(f"{MCP_SERVER_URL}/jobs/{job_id}")
+    resp.raise_for_status()
+    return resp.json().get("job", {})
+
+
+def list_jobs(limit: int = 50) -> List[Dict[str, Any]]:
+    resp = requests.get(f"{MCP_SERVER_URL}/jobs", params={"limit": limit})
+    resp.raise_for_status()
+    return resp.json().get("jobs", [])
+
+
+def get_job_results(job_id: str, page: int = 0, page_size: int = 100) -> Dict[str, Any]:
+    """分页读取后台任务的结果"""
+    resp = requests.get(f"{MCP_SERVER_URL}/jobs/{job_id}/results", params={"page": page, "page_size": page_size})
+    resp.raise_for_status()
+    return resp.json()
+
+
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    """取消排队或执行中的任务；任务已结束时删除其结果"""
+    resp = requests.delete(f"{MCP_SERVER_URL}/jobs/{job_id}")
     resp.raise_for_status()
     return resp.json()
 
 
-def get_sample_rows(table_name: str, n: int = 3) -> list:
+def wait_for_job(job_id: str, poll_seconds: float = 1.0, timeout: float = None) -> Dict[str, Any]:
+    """轮询直到任务结束，返回最终状态"""
+    import time
+    started = time.time()
+    while True:
+        job = get_job(job_id)
+        if job.get("status") not in ("queued", "running"):
+            return job
+        if timeout is not None and time.time() - started > timeout:
+            return job
+        time.sleep(poll_seconds)
+
+
+def register_watch(sql: str, interval: float = 30, key: List[str] = None, database: str = None,
+                   max_rows_examined: int = None) -> Dict[str, Any]:
+    """注册持续监视的查询（服务端按interval秒重新执行），返回 {"success", "watch": {...含id}}；
+    相同的查询已在监视时共享同一个监视；key为行键列，不指定时服务端按主键或整行比较"""
+    resp = requests.post(f"{MCP_SERVER_URL}/watches", json={
+        "sql": sql, "interval": interval, "key": key, "database": database or MCP_DATABASE,
+        "max_rows_examined": max_rows_examined
+    })
+    if resp.status_code not in (400, 429, 503):
+        resp.raise_for_status()
+    return resp.json()
+
+
+def watch_changes(watch_id: str, since: int = None) -> Dict[str, Any]:
+    """拉取since版本之后的增量（deltas）；since为空或落后太多时返回完整快照（snapshot）"""
+    resp = requests.get(f"{MCP_SERVER_URL}/watches/{watch_id}/changes", params={"since": since})
+    resp.raise_for_status()
+    return resp.json()
+
+
+def watch_events(watch_id: str, since: int = None):
+    """订阅监视结果：先产出 ("snapshot", 快照)，之后每次结果变化产出 ("delta", 增量)；
+    执行出错时产出 ("error", ...)，监视被删除时产出 ("stopped", ...) 后结束"""
+    resp = requests.get(f"{MCP_SERVER_URL}/watches/{watch_id}/events", params={"since": since}, stream=True)
+    resp.raise_for_status()
+    yield from _sse_events(resp)
+
+
+def stop_watch(watch_id: str) -> Dict[str, Any]:
+    """停止并删除监视"""
+    resp = requests.delete(f"{MCP_SERVER_URL}/watches/{watch_id}")
+    if resp.status_code != 404:
+        resp.raise_for_status()
+    return resp.json()
+
+
+def register_snapshot(sql: str, interval: float = 3600, max_age: float = None, database: str = None,
+                      max_rows_examined: int = None, wait: float = 0) -> Dict[str, Any]:
+    """把查询注册为物化快照（每interval秒刷新，0为只按需刷新），之后相同的query_data直接返回快照结果；
+    max_age秒内的快照才会被使用，wait>0时等待首次刷新完成"""
+    resp = requests.post(f"{MCP_SERVER_URL}/snapshots", json={
+        "sql": sql, "interval": interval, "max_age": max_age, "database": database or MCP_DATABASE,
+        "max_rows_examined": max_rows_examined, "wait": wait
+    })
+    if resp.status_code not in (400, 429):
+        resp.raise_for_status()
+    return resp.json()
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    resp = requests.get(f"{MCP_SERVER_URL}/snapshots")
+    resp.raise_for_status()
+    return resp.json().get("snapshots", [])
+
+
+def refresh_snapshot(snapshot_id: str, wait: float = 0) -> Dict[str, Any]:
+    """按需刷新快照；wait秒内未完成时返回 {"status": "running"}"""
+    resp = requests.post(f"{MCP_SERVER_URL}/snapshots/{snapshot_id}/refresh", params={"wait": wait})
+    if resp.status_code != 202:
+        resp.raise_for_status()
+    return resp.json()
+
+
+def delete_snapshot(snapshot_id: str) -> Dict[str, Any]:
+    """删除快照，之后匹配的查询照常执行"""
+    resp = requests.delete(f"{MCP_SERVER_URL}/snapshots/{snapshot_id}")
+    if resp.status_code != 404:
+        resp.raise_for_status()
+    return resp.json()
+
+
+def export_url(sql: str, format: str = "csv", database: str = None) -> str:
+    """返回服务端流式导出完整结果的下载地址"""
+    params = {"sql": sql, "format": format}
+    if database or MCP_DATABASE:
+        params["database"] = database or MCP_DATABASE
+    return f"{MCP_SERVER_URL}/export?" + urlencode(params)
+
+
+def explain_query(sql: str, max_rows_examined: int = None, database: str = None) -> Dict[str, Any]:
+    """通过MCP Server获取SQL的执行计划和成本估算（不执行查询）"""
+    resp = requests.post(f"{MCP_SERVER_URL}/explain", json={
+        "sql": sql, "max_rows_examined": max_rows_examined, "database": database or MCP_DATABASE
+    })
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_sample_rows(table_name: str, n: int = 3, database: str = None) -> list:
     """通过MCP Server获取指定表的前n行数据"""
-    resp = requests.get(f"{MCP_SERVER_URL}/sample_rows", params={"table": table_name, "n": n})
+    resp = requests.get(f"{MCP_SERVER_URL}/sample_rows",
+                        params={"table": table_name, "n": n, "database": database or MCP_DATABASE})
     resp.raise_for_status()
     return resp.json().get("rows", [])
 
 
+def get_profile(database: str = None, wait: float = 0) -> Dict[str, Any]:
+    """通过MCP Server获取列统计画像；尚未计算完成时返回 {"status": "running"}"""
+    resp = requests.get(f"{MCP_SERVER_URL}/profile", params={"database": database or MCP_DATABASE, "wait": wait})
+    if resp.status_code != 202:
+        resp.raise_for_status()
+    return resp.json()
+
+
 def get_logs(log_file: str = "query.log", limit: int = 100) -> list:
     """通过MCP Server获取最近的SQL查询日志，智能拼接多行SQL"""
     # 优先尝试API
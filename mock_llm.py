@@ -0,0 +1,128 @@
+"""
+本地模拟大模型服务：兼容通义千问 compatible-mode 的 chat/completions 接口，
+按问题返回预置的SQL，并可配置响应延迟，用于离线基准测试。
+
+用法: python mock_llm.py --port 8001 --latency-ms 300 --jitter-ms 50
+然后设置 QWEN_API_URL=http://127.0.0.1:8001/v1/chat/completions
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+DEFAULT_ANSWERS = "fixtures/college_questions.json"
+
+
+def load_answers(path: str) -> Dict[str, str]:
+    """读取问题->SQL映射，文件格式为 [{"question": ..., "sql": ...}]"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return {item["question"]: item["sql"] for item in items}
+
+
+def extract_question(prompt: str) -> str:
+    """从llm_client组装的prompt中取出本次任务的用户问题"""
+    task = prompt.split("--- 任务 ---")[-1]
+    m = re.search(r"用户:\s*(.*)", task)
+    return m.group(1).strip() if m else prompt.strip()
+
+
+class MockLLMServer:
+    def __init__(self, answers: Dict[str, str], host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 200, jitter_ms: float = 0, seed: int = 0,
+                 default_sql: str = "SELECT 1;"):
+        self.answers = dict(answers)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.default_sql = default_sql
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def add_answers(self, answers: Dict[str, str]):
+        self.answers.update(answers)
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.request_count += 1
+            delay = self._random.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+        return max(delay, 0) / 1000.0
+
+    def _complete(self, payload: Dict) -> Dict:
+        messages: List[Dict] = payload.get("messages") or [{}]
+        prompt = messages[-1].get("content", "")
+        question = extract_question(prompt)
+        time.sleep(self._delay())
+        sql = self.answers.get(question, self.default_sql)
+        return {
+            "id": f"mock-{self.request_count}",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": sql}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(sql), "total_tokens": len(prompt) + len(sql)},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self.send_error(400, "invalid json")
+                    return
+                body = json.dumps(server._complete(payload), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--answers", default=DEFAULT_ANSWERS)
+    args = parser.parse_args()
+
+    server = MockLLMServer(load_answers(args.answers), args.host, args.port, args.latency_ms, args.jitter_ms)
+    print(f"模拟大模型服务已启动: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n模拟服务已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+列统计画像：用抽样扫描为每列计算空值比例、近似不同值个数（HyperLogLog）、最小/最大值、
+高频值（Space-Saving）和等深直方图，按表结构版本保存，代替每次生成SQL时读取的原始示例行。
+
+- 抽样：表行数不超过 sample_rows 时全表读取，否则用 WHERE RAND() < 比例 抽取约 sample_rows 行；
+- 不同值个数：样本中几乎所有值都不重复时，按抽样比例放大估算值（否则样本值域即全部值域）；
+- 隐私：FORBIDDEN_FIELDS 中的敏感列不读取；高频值只保留样本中出现至少两次的值，
+  唯一值（姓名、编号等）不会出现在画像里；最小/最大值和直方图只对数值和日期列计算；
+- 存储：PROFILE_DIR/<目标>_<表结构版本>.json，表结构变化后版本不同，旧版本文件在新画像写入后删除。
+"""
+import datetime
+import decimal
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_NUMERIC_TYPES = ("int", "decimal", "numeric", "float", "double", "real", "bit")
+_TEMPORAL_TYPES = ("date", "time", "year")
+
+
+def schema_version(tables: Dict[str, Any]) -> str:
+    """表名、列名和列类型的摘要，任何一项变化都会得到新的版本号"""
+    shape = sorted((table, [(col.get("name"), col.get("type")) for col in cols])
+                   for table, cols in tables.items() if isinstance(cols, list))
+    return hashlib.sha1(json.dumps(shape, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def column_kind(column_type: str) -> str:
+    column_type = (column_type or "").lower()
+    if column_type.startswith(_NUMERIC_TYPES):
+        return "numeric"
+    if column_type.startswith(_TEMPORAL_TYPES):
+        return "temporal"
+    return "text"
+
+
+def _plain(value: Any) -> Any:
+    """转成可JSON序列化的值"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+class HyperLogLog:
+    """2^p 个寄存器的基数估计，标准误差约 1.04/sqrt(2^p)；小基数时用线性计数修正"""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: Any):
+        digest = hashlib.blake2b(repr(value).encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """Space-Saving：最多跟踪capacity个值，新值替换计数最小的值并继承其计数"""
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = max(capacity, 1)
+        self.counts: Dict[Any, int] = {}
+
+    def add(self, value: Any):
+        if value in self.counts:
+            self.counts[value] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[value] = 1
+        else:
+            smallest = min(self.counts, key=self.counts.get)
+            self.counts[value] = self.counts.pop(smallest) + 1
+
+    def top(self, k: int) -> List[tuple]:
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+
+
+def equi_depth_bounds(values: List[Any], buckets: int) -> List[Any]:
+    """等深直方图的桶边界：buckets+1个值，相邻边界之间的样本行数大致相同"""
+    if not values:
+        return []
+    values = sorted(values)
+    n = len(values)
+    bounds = [values[min(n - 1, i * n // buckets)] for i in range(buckets)] + [values[-1]]
+    return [_plain(b) for i, b in enumerate(bounds) if i == 0 or b != bounds[i - 1]]
+
+
+def profile_table(cursor, table: str, columns: List[Dict[str, Any]], sample_rows: int = 10000,
+                  top_k: int = 5, buckets: int = 10, forbidden: List[str] = ()) -> Dict[str, Any]:
+    """对一张表抽样并计算各列统计；cursor为普通（返回元组的）游标"""
+    forbidden = {f.lower() for f in forbidden}
+    stats = {}
+    readable = []
+    for col in columns:
+        if col["name"].lower() in forbidden:
+            stats[col["name"]] = {"type": col.get("type"), "redacted": True}
+        else:
+            readable.append(col)
+    cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+    total = int(cursor.fetchone()[0] or 0)
+    result = {"rows": total, "sampled": 0, "fraction": 1.0, "columns": stats}
+    if not readable or total == 0:
+        for col in readable:
+            stats[col["name"]] = {"type": col.get("type"), "null_frac": 0.0, "ndv": 0}
+        return result
+
+    fraction = min(1.0, sample_rows / total)
+    select = ", ".join(f"`{col['name']}`" for col in readable)
+    sql = f"SELECT {select} FROM `{table}`"
+    if fraction < 1.0:
+        # 多取一些余量，再用LIMIT限制读取量
+        sql += f" WHERE RAND() < {fraction:.6f} LIMIT {int(sample_rows * 1.2) + 1}"
+    cursor.execute(sql)
+
+    kinds = [column_kind(col.get("type")) for col in readable]
+    nulls = [0] * len(readable)
+    sketches = [HyperLogLog() for _ in readable]
+    tops = [TopK(max(top_k * 4, 16)) for _ in readable]
+    ordered: List[List[Any]] = [[] for _ in readable]
+    sampled = 0
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        for row in rows:
+            sampled += 1
+            for i, value in enumerate(row):
+                if value is None:
+                    nulls[i] += 1
+                    continue
+                sketches[i].add(value)
+                tops[i].add(value)
+                if kinds[i] != "text":
+                    ordered[i].append(value)
+
+    fraction = sampled / total if total else 1.0
+    result.update(sampled=sampled, fraction=round(min(fraction, 1.0), 6))
+    for i, col in enumerate(readable):
+        non_null = sampled - nulls[i]
+        ndv = min(sketches[i].count(), non_null)
+        if fraction < 1.0 and non_null and ndv >= 0.9 * non_null:
+            # 样本中几乎都是不同值，说明整表的不同值个数随行数增长
+            ndv = int(ndv / fraction)
+        entry = {"type": col.get("type"), "null_frac": round(nulls[i] / sampled, 4) if sampled else 0.0,
+                 "ndv": min(ndv, total)}
+        frequent = [(value, count) for value, count in tops[i].top(top_k) if count >= 2]
+        if frequent and non_null:
+            entry["top"] = [{"value": _plain(value), "frac": round(count / sampled, 4)} for value, count in frequent]
+        if ordered[i]:
+            entry["min"] = _plain(min(ordered[i]))
+            entry["max"] = _plain(max(ordered[i]))
+            if ndv > buckets:
+                entry["histogram"] = equi_depth_bounds(ordered[i], buckets)
+        stats[col["name"]] = entry
+    result["columns"] = {col["name"]: stats[col["name"]] for col in columns}
+    return result
+
+
+def describe_table(profile: Optional[Dict[str, Any]], max_values: int = 3) -> str:
+    """生成写进Prompt的简短统计说明，如 约200行; dept_name 7种值 常见'Comp. Sci.'(23%); tot_cred 0~129"""
+    if not profile:
+        return ""
+    parts = [f"约{profile['rows']}行"]
+    for name, col in profile.get("columns", {}).items():
+        if col.get("redacted"):
+            continue
+        bits = []
+        if "min" in col and col["min"] != col.get("max"):
+            bits.append(f"{col['min']}~{col['max']}")
+        if col.get("top") and col.get("ndv", 0) <= 50:
+            values = ", ".join(f"{json.dumps(t['value'], ensure_ascii=False)}({t['frac']:.0%})"
+                               for t in col["top"][:max_values])
+            bits.append(f"{col['ndv']}种值 常见{values}")
+        if col.get("null_frac", 0) >= 0.01:
+            bits.append(f"空值{col['null_frac']:.0%}")
+        if bits:
+            parts.append(f"{name} " + " ".join(bits))
+    return "; ".join(parts)
+
+
+class ProfileStore:
+    """按 (目标, 表结构版本) 保存画像；同一版本同一时间只有一个后台线程在计算"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._profiles: Dict[tuple, Dict[str, Any]] = {}
+        self._running: Dict[tuple, threading.Thread] = {}
+        self._errors: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def path(self, target: str, version: str) -> str:
+        return os.path.join(self.directory, f"{target}_{version}.json")
+
+    def get(self, target: str, version: str) -> Optional[Dict[str, Any]]:
+        key = (target, version)
+        with self._lock:
+            profile = self._profiles.get(key)
+        if profile is not None:
+            return profile
+        path = self.path(target, version)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        with self._lock:
+            self._profiles[key] = profile
+        return profile
+
+    def _save(self, target: str, version: str, profile: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(target, version)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+        prefix = f"{target}_"
+        for name in os.listdir(self.directory):
+            old_version = name[len(prefix):-len(".json")]
+            if name.startswith(prefix) and name.endswith(".json") and old_version != version \
+                    and len(old_version) == len(version) and all(c in "0123456789abcdef" for c in old_version):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def start(self, target: str, version: str, compute: Callable[[], Dict[str, Any]]) -> threading.Thread:
+        """开始计算画像（已在计算时返回正在运行的线程）"""
+        key = (target, version)
+        with self._lock:
+            thread = self._running.get(key)
+            if thread is not None:
+                return thread
+            self._errors.pop(key, None)
+            thread = threading.Thread(target=self._run, args=(key, compute), daemon=True,
+                                      name=f"profile-{target}")
+            self._running[key] = thread
+        thread.start()
+        return thread
+
+    def _run(self, key: tuple, compute: Callable[[], Dict[str, Any]]):
+        try:
+            start = time.perf_counter()
+            profile = compute()
+            profile["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._save(key[0], key[1], profile)
+            with self._lock:
+                self._profiles = {k: v for k, v in self._profiles.items() if k[0] != key[0]}
+                self._profiles[key] = profile
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = str(e)
+        finally:
+            with self._lock:
+                self._running.pop(key, None)
+
+    def status(self, target: str, version: str) -> Dict[str, Any]:
+        key = (target, version)
+        with self._lock:
+            if key in self._running:
+                return {"status": "running"}
+            if key in self._errors:
+                return {"status": "failed", "error": self._errors[key]}
+        return {"status": "missing"}
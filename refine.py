@@ -0,0 +1,342 @@
+"""
+追问细化：用户在上一次结果的基础上追问（"只看计算机系的"、"按学分排序"、"学分最高的5个"）时，
+直接用pandas对上次的结果做向量化运算，不再生成SQL、不再访问数据库。
+
+支持的细化（可用"，/并/然后"连接多个）：
+- 筛选：<值>（在结果的文本列中查找，如"计算机系"）、不是<值>、<列>为<值>、<列>大于/小于/不低于…<数字>
+- 排序：按<列>排序 / 按<列>降序 / <列>从高到低
+- 前k个：前N个、<列>最高/最低的N个
+- 投影：只显示<列>[和<列>...]
+- 分组：按<列>统计[数量] / 按<列>统计平均|总|最高|最低<列>
+整句都能解释、且上次结果完整（没有被截断）时才在本地回答，其余情况返回None由调用方照常生成SQL。
+同时生成等价的SQL（以上次SQL为子查询），用于导出和后续分页。
+"""
+import json
+import operator
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from fast_path import COLUMN_SYNONYMS, VALUE_SUFFIXES, VALUE_SYNONYMS
+from sql_params import quote_literal
+
+# 缓存的结果超过该行数时不保留（追问照常访问数据库）
+REFINE_MAX_ROWS = int(os.getenv("REFINE_MAX_ROWS", "10000"))
+
+_LEAD_WORDS = ("只看", "只要", "只显示", "只保留", "只列出", "只留", "仅看", "仅显示", "再", "然后", "其中", "这些",
+               "结果中", "结果里", "里面", "请", "帮我", "给我", "把", "显示", "看看", "看", "仅", "只")
+_TAIL_WORDS = ("的数据", "的记录", "的结果", "的行", "即可", "就行", "的", "吧")
+_SEGMENT_RE = re.compile(r"，|,|；|;|并且|然后|再|并")
+_SEPARATOR_RE = re.compile(r"以及|和|与|及|、")
+_GROUP_RE = re.compile(r"^按(?:照)?(?P<c>.+?)(?:分组)?(?:统计|汇总|计数|分组)(?P<what>.*)$")
+_SORT_RE = re.compile(r"^(?:按(?:照)?)?(?P<c>.+?)(?P<dir>升序|降序|从高到低|从低到高|从大到小|从小到大|由高到低|由低到高|倒序)?"
+                      r"(?P<verb>排序|排列|排)?$")
+_TOP_RE = re.compile(r"^(?:(?P<c>.+?)(?P<dir>最高|最大|最多|最低|最小|最少)的)?(?P<first>前)?"
+                     r"(?P<n>\d+|[一二两三四五六七八九十]+)(?:个|名|条|行|位|门|项)?$")
+_COMPARE_RE = re.compile(r"^(?P<c>.+?)(?P<op>大于等于|小于等于|不少于|不低于|不超过|不高于|至少|至多|大于|小于|超过|高于|低于|"
+                         r"多于|少于|等于|>=|<=|>|<|=)(?P<v>-?\d+(?:\.\d+)?)$")
+_EQUALS_RE = re.compile(r"^(?P<c>.+?)(?:为|是|等于)(?P<v>.+)$")
+_NOT_RE = re.compile(r"^(?:不是|不要|除了|排除|去掉|除去)(?P<v>.+)$")
+_DESCENDING = ("降序", "从高到低", "从大到小", "由高到低", "倒序")
+_HIGHEST = ("最高", "最大", "最多")
+_OPERATORS = {
+    "大于等于": ">=", "不少于": ">=", "不低于": ">=", "至少": ">=", ">=": ">=",
+    "小于等于": "<=", "不超过": "<=", "不高于": "<=", "至多": "<=", "<=": "<=",
+    "大于": ">", "超过": ">", "高于": ">", "多于": ">", ">": ">",
+    "小于": "<", "低于": "<", "少于": "<", "<": "<", "等于": "=", "=": "=",
+}
+_COMPARE = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt, "=": operator.eq}
+_GROUP_AGGREGATES = {"平均": ("mean", "AVG"), "总": ("sum", "SUM"), "最高": ("max", "MAX"), "最大": ("max", "MAX"),
+                     "最低": ("min", "MIN"), "最小": ("min", "MIN")}
+_COUNT_WORDS = ("", "数量", "人数", "个数", "数目", "总数", "条数", "数")
+_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+def _number(text: str) -> Optional[int]:
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return _DIGITS.get(tens, 1 if not tens else 0) * 10 + _DIGITS.get(ones, 0) if len(tens) <= 1 else None
+    return _DIGITS.get(text)
+
+
+def _strip(text: str) -> str:
+    text = text.strip().strip("。.？?！!")
+    changed = True
+    while changed and text:
+        changed = False
+        for word in _LEAD_WORDS:
+            if text.startswith(word) and len(text) > len(word):
+                text, changed = text[len(word):], True
+                break
+        for word in _TAIL_WORDS:
+            if text.endswith(word) and len(text) > len(word):
+                text, changed = text[:-len(word)], True
+                break
+    return text.strip()
+
+
+def _custom_values() -> Dict[str, str]:
+    path = os.getenv("FAST_PATH_SYNONYMS")
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("values", {})
+
+
+class _Frame:
+    """在一个DataFrame上解析列名和取值"""
+
+    def __init__(self, frame: pd.DataFrame, partial: bool = False):
+        self.frame = frame
+        self.partial = partial
+        self.terms = {}
+        for col in frame.columns:
+            self.terms[str(col).lower()] = col
+            self.terms[str(col).lower().replace("_", " ")] = col
+        lowered = {str(c).lower(): c for c in frame.columns}
+        for term, candidates in COLUMN_SYNONYMS.items():
+            found = next((lowered[c.lower()] for c in candidates if c.lower() in lowered), None)
+            if found is not None:
+                self.terms.setdefault(term, found)
+        self.values = dict(VALUE_SYNONYMS, **_custom_values())
+
+    def column(self, text: str) -> Optional[str]:
+        return self.terms.get(text.strip().lower())
+
+    def columns(self, text: str) -> Optional[List[str]]:
+        result = []
+        for part in _SEPARATOR_RE.split(text):
+            column = self.column(part)
+            if column is None:
+                return None
+            if column not in result:
+                result.append(column)
+        return result
+
+    def numeric(self, column: str) -> pd.Series:
+        series = self.frame[column]
+        return series if pd.api.types.is_numeric_dtype(series) else pd.to_numeric(series, errors="coerce")
+
+    def is_numeric(self, column: str) -> bool:
+        series = self.frame[column].dropna()
+        return len(series) > 0 and self.numeric(column).notna().sum() == len(series)
+
+    def value(self, text: str, column: str = None) -> Optional[tuple]:
+        """在文本列中查找取值，返回 (列, 库中的值)；多列都能匹配时视为有歧义"""
+        text = text.strip().strip("'\"‘’“”")
+        candidates = {text.lower()}
+        for suffix in VALUE_SUFFIXES:
+            if text.endswith(suffix) and len(text) > len(suffix):
+                candidates.add(text[:-len(suffix)].lower())
+        for word in list(candidates):
+            for term, value in self.values.items():
+                if term.lower() == word:
+                    candidates.add(str(value).lower())
+        matches = []
+        for col in [column] if column is not None else list(self.frame.columns):
+            series = self.frame[col]
+            if pd.api.types.is_numeric_dtype(series) and column is None:
+                continue
+            for value in series.dropna().unique()[:5000]:
+                if str(value).lower() in candidates:
+                    matches.append((col, value))
+                    break
+        if not matches and self.partial and candidates & {term.lower() for term in self.values}:
+            # 只有第一页数据时，已知的取值说法先视为可以回答，取到完整结果后再确认
+            return None, text
+        return matches[0] if len(matches) == 1 else None
+
+
+def _top_n(m) -> Optional[int]:
+    return _number(m.group("n")) if m.group("first") or m.group("dir") else None
+
+
+def parse_step(segment: str, view: _Frame) -> Optional[Dict[str, Any]]:
+    """把一个片段解释为一个操作，无法解释时返回None"""
+    text = _strip(segment)
+    if not text:
+        return None
+    m = _GROUP_RE.match(text)
+    if m:
+        column = view.column(m.group("c"))
+        what = m.group("what").strip().lstrip("的")
+        if column is not None and what in _COUNT_WORDS:
+            return {"op": "group", "by": column, "agg": "count"}
+        for word, (agg, func) in _GROUP_AGGREGATES.items():
+            target = column is not None and what.startswith(word) and view.column(what[len(word):].lstrip("的"))
+            if target and view.is_numeric(target):
+                return {"op": "group", "by": column, "agg": agg, "func": func, "column": target}
+        return None
+    m = _TOP_RE.match(text)
+    if m and _top_n(m):
+        step = {"op": "top", "n": _top_n(m)}
+        if m.group("c"):
+            column = view.column(m.group("c"))
+            if column is None:
+                return None
+            step.update(column=column, descending=m.group("dir") in _HIGHEST)
+        return step
+    m = _SORT_RE.match(text)
+    if m and (m.group("dir") or m.group("verb")):
+        column = view.column(m.group("c"))
+        if column is not None:
+            return {"op": "sort", "column": column, "descending": m.group("dir") in _DESCENDING}
+    m = _COMPARE_RE.match(text)
+    if m:
+        column = view.column(m.group("c"))
+        if column is not None and view.is_numeric(column):
+            return {"op": "compare", "column": column, "operator": _OPERATORS[m.group("op")],
+                    "value": float(m.group("v")) if "." in m.group("v") else int(m.group("v"))}
+    m = _EQUALS_RE.match(text)
+    if m and view.column(m.group("c")) is not None:
+        found = view.value(m.group("v"), view.column(m.group("c")))
+        return {"op": "filter", "column": found[0], "value": found[1], "negate": False} if found else None
+    m = _NOT_RE.match(text)
+    if m:
+        found = view.value(_strip(m.group("v")))
+        return {"op": "filter", "column": found[0], "value": found[1], "negate": True} if found else None
+    columns = view.columns(text)
+    if columns:
+        return {"op": "project", "columns": columns}
+    found = view.value(text)
+    if found:
+        return {"op": "filter", "column": found[0], "value": found[1], "negate": False}
+    return None
+
+
+def apply_step(frame: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    view = _Frame(frame)
+    op = step["op"]
+    if op == "filter":
+        if step["column"] is None:
+            return frame
+        mask = frame[step["column"]] == step["value"]
+        return frame[~mask if step["negate"] else mask]
+    if op == "compare":
+        return frame[_COMPARE[step["operator"]](view.numeric(step["column"]), step["value"])]
+    if op == "project":
+        return frame[step["columns"]]
+    if op == "sort" or op == "top" and "column" in step:
+        key = (lambda s: pd.to_numeric(s, errors="coerce")) if view.is_numeric(step["column"]) else None
+        frame = frame.sort_values(step["column"], ascending=not step["descending"], kind="stable",
+                                  na_position="last", key=key)
+    if op == "top":
+        return frame.head(step["n"])
+    if op == "group":
+        grouped = frame.assign(_v=view.numeric(step["column"]) if "column" in step else 0).groupby(
+            step["by"], dropna=False, sort=True)
+        if step["agg"] == "count":
+            return grouped.size().reset_index(name="total")
+        name = f"{step['func'].lower()}_{step['column']}"
+        return getattr(grouped["_v"], step["agg"])().reset_index(name=name)
+    return frame
+
+
+def describe_step(step: Dict[str, Any]) -> str:
+    op = step["op"]
+    if op == "filter":
+        return f"筛选 {step['column']} {'!=' if step['negate'] else '='} {step['value']!r}"
+    if op == "compare":
+        return f"筛选 {step['column']} {step['operator']} {step['value']}"
+    if op == "project":
+        return f"只保留列 {', '.join(step['columns'])}"
+    if op == "sort":
+        return f"按 {step['column']} {'降序' if step['descending'] else '升序'}排序"
+    if op == "top":
+        return f"取前{step['n']}行" + (f"（按 {step['column']} {'降序' if step['descending'] else '升序'}）"
+                                    if "column" in step else "")
+    if step["agg"] == "count":
+        return f"按 {step['by']} 分组计数"
+    return f"按 {step['by']} 分组计算 {step['func']}({step['column']})"
+
+
+def step_sql(sql: str, step: Dict[str, Any], alias: str) -> str:
+    """以上一步的SQL为子查询写出等价SQL"""
+    source = f"({sql.strip().rstrip(';')}) AS {alias}"
+    op = step["op"]
+    if op == "filter":
+        return f"SELECT * FROM {source} WHERE `{step['column']}` {'<>' if step['negate'] else '='} " \
+               f"{quote_literal(step['value'])}"
+    if op == "compare":
+        return f"SELECT * FROM {source} WHERE `{step['column']}` {step['operator']} {step['value']}"
+    if op == "project":
+        return f"SELECT {', '.join(f'`{c}`' for c in step['columns'])} FROM {source}"
+    order = f" ORDER BY `{step['column']}` {'DESC' if step['descending'] else 'ASC'}" if "descending" in step else ""
+    if op == "sort":
+        return f"SELECT * FROM {source}{order}"
+    if op == "top":
+        return f"SELECT * FROM {source}{order} LIMIT {step['n']}"
+    if step["agg"] == "count":
+        return f"SELECT `{step['by']}`, COUNT(*) AS total FROM {source} GROUP BY `{step['by']}`"
+    return (f"SELECT `{step['by']}`, {step['func']}(`{step['column']}`) AS {step['func'].lower()}_{step['column']} "
+            f"FROM {source} GROUP BY `{step['by']}`")
+
+
+def refine_frame(question: str, frame: pd.DataFrame, partial: bool = False) -> Optional[tuple]:
+    """按顺序解释并执行问题中的每个细化操作，返回 (新DataFrame, 操作列表)；有任何片段无法解释时返回None。
+    partial表示frame只是部分结果，只用于判断问题能否本地回答"""
+    steps = []
+    for segment in _SEGMENT_RE.split(question):
+        if not _strip(segment):
+            continue
+        step = parse_step(segment, _Frame(frame, partial))
+        if step is None:
+            return None
+        frame = apply_step(frame, step)
+        steps.append(step)
+    return (frame, steps) if steps else None
+
+
+def to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+class ResultCache:
+    """一个会话最近一次的查询结果；追问命中时细化后的结果成为新的"上次结果"，可以连续追问"""
+
+    def __init__(self, max_rows: int = REFINE_MAX_ROWS):
+        self.max_rows = max_rows
+        self.clear()
+
+    def clear(self):
+        self.question = None
+        self.sql = None
+        self.frame = None
+        self.complete = False
+
+    def store(self, question: str, sql: str, rows: List[Dict[str, Any]], complete: bool = True):
+        """保存执行成功的结果；complete=False 表示只是第一页，追问时需要先取完整结果"""
+        if len(rows) > self.max_rows:
+            self.clear()
+            return
+        self.question, self.sql, self.complete = question, sql, complete
+        self.frame = pd.DataFrame(rows)
+
+    def refine(self, question: str, load_rows: Callable[[str], Optional[List[Dict[str, Any]]]] = None
+               ) -> Optional[Dict[str, Any]]:
+        """能在上次结果上回答时返回与query_data相同格式的结果（附带refined说明和等价SQL），否则返回None"""
+        if self.frame is None or self.frame.empty or not question:
+            return None
+        refined = refine_frame(question, self.frame, partial=not self.complete)
+        if refined is not None and not self.complete:
+            # 先确认问题可以本地回答，再取一次完整结果（仍然不调用大模型）
+            rows = load_rows(self.sql) if load_rows else None
+            if rows is None or len(rows) > self.max_rows:
+                return None
+            self.frame, self.complete = pd.DataFrame(rows), True
+            refined = refine_frame(question, self.frame)
+        if refined is None:
+            return None
+        frame, steps = refined
+        sql = self.sql
+        for i, step in enumerate(steps, 1):
+            sql = step_sql(sql, step, f"_r{i}")
+        result = {"success": True, "results": to_records(frame), "rowCount": len(frame), "sql": sql,
+                  "refined": {"from_question": self.question, "from_sql": self.sql,
+                              "operations": [describe_step(step) for step in steps]}}
+        self.question, self.sql, self.frame = question, sql, frame.reset_index(drop=True)
+        return result
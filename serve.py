@@ -0,0 +1,53 @@
+"""
+生产环境启动脚本：多worker、关闭热重载，并配合 /ready 探针做优雅退出。
+
+用法：
+    python serve.py --workers 4 --port 8000
+
+每个worker进程有独立的连接池和表结构缓存，启动时各自预热；
+收到SIGTERM后先把 /ready 置为503，等待 --drain-seconds 秒再停止接收新连接，
+随后最多等待 --graceful-timeout 秒让进行中的请求完成。
+监视查询（/watches）只保存在单个进程中，需要时用 --workers 1 启动。
+"""
+import os
+import sys
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以多worker方式启动MySQL MCP服务")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="worker进程数，默认取WEB_CONCURRENCY或CPU核数")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="停止接收新请求后等待进行中请求完成的秒数")
+    parser.add_argument("--drain-seconds", type=float, default=None,
+                        help="收到SIGTERM后 /ready 返回503 的持续时间，默认取DRAIN_SECONDS环境变量")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    # worker进程重新导入main，配置只能通过环境变量传递
+    if args.drain_seconds is not None:
+        os.environ["DRAIN_SECONDS"] = str(args.drain_seconds)
+    os.environ["SERVER_WORKERS"] = str(max(args.workers, 1))
+
+    import uvicorn
+    from main import validate_config
+
+    validate_config()
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=max(args.workers, 1),
+        reload=False,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+并发查询合并（single-flight）：同一时刻相同键的请求只执行一次，所有等待者共享结果或异常。
+
+执行放在独立线程池中，不绑定在某个请求上：发起请求的客户端离开后，
+其他等待者仍能拿到结果；只有所有等待者都离开后才取消执行（调用注册的取消回调）。
+同步调用用 wait()，异步调用用 wait_async()，两者可以等待同一次执行。
+执行函数可以通过 publish() 分批发布中间结果，晚加入的订阅者会先收到已发布的部分。
+"""
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class FlightCancelled(Exception):
+    pass
+
+
+class Flight:
+    def __init__(self, group: "SingleFlight", key: Hashable):
+        self.group = group
+        self.key = key
+        self.future: Optional[Future] = None
+        self.waiters = 0
+        self.cancelled = False
+        self._chunks: List[tuple] = []
+        self._listeners: List[Callable] = []
+        self._cancel_hooks: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def publish(self, *chunk):
+        """由执行函数调用：发布一批中间结果"""
+        with self._lock:
+            self._chunks.append(chunk)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(*chunk)
+
+    def subscribe(self, listener: Callable):
+        """订阅中间结果；先补发已发布的部分"""
+        with self._lock:
+            backlog = list(self._chunks)
+            self._listeners.append(listener)
+        for chunk in backlog:
+            listener(*chunk)
+
+    def unsubscribe(self, listener: Callable):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def on_cancel(self, hook: Callable[[], Any]):
+        """由执行函数调用：注册取消回调（例如对正在执行的连接发送KILL QUERY）"""
+        with self._lock:
+            if not self.cancelled:
+                self._cancel_hooks.append(hook)
+                return
+        hook()
+
+    def clear_cancel_hooks(self):
+        with self._lock:
+            self._cancel_hooks.clear()
+
+    def _cancel(self):
+        with self._lock:
+            self.cancelled = True
+            hooks = list(self._cancel_hooks)
+            self._cancel_hooks.clear()
+        if self.future.cancel():
+            return
+        for hook in hooks:
+            hook()
+
+    def leave(self):
+        """等待者放弃等待；最后一个等待者离开且执行未完成时取消执行"""
+        self.group._leave(self)
+
+    def wait(self, timeout: float = None, listener: Callable = None) -> Any:
+        """同步等待结果；超时抛出TimeoutError并离开"""
+        if listener:
+            self.subscribe(listener)
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise FlightCancelled("Query was cancelled")
+        except FutureTimeout:
+            self.leave()
+            raise TimeoutError("Timed out waiting for query result")
+        finally:
+            if listener:
+                self.unsubscribe(listener)
+
+    async def wait_async(self, listener: Callable = None) -> Any:
+        """异步等待结果；协程被取消时离开。listener在事件循环中被调用，可以是协程函数"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def forward(*chunk):
+            loop.call_soon_threadsafe(queue.put_nowait, chunk)
+
+        if listener:
+            self.subscribe(forward)
+        self.future.add_done_callback(lambda _: loop.call_soon_threadsafe(queue.put_nowait, None))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                if listener:
+                    outcome = listener(*chunk)
+                    if asyncio.iscoroutine(outcome):
+                        await outcome
+            try:
+                return self.future.result()
+            except CancelledError:
+                raise FlightCancelled("Query was cancelled")
+        except asyncio.CancelledError:
+            self.leave()
+            raise
+        finally:
+            if listener:
+                self.unsubscribe(forward)
+
+
+class SingleFlight:
+    def __init__(self, max_workers: int = 32):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="singleflight")
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executions = 0
+        self.cancellations = 0
+
+    def join(self, key: Hashable, fn: Callable[[Flight], Any]) -> Tuple[Flight, bool]:
+        """加入键对应的执行，没有进行中的执行时用fn(flight)发起一次。
+        返回 (flight, 是否由本次请求发起)，之后调用flight.wait()或flight.wait_async()"""
+        with self._lock:
+            self.requests += 1
+            flight = self._flights.get(key)
+            if flight is not None and not flight.cancelled:
+                flight.waiters += 1
+                return flight, False
+            flight = Flight(self, key)
+            flight.waiters = 1
+            self._flights[key] = flight
+            self.executions += 1
+            flight.future = self._executor.submit(self._run, flight, fn)
+            return flight, True
+
+    def _run(self, flight: Flight, fn: Callable[[Flight], Any]) -> Any:
+        try:
+            return fn(flight)
+        finally:
+            # 执行结束后新请求重新执行，不会拿到旧结果
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    def _leave(self, flight: Flight):
+        with self._lock:
+            flight.waiters -= 1
+            abandon = flight.waiters <= 0 and not flight.future.done()
+            if abandon:
+                self.cancellations += 1
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+        if abandon:
+            flight._cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            coalesced = self.requests - self.executions
+            return {
+                "requests": self.requests,
+                "executions": self.executions,
+                "coalesced": coalesced,
+                "coalescing_ratio": round(coalesced / self.requests, 4) if self.requests else 0.0,
+                "abandoned": self.cancellations,
+                "in_flight": len(self._flights),
+            }
+
@@ -0,0 +1,356 @@
+"""
+物化快照：把反复执行的重型报表查询注册为快照，按计划或按需刷新并保存在本地，
+之后匹配的查询直接返回快照结果，附带刷新时间和陈旧程度。
+
+- 匹配：按SQL指纹（字面量替换为 ?）加上各字面量的值，参数化发送的查询代入参数后比较，
+  只有字面量不同的查询不会误用快照；
+- 刷新：注册时指定间隔（interval秒，0为只按需刷新），由一个调度线程发起；同一快照同一时间只有一个刷新，
+  新结果完整读取后才替换当前结果（引用替换），读取方从不等待刷新；
+- 陈旧：结果附带 refreshed_at、age_seconds；设置了max_age且超过时不再使用快照，查询照常执行；
+- 存储：SNAPSHOT_DIR/registry.json 保存注册信息，<id>.json 保存最近一次结果（先写临时文件再替换），
+  重启后直接加载，过期的快照在后台补刷新；
+- 多进程：同一目录可由多个worker共享。注册和删除在文件锁下先读入磁盘上的注册表再合并写回，
+  查找前按文件修改时间同步其他进程的注册和刷新结果；持有 scheduler.lock 的进程负责按计划刷新，
+  该进程退出后由其他进程接管（没有fcntl的平台上不加锁，各进程各自调度）。
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from sql_params import decode_string
+from sql_text import fingerprint_sql, literal_values
+
+logger = logging.getLogger("mysql-mcp-server")
+
+
+class SnapshotLimit(Exception):
+    pass
+
+
+def match_key(sql: str) -> Tuple[str, tuple]:
+    """(指纹, 字面量值)；字符串按解码后的值比较，数字按文本比较"""
+    values = tuple(("s", decode_string(v)) if v[0] in "'\"" else ("n", v) for v in literal_values(sql))
+    return fingerprint_sql(sql), values
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    with open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _write_json(path: str, data: Any):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    def __init__(self, meta: Dict[str, Any], data: Optional[Dict[str, Any]] = None):
+        self.meta = meta
+        # 当前结果 {"results", "refreshed_ts", "refreshed_at", "duration_ms"}，刷新时整体替换
+        self.data = data
+        self.data_mtime: Optional[int] = None
+        self.refreshing = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.last_attempt = 0.0
+        self.hits = 0
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    def due(self, now: float) -> bool:
+        if self.data is None:
+            return self.last_attempt == 0 or self.meta["interval"] > 0 and now - self.last_attempt >= self.meta["interval"]
+        return self.meta["interval"] > 0 and now - max(self.data["refreshed_ts"], self.last_attempt) >= self.meta["interval"]
+
+    def staleness(self, data: Optional[Dict[str, Any]] = None, now: float = None) -> Dict[str, Any]:
+        data = data or self.data
+        now = now or time.time()
+        info = {"id": self.id, "refreshing": self.refreshing.is_set(), "last_error": self.last_error,
+                "interval": self.meta["interval"], "max_age": self.meta.get("max_age")}
+        if data is None:
+            return dict(info, refreshed_at=None, age_seconds=None, stale=True)
+        age = now - data["refreshed_ts"]
+        stale = bool(self.last_error) or self.meta["interval"] > 0 and age > 2 * self.meta["interval"] \
+            or bool(self.meta.get("max_age")) and age > self.meta["max_age"]
+        next_at = None
+        if self.meta["interval"] > 0:
+            next_at = datetime.fromtimestamp(max(data["refreshed_ts"], self.last_attempt) + self.meta["interval"]) \
+                .strftime("%Y-%m-%d %H:%M:%S")
+        return dict(info, refreshed_at=data["refreshed_at"], age_seconds=round(age, 1), stale=stale,
+                    next_refresh_at=next_at, row_count=len(data["results"]), duration_ms=data["duration_ms"])
+
+    def info(self) -> Dict[str, Any]:
+        return {**self.meta, **self.staleness(), "hits": self.hits}
+
+
+class SnapshotManager:
+    """注册、调度刷新和查找快照；run(sql, database, max_rows_examined) 执行查询，结果须已是JSON类型（与从磁盘加载的一致）"""
+
+    def __init__(self, run: Callable[[str, Optional[str], Optional[int]], Dict[str, Any]], directory: str,
+                 max_snapshots: int = 20, max_rows: int = 50000, min_interval: float = 60):
+        self.run = run
+        self.directory = directory
+        self.max_snapshots = max_snapshots
+        self.max_rows = max_rows
+        self.min_interval = min_interval
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._by_key: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"served": 0, "refreshes": 0, "failed_refreshes": 0}
+        self._registry_mtime: Optional[int] = None
+        self._scheduler_file = None
+
+    def _key(self, sql: str, database: Optional[str]) -> tuple:
+        return (database,) + match_key(sql)
+
+    def _registry_path(self) -> str:
+        return os.path.join(self.directory, "registry.json")
+
+    def _data_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.directory, f"{snapshot_id}.json")
+
+    @contextlib.contextmanager
+    def _registry_lock(self):
+        """修改注册表时持有的跨进程锁；进入时先同步磁盘上的注册表，退出前写回"""
+        os.makedirs(self.directory, exist_ok=True)
+        with _file_lock(os.path.join(self.directory, "registry.lock")):
+            self._sync(force=True)
+            yield
+            with self._lock:
+                metas = [s.meta for s in self._snapshots.values()]
+            _write_json(self._registry_path(), metas)
+            self._registry_mtime = _mtime(self._registry_path())
+
+    def _sync(self, force: bool = False):
+        """按磁盘上的registry.json更新本进程的注册表（包括其他进程的注册和删除）；文件未变化时只做一次stat"""
+        mtime = _mtime(self._registry_path())
+        if mtime == self._registry_mtime and not force:
+            return
+        metas = []
+        if mtime is not None:
+            try:
+                with open(self._registry_path(), "r", encoding="utf-8") as f:
+                    metas = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot registry unreadable: {e}")
+                return
+        with self._lock:
+            current = self._snapshots
+            self._snapshots = {}
+            for meta in metas:
+                snapshot = current.get(meta["id"]) or Snapshot(meta)
+                snapshot.meta = meta
+                self._snapshots[meta["id"]] = snapshot
+            self._by_key = {self._key(m["sql"], m.get("database")): m["id"] for m in metas}
+            self._registry_mtime = mtime
+
+    def _load_data(self, snapshot: Snapshot):
+        """结果文件比内存中的新时（本进程首次加载或其他进程刷新过）重新读取"""
+        path = self._data_path(snapshot.id)
+        mtime = _mtime(path)
+        if mtime is None or mtime == snapshot.data_mtime:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot.data = json.load(f)
+            snapshot.data_mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"Snapshot {snapshot.id} data unreadable, will refresh: {e}")
+
+    def load(self):
+        """加载已注册的快照和最近一次结果"""
+        self._sync(force=True)
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        for snapshot in snapshots:
+            self._load_data(snapshot)
+
+    def start(self):
+        self.load()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="snapshot-scheduler")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._scheduler_file is not None:
+            self._scheduler_file.close()
+            self._scheduler_file = None
+
+    def _own_scheduler(self) -> bool:
+        """是否由本进程按计划刷新：非阻塞地持有 scheduler.lock，持有者退出后锁自动释放"""
+        if self._scheduler_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        f = open(os.path.join(self.directory, "scheduler.lock"), "a")
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+        self._scheduler_file = f
+        logger.info(f"Process {os.getpid()} schedules snapshot refreshes")
+        return True
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            if self._own_scheduler():
+                self.load()
+                now = time.time()
+                with self._lock:
+                    due = [s for s in self._snapshots.values() if not s.refreshing.is_set() and s.due(now)]
+                for snapshot in due:
+                    self.refresh(snapshot.id)
+            self._wake.wait(1.0)
+            self._wake.clear()
+
+    def register(self, sql: str, database: Optional[str], interval: float, max_age: Optional[float] = None,
+                 max_rows_examined: Optional[int] = None) -> Tuple[Snapshot, bool]:
+        """注册快照（同一查询已注册时更新其刷新设置），返回 (快照, 是否新建)；首次结果在后台刷新"""
+        interval = max(float(interval), self.min_interval) if interval else 0
+        key = self._key(sql, database)
+        with self._registry_lock(), self._lock:
+            snapshot = self._snapshots.get(self._by_key.get(key))
+            created = snapshot is None
+            if created:
+                if len(self._snapshots) >= self.max_snapshots:
+                    raise SnapshotLimit(f"Too many snapshots (limit {self.max_snapshots})")
+                snapshot = Snapshot({"id": uuid.uuid4().hex[:12], "sql": sql, "database": database,
+                                     "fingerprint": key[1],
+                                     "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+                self._snapshots[snapshot.id] = snapshot
+                self._by_key[key] = snapshot.id
+            snapshot.meta.update(interval=interval, max_age=max_age, max_rows_examined=max_rows_examined)
+        self._wake.set()
+        return snapshot, created
+
+    def get(self, snapshot_id: str) -> Optional[Snapshot]:
+        self._sync()
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is not None:
+            self._load_data(snapshot)
+        return snapshot
+
+    def list(self) -> List[Dict[str, Any]]:
+        self.load()
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return [s.info() for s in snapshots]
+
+    def remove(self, snapshot_id: str) -> bool:
+        with self._registry_lock(), self._lock:
+            snapshot = self._snapshots.pop(snapshot_id, None)
+            self._by_key = {k: v for k, v in self._by_key.items() if v != snapshot_id}
+        if snapshot is None:
+            return False
+        try:
+            os.remove(self._data_path(snapshot_id))
+        except OSError:
+            pass
+        return True
+
+    def refresh(self, snapshot_id: str) -> Optional[threading.Thread]:
+        """在后台刷新快照，返回执行刷新的线程（已在刷新时返回正在运行的线程）"""
+        snapshot = self.get(snapshot_id)
+        if snapshot is None:
+            return None
+        with self._lock:
+            if snapshot.refreshing.is_set():
+                return snapshot.thread
+            snapshot.refreshing.set()
+            snapshot.last_attempt = time.time()
+            snapshot.thread = threading.Thread(target=self._refresh, args=(snapshot,), daemon=True,
+                                               name=f"snapshot-{snapshot_id}")
+            # 在锁内启动，其他调用方拿到的线程都已启动，可以直接join
+            snapshot.thread.start()
+        return snapshot.thread
+
+    def _refresh(self, snapshot: Snapshot):
+        try:
+            started = time.perf_counter()
+            result = self.run(snapshot.meta["sql"], snapshot.meta.get("database"),
+                              snapshot.meta.get("max_rows_examined"))
+            if not result.get("success"):
+                raise ValueError(result.get("error") or "Query failed")
+            if len(result["results"]) > self.max_rows:
+                raise ValueError(f"Result has more than {self.max_rows} rows")
+            now = time.time()
+            data = {"results": result["results"], "refreshed_ts": now,
+                    "refreshed_at": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+            with self._lock:
+                registered = self._snapshots.get(snapshot.id) is snapshot
+            if registered:
+                os.makedirs(self.directory, exist_ok=True)
+                _write_json(self._data_path(snapshot.id), data)
+                snapshot.data_mtime = _mtime(self._data_path(snapshot.id))
+            # 整体替换引用，读取方拿到的要么是旧结果要么是新结果
+            snapshot.data = data
+            snapshot.last_error = None
+            self._count("refreshes")
+        except Exception as e:
+            snapshot.last_error = str(e)
+            self._count("failed_refreshes")
+            logger.warning(f"Snapshot {snapshot.id} refresh failed: {e}")
+        finally:
+            snapshot.refreshing.clear()
+
+    def lookup(self, sql: str, database: Optional[str]) -> Optional[Dict[str, Any]]:
+        """匹配的快照结果（附带陈旧信息）；没有匹配、尚无结果或超过max_age时返回None"""
+        self._sync()
+        if not self._snapshots:
+            return None
+        with self._lock:
+            snapshot = self._snapshots.get(self._by_key.get(self._key(sql, database)))
+        if snapshot is None:
+            return None
+        self._load_data(snapshot)
+        data = snapshot.data
+        if data is None:
+            return None
+        staleness = snapshot.staleness(data)
+        if snapshot.meta.get("max_age") and staleness["age_seconds"] > snapshot.meta["max_age"]:
+            return None
+        with self._lock:
+            snapshot.hits += 1
+            self._stats["served"] += 1
+        return {"success": True, "results": data["results"], "rowCount": len(data["results"]), "snapshot": staleness}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"registered": len(self._snapshots), **self._stats}
@@ -0,0 +1,239 @@
+"""
+参数化查询：客户端把SQL中的字面量提取为参数，服务端用预处理语句执行。
+
+客户端 parameterize_sql 只提取 WHERE/ON/HAVING 中作为比较、LIKE、IN列表、BETWEEN 操作数的
+字符串和整数字面量，替换为 ?；选择列表、GROUP BY、ORDER BY、LIMIT 中的字面量保持原样，
+避免改变语义（如 ORDER BY 1）或在ONLY_FULL_GROUP_BY下出错。小数保持原样，避免精度变化。
+
+服务端 StatementCache 按连接缓存已PREPARE的模板（LRU，淘汰时DEALLOCATE）：
+绑定值通过 SET @变量 = %s 交给驱动转义后传入，再 EXECUTE ... USING，
+只有参数不同的查询在同一连接上只解析一次，参数值也不会被拼接进SQL文本。
+"""
+import collections
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from sql_rewrite import Token, tokenize
+
+PARAM_VARIABLE = "_mcp_p"
+STATEMENT_PREFIX = "mcp_stmt_"
+# MySQL错误码：EXECUTE/DEALLOCATE时语句不存在（连接被重置等）
+UNKNOWN_STATEMENT = 1243
+
+_COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">=", "<=>"}
+_PARAM_CLAUSES = {"WHERE", "ON", "HAVING"}
+_CLAUSE_STARTS = {"SELECT": "SELECT", "FROM": "FROM", "JOIN": "FROM", "WHERE": "WHERE", "GROUP": "GROUP",
+                  "HAVING": "HAVING", "ORDER": "ORDER", "LIMIT": "LIMIT", "ON": "ON", "USING": "FROM"}
+_ESCAPES = {"0": "\0", "'": "'", '"': '"', "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a",
+            "\\": "\\", "%": "\\%", "_": "\\_"}
+_PARAM_TYPES = (str, int, float, bool, type(None))
+
+
+def decode_string(text: str) -> str:
+    """还原MySQL字符串字面量的值（去掉引号，处理重复引号和反斜杠转义；\\% \\_ 保留反斜杠）"""
+    quote, body = text[0], text[1:-1]
+    out = []
+    i = 0
+    while i < len(body):
+        ch = body[i]
+        if ch == "\\" and i + 1 < len(body):
+            out.append(_ESCAPES.get(body[i + 1], body[i + 1]))
+            i += 2
+            continue
+        if ch == quote and i + 1 < len(body) and body[i + 1] == quote:
+            i += 1
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _is_word(tok: Token, *words: str) -> bool:
+    return tok.kind == "word" and tok.text.upper() in words
+
+
+def _parameterizable(tokens: List[Token], k: int, in_lists: set, between: set) -> bool:
+    tok = tokens[k]
+    if tok.kind == "num":
+        if not tok.text.isdigit():
+            return False
+    elif tok.kind != "str":
+        return False
+    # 相邻字符串会被拼接；紧跟的单词说明是0x1F之类的写法
+    if k + 1 < len(tokens) and (tokens[k + 1].kind == "str" or tokens[k + 1].start == tok.end
+                                and tokens[k + 1].kind in ("word", "ident", "dot")):
+        return False
+    if k == 0:
+        return False
+    prev = tokens[k - 1]
+    if prev.kind == "op" and prev.text in _COMPARISONS or _is_word(prev, "LIKE", "BETWEEN"):
+        return True
+    if _is_word(prev, "AND") and k - 1 in between:
+        return True
+    return prev.kind in ("lparen", "comma") and bool(in_lists) and k + 1 < len(tokens) and \
+        tokens[k + 1].kind in ("comma", "rparen")
+
+
+def parameterize_sql(sql: str) -> Tuple[str, List[Any]]:
+    """把可安全参数化的字面量替换为 ?，返回 (模板, 参数列表)；没有可提取的字面量时参数列表为空"""
+    tokens = tokenize(sql)
+    clause_stack = [None]
+    paren_kinds = []
+    in_depths = set()
+    between = set()
+    pending_between = 0
+    pieces = []
+    params = []
+    last = 0
+    for k, tok in enumerate(tokens):
+        if tok.kind == "lparen":
+            is_in = k > 0 and _is_word(tokens[k - 1], "IN")
+            paren_kinds.append(is_in)
+            clause_stack.append(clause_stack[-1])
+            if is_in:
+                in_depths.add(len(paren_kinds))
+            continue
+        if tok.kind == "rparen":
+            if paren_kinds:
+                in_depths.discard(len(paren_kinds))
+                paren_kinds.pop()
+                clause_stack.pop()
+            continue
+        if tok.kind == "word":
+            word = tok.text.upper()
+            if word in _CLAUSE_STARTS:
+                clause_stack[-1] = _CLAUSE_STARTS[word]
+            elif word == "BETWEEN":
+                pending_between += 1
+            elif word == "AND" and pending_between:
+                between.add(k)
+                pending_between -= 1
+            continue
+        current_in = {len(paren_kinds)} & in_depths
+        if clause_stack[-1] in _PARAM_CLAUSES and _parameterizable(tokens, k, current_in, between):
+            pieces.append(sql[last:tok.start])
+            pieces.append("?")
+            last = tok.end
+            params.append(decode_string(tok.text) if tok.kind == "str" else int(tok.text))
+    if not params:
+        return sql, []
+    pieces.append(sql[last:])
+    return "".join(pieces), params
+
+
+def count_placeholders(template: str) -> int:
+    """模板中 ? 占位符的个数（字符串和注释中的不算）"""
+    return sum(1 for tok in tokenize(template) if tok.kind == "op" and tok.text == "?")
+
+
+def check_params(template: str, params: List[Any]) -> Optional[str]:
+    """检查参数类型和个数，有问题时返回错误说明"""
+    for value in params:
+        if not isinstance(value, _PARAM_TYPES):
+            return f"Unsupported parameter type: {type(value).__name__}"
+    expected = count_placeholders(template)
+    if expected != len(params):
+        return f"Parameter count mismatch: SQL has {expected} placeholders but {len(params)} values were given"
+    return None
+
+
+def quote_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    escaped = (str(value).replace("\\", "\\\\").replace("'", "''").replace("\0", "\\0")
+               .replace("\n", "\\n").replace("\r", "\\r").replace("\x1a", "\\Z"))
+    return f"'{escaped}'"
+
+
+def inline_params(template: str, params: List[Any]) -> str:
+    """把参数转义后代回模板，得到等价的完整SQL，用于EXPLAIN和查询日志"""
+    pieces = []
+    last = 0
+    values = iter(params)
+    for tok in tokenize(template):
+        if tok.kind == "op" and tok.text == "?":
+            pieces.append(template[last:tok.start])
+            pieces.append(quote_literal(next(values, None)))
+            last = tok.end
+    pieces.append(template[last:])
+    return "".join(pieces)
+
+
+_stats = {"prepared": 0, "hits": 0, "evicted": 0, "reprepared": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def statement_cache_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["prepared"] + stats["hits"]
+    stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+    return stats
+
+
+class StatementCache:
+    """单条连接上已PREPARE的语句；连接同一时间只被一个线程借用，不需要加锁"""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = max(capacity, 1)
+        self._statements = collections.OrderedDict()
+        self._names = itertools.count(1)
+
+    def __len__(self):
+        return len(self._statements)
+
+    def prepare(self, cursor, template: str) -> str:
+        """返回模板对应的语句名，未缓存时PREPARE并按LRU淘汰最久未用的语句"""
+        name = self._statements.get(template)
+        if name is not None:
+            self._statements.move_to_end(template)
+            _count("hits")
+            return name
+        name = f"{STATEMENT_PREFIX}{next(self._names)}"
+        cursor.execute(f"PREPARE {name} FROM %s", (template,))
+        _count("prepared")
+        self._statements[template] = name
+        while len(self._statements) > self.capacity:
+            _, oldest = self._statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE PREPARE {oldest}")
+            _count("evicted")
+        return name
+
+    def clear(self):
+        self._statements.clear()
+
+
+def statement_cache(conn, capacity: int) -> StatementCache:
+    """连接上挂载的语句缓存，随连接一起关闭"""
+    cache = getattr(conn, "_statement_cache", None)
+    if cache is None:
+        cache = StatementCache(capacity)
+        conn._statement_cache = cache
+    return cache
+
+
+def execute_prepared(conn, cursor, template: str, params: List[Any], capacity: int = 64):
+    """在cursor上以预处理语句执行模板；语句在服务端已失效（连接被重置）时重新PREPARE一次"""
+    cache = statement_cache(conn, capacity)
+    variables = [f"@{PARAM_VARIABLE}{i}" for i in range(len(params))]
+    for attempt in range(2):
+        name = cache.prepare(cursor, template)
+        try:
+            if params:
+                cursor.execute("SET " + ", ".join(f"{v} = %s" for v in variables), tuple(params))
+            cursor.execute(f"EXECUTE {name}" + (" USING " + ", ".join(variables) if variables else ""))
+            return
+        except Exception as e:
+            if attempt or not e.args or e.args[0] != UNKNOWN_STATEMENT:
+                raise
+            cache.clear()
+            _count("reprepared")
@@ -0,0 +1,474 @@
+"""
+确定性SQL改写：大模型生成SQL之后、交给query_data执行之前，把已知的慢写法改写成等价的JOIN形式。
+
+只处理外层查询WHERE中作为顶层AND条件出现的两种写法：
+  x IN (SELECT c FROM ... GROUP BY ... [HAVING ...])
+      -> JOIN (SELECT [DISTINCT] c AS _rw_key FROM ... GROUP BY ...) AS _rwN ON x = _rwN._rw_key
+  x NOT IN (SELECT DISTINCT c FROM ...)（或子查询带GROUP BY）
+      -> LEFT JOIN (SELECT DISTINCT c AS _rw_key FROM ...) AS _rwN ON x = _rwN._rw_key
+         WHERE _rwN._rw_key IS NULL
+MySQL不能对带GROUP BY/HAVING的IN子查询做半连接转换，常常退化成逐行执行的依赖子查询，
+改写后派生表只物化一次；派生表去重后，连接不会放大外层行数。
+
+NULL语义：WHERE中IN结果为NULL和FALSE都会过滤该行，与内连接一致。
+NOT IN在子查询非空且x为NULL、或子查询结果含NULL时为NULL（行被过滤），反连接却会保留这些行，
+因此除非表结构能证明两边都是NOT NULL，改写会加上两个不相关（只执行一次）的守卫条件：
+  (x IS NOT NULL OR NOT EXISTS (SELECT 1 FROM (派生表) AS _rwNe))
+  NOT EXISTS (SELECT 1 FROM (派生表) AS _rwNn WHERE _rwNn._rw_key IS NULL)
+
+无法确定等价的情况保持原样：相关子查询（引用外层表；没有表结构时子查询中的列必须带表前缀）、
+外层 SELECT *、条件在OR之下、UNION等。每次改写写入 REWRITE_LOG_FILE。
+"""
+import logging
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("sql-rewrite")
+
+REWRITE_LOG_FILE = os.getenv("REWRITE_LOG_FILE", "rewrite.log")
+KEY_COLUMN = "_rw_key"
+MAX_REWRITES = 8
+
+Token = namedtuple("Token", "kind text start end")
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<str>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<ident>`(?:[^`]|``)*`)
+  | (?P<num>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+  | (?P<word>[A-Za-z_$@][\w$@]*)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<dot>\.)
+  | (?P<op><=>|<>|[<>!=]=?|\|\||&&|[-+*/%^~&|;:?])
+  | (?P<other>.)
+""", re.X | re.S)
+
+# 不是列名的单词：关键字、无括号调用的函数、类型名等
+_KEYWORDS = {
+    "SELECT", "DISTINCT", "DISTINCTROW", "ALL", "FROM", "WHERE", "GROUP", "BY", "HAVING", "ORDER", "ASC", "DESC",
+    "LIMIT", "OFFSET", "AS", "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "OUTER", "CROSS", "NATURAL",
+    "STRAIGHT_JOIN", "AND", "OR", "XOR", "NOT", "IN", "IS", "NULL", "LIKE", "BETWEEN", "EXISTS", "CASE", "WHEN",
+    "THEN", "ELSE", "END", "TRUE", "FALSE", "UNKNOWN", "UNION", "INTERSECT", "EXCEPT", "ANY", "SOME", "INTERVAL",
+    "DIV", "MOD", "REGEXP", "RLIKE", "ESCAPE", "BINARY", "COLLATE", "WITH", "ROLLUP", "SEPARATOR",
+    "MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR",
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "CURRENT_USER", "LOCALTIME", "LOCALTIMESTAMP",
+    "INTO", "FOR", "UPDATE", "SHARE", "LOCK", "MODE", "WINDOW", "OVER", "PARTITION", "ROWS", "RANGE",
+    "CHAR", "NCHAR", "SIGNED", "UNSIGNED", "DECIMAL", "INTEGER", "DATETIME", "JSON",
+    "DUAL", "USE", "FORCE", "IGNORE", "INDEX", "KEY",
+}
+_CLAUSE_WORDS = {"SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT"}
+_CLAUSE_ORDER = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+
+
+def tokenize(sql: str) -> List[Token]:
+    """切分为词法单元，丢弃空白和注释，保留在原文中的位置以便原样拼接"""
+    tokens = []
+    for m in _TOKEN_RE.finditer(sql):
+        if m.lastgroup not in ("ws", "comment"):
+            tokens.append(Token(m.lastgroup, m.group(), m.start(), m.end()))
+    return tokens
+
+
+def _is_kw(tok: Token, *words: str) -> bool:
+    return tok.kind == "word" and tok.text.upper() in words
+
+
+def is_name(tok: Token) -> bool:
+    return tok.kind == "ident" or tok.kind == "word" and tok.text.upper() not in _KEYWORDS
+
+
+def unquote(tok: Token) -> str:
+    return tok.text[1:-1].replace("``", "`") if tok.kind == "ident" else tok.text
+
+
+def match_paren(tokens: List[Token], i: int) -> int:
+    depth = 0
+    for k in range(i, len(tokens)):
+        if tokens[k].kind == "lparen":
+            depth += 1
+        elif tokens[k].kind == "rparen":
+            depth -= 1
+            if depth == 0:
+                return k
+    return -1
+
+
+def index_hint_end(tokens: List[Token], k: int, e: int) -> Optional[int]:
+    """k处是索引提示 USE|FORCE|IGNORE INDEX|KEY [FOR JOIN|ORDER BY|GROUP BY] (...) 时返回其后的位置"""
+    if not (k + 1 < e and _is_kw(tokens[k], "USE", "FORCE", "IGNORE") and _is_kw(tokens[k + 1], "INDEX", "KEY")):
+        return None
+    m = k + 2
+    if m < e and _is_kw(tokens[m], "FOR"):
+        m += 3 if m + 1 < e and _is_kw(tokens[m + 1], "ORDER", "GROUP") else 2
+    if m >= e or tokens[m].kind != "lparen":
+        return None
+    close = match_paren(tokens, m)
+    return close + 1 if 0 <= close < e else None
+
+
+def _text(sql: str, tokens: List[Token], b: int, e: int) -> str:
+    return sql[tokens[b].start:tokens[e - 1].end] if b < e else ""
+
+
+def split_select(tokens: List[Token], b: int, e: int) -> Optional[Dict[str, Tuple[int, int, int]]]:
+    """把单个SELECT拆成子句，返回 {子句: (关键字位置, 内容起点, 内容终点)}；不支持的结构返回None"""
+    if b >= e or not _is_kw(tokens[b], "SELECT"):
+        return None
+    marks = []
+    depth = 0
+    k = b
+    while k < e:
+        tok = tokens[k]
+        if tok.kind == "lparen":
+            depth += 1
+        elif tok.kind == "rparen":
+            depth -= 1
+        elif depth == 0 and tok.kind == "word":
+            # 索引提示里的 FOR ORDER BY 等不是子句
+            hint = index_hint_end(tokens, k, e)
+            if hint is not None:
+                k = hint
+                continue
+            word = tok.text.upper()
+            if word in ("UNION", "INTERSECT", "EXCEPT", "INTO", "FOR", "LOCK", "WINDOW"):
+                return None
+            if word == "SELECT" and k != b:
+                return None
+            if word in ("SELECT", "FROM", "WHERE", "HAVING", "LIMIT"):
+                marks.append((word, k, k + 1))
+            elif word in ("GROUP", "ORDER") and k + 1 < e and _is_kw(tokens[k + 1], "BY"):
+                marks.append((word + " BY", k, k + 2))
+                k += 1
+        k += 1
+    names = [m[0] for m in marks]
+    if len(set(names)) != len(names) or names != sorted(names, key=_CLAUSE_ORDER.index):
+        return None
+    clauses = {}
+    for n, (name, kw, body) in enumerate(marks):
+        clauses[name] = (kw, body, marks[n + 1][1] if n + 1 < len(marks) else e)
+    return clauses
+
+
+def _split_and(tokens: List[Token], b: int, e: int) -> List[Tuple[int, int]]:
+    """按顶层AND拆分条件；顶层出现OR/XOR时整体作为一个条件"""
+    parts = []
+    depth = case_depth = 0
+    start = b
+    between = False
+    for k in range(b, e):
+        tok = tokens[k]
+        if tok.kind == "lparen":
+            depth += 1
+        elif tok.kind == "rparen":
+            depth -= 1
+        elif depth:
+            continue
+        elif _is_kw(tok, "CASE"):
+            case_depth += 1
+        elif _is_kw(tok, "END"):
+            case_depth -= 1
+        elif case_depth:
+            continue
+        elif _is_kw(tok, "OR", "XOR") or tok.text == "||":
+            return [(b, e)]
+        elif _is_kw(tok, "BETWEEN"):
+            between = True
+        elif _is_kw(tok, "AND") or tok.text == "&&":
+            if between:
+                between = False
+                continue
+            parts.append((start, k))
+            start = k + 1
+    parts.append((start, e))
+    return parts
+
+
+def column_ref_end(tokens: List[Token], b: int, e: int) -> Optional[int]:
+    """b处是 [库.][表.]列 形式的列引用时返回其后的位置"""
+    if b >= e or not is_name(tokens[b]):
+        return None
+    k = b + 1
+    # 点号之后的单词即使是关键字也是名称，例如 s.year
+    while k + 1 < e and k - b < 5 and tokens[k].kind == "dot" and tokens[k + 1].kind in ("word", "ident"):
+        k += 2
+    return k
+
+
+def table_refs(tokens: List[Token], b: int, e: int, top_only: bool = False) -> Tuple[Dict[str, Optional[str]], set]:
+    """收集范围内FROM/JOIN引入的表：{别名或表名: 表名（派生表为None）}，以及表名/别名所在的位置。
+    top_only时不收集派生表和子查询内部的表"""
+    refs = {}
+    consumed = set()
+    clause = [None]
+    # 每层括号是否只是表列表的分组，用于判断是否还在当前查询层
+    grouping = [True]
+    skip = b
+    for k in range(b, e):
+        if k < skip:
+            continue
+        tok = tokens[k]
+        hint = index_hint_end(tokens, k, e)
+        if hint is not None:
+            skip = hint
+            continue
+        starts_factor = False
+        if tok.kind == "lparen":
+            after_from = k > b and (_is_kw(tokens[k - 1], "FROM", "JOIN")
+                                    or tokens[k - 1].kind == "comma" and clause[-1] == "FROM")
+            nested_list = after_from and k + 1 < e and not _is_kw(tokens[k + 1], "SELECT")
+            clause.append("FROM" if nested_list else None)
+            grouping.append(nested_list)
+            starts_factor = nested_list
+        elif tok.kind == "rparen":
+            if len(clause) > 1:
+                clause.pop()
+                grouping.pop()
+        elif tok.kind == "word" and tok.text.upper() in _CLAUSE_WORDS:
+            clause[-1] = tok.text.upper()
+        if not (starts_factor or _is_kw(tok, "FROM", "JOIN") or tok.kind == "comma" and clause[-1] == "FROM"):
+            continue
+        if top_only and not all(grouping):
+            continue
+        m = k + 1
+        if m >= e:
+            continue
+        name = None
+        if tokens[m].kind == "lparen":
+            close = match_paren(tokens, m)
+            if close < 0 or close >= e or not _is_kw(tokens[m + 1], "SELECT"):
+                continue
+            m = close + 1
+        elif is_name(tokens[m]):
+            end = column_ref_end(tokens, m, e)
+            consumed.update(range(m, end))
+            name = unquote(tokens[end - 1]).lower()
+            m = end
+        else:
+            continue
+        if m < e and _is_kw(tokens[m], "AS"):
+            m += 1
+        alias = None
+        if m < e and is_name(tokens[m]):
+            alias = unquote(tokens[m]).lower()
+            consumed.add(m)
+        if alias or name:
+            refs[alias or name] = name
+    return refs, consumed
+
+
+def _schema_columns(schema: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, bool]]:
+    """表结构转换为 {表: {列: 是否可为NULL}}；兼容 /schema 返回的两种格式"""
+    if not schema:
+        return {}
+    tables = schema.get("tables", schema) if isinstance(schema.get("tables"), dict) else schema
+    columns = {}
+    for table, cols in tables.items():
+        if not isinstance(cols, list):
+            continue
+        columns[table.lower()] = {
+            str(col.get("name") or col.get("Field")).lower():
+                str(col.get("null") or col.get("Null") or "YES").upper() != "NO"
+            for col in cols if isinstance(col, dict)
+        }
+    return columns
+
+
+def _nullable(names: List[str], refs: Dict[str, Optional[str]], columns: Dict[str, Dict[str, bool]]) -> bool:
+    """列引用是否可能为NULL；无法从表结构确定时按可为NULL处理"""
+    column = names[-1].lower()
+    if len(names) >= 2:
+        table = refs.get(names[-2].lower())
+        if table is None or table not in columns or column not in columns[table]:
+            return True
+        return columns[table][column]
+    candidates = []
+    for table in refs.values():
+        if table is None or table not in columns:
+            return True
+        if column in columns[table]:
+            candidates.append(columns[table][column])
+    return candidates[0] if len(candidates) == 1 else True
+
+
+def _is_correlated(tokens: List[Token], b: int, e: int, columns: Dict[str, Dict[str, bool]]) -> bool:
+    """子查询是否可能引用外层的表（无法确定时按相关处理）"""
+    refs, consumed = table_refs(tokens, b, e)
+    output_names = {unquote(tokens[k + 1]).lower() for k in range(b, e - 1)
+                    if _is_kw(tokens[k], "AS") and is_name(tokens[k + 1])}
+    for k in range(b, e):
+        tok = tokens[k]
+        if k in consumed or not is_name(tok):
+            continue
+        if k + 1 < e and tokens[k + 1].kind == "dot":
+            if k + 3 < e and tokens[k + 2].kind != "dot" and tokens[k + 3].kind == "dot":
+                continue
+            if not (k > b and tokens[k - 1].kind == "dot") and unquote(tok).lower() not in refs:
+                return True
+            continue
+        if k > b and (tokens[k - 1].kind == "dot" or _is_kw(tokens[k - 1], "AS")):
+            continue
+        if k + 1 < e and tokens[k + 1].kind == "lparen":
+            continue
+        name = unquote(tok).lower()
+        if name in output_names or name in refs:
+            continue
+        if not columns or not any(t in columns and name in columns[t] for t in refs.values()):
+            return True
+    return False
+
+
+def strip_alias(tokens: List[Token], b: int, e: int) -> int:
+    """去掉选择项末尾的别名，返回表达式终点"""
+    if e - b >= 3 and _is_kw(tokens[e - 2], "AS"):
+        return e - 2
+    if e - b >= 2 and is_name(tokens[e - 1]) and tokens[e - 2].kind in ("ident", "rparen", "num", "str", "word") \
+            and (tokens[e - 2].kind != "word" or is_name(tokens[e - 2])):
+        return e - 1
+    return e
+
+
+def _free_alias(sql: str) -> str:
+    lowered = sql.lower()
+    n = 1
+    while f"_rw{n}" in lowered:
+        n += 1
+    return f"_rw{n}"
+
+
+def _rewrite_once(sql: str, columns: Dict[str, Dict[str, bool]]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    tokens = tokenize(sql)
+    end = len(tokens)
+    while end and tokens[end - 1].text == ";":
+        end -= 1
+    outer = split_select(tokens, 0, end)
+    if not outer or "FROM" not in outer or "WHERE" not in outer:
+        return None
+    # 外层 SELECT * 会把派生表的列也带出来
+    select_kw, select_b, select_e = outer["SELECT"]
+    depth = 0
+    for k in range(select_b, select_e):
+        depth += tokens[k].kind == "lparen"
+        depth -= tokens[k].kind == "rparen"
+        if depth == 0 and tokens[k].text == "*" and tokens[k - 1].kind != "dot":
+            return None
+    _, from_b, from_e = outer["FROM"]
+    where_kw, where_b, where_e = outer["WHERE"]
+    outer_refs, _ = table_refs(tokens, outer["FROM"][0], from_e, top_only=True)
+    # 之前改写加入的派生表只有KEY_COLUMN一列，不影响外层列的解析
+    outer_refs = {name: table for name, table in outer_refs.items() if not re.fullmatch(r"_rw\d+", name)}
+    conjuncts = _split_and(tokens, where_b, where_e)
+
+    for index, (a, z) in enumerate(conjuncts):
+        ref_end = column_ref_end(tokens, a, z)
+        if ref_end is None:
+            continue
+        k = ref_end
+        negated = k < z and _is_kw(tokens[k], "NOT")
+        k += negated
+        if not (k + 1 < z and _is_kw(tokens[k], "IN") and tokens[k + 1].kind == "lparen"):
+            continue
+        sub_b, sub_e = k + 2, match_paren(tokens, k + 1)
+        if sub_e != z - 1:
+            continue
+        sub = split_select(tokens, sub_b, sub_e)
+        if not sub or "FROM" not in sub or "ORDER BY" in sub or "LIMIT" in sub:
+            continue
+        _, item_b, item_e = sub["SELECT"]
+        distinct = _is_kw(tokens[item_b], "DISTINCT")
+        item_b += distinct
+        if item_b >= item_e or any(t.kind == "comma" and _depth_zero(tokens, item_b, i)
+                                   for i, t in enumerate(tokens[item_b:item_e], item_b)):
+            continue
+        item_e = strip_alias(tokens, item_b, item_e)
+        if tokens[item_b].text == "*" or "GROUP BY" not in sub and not (negated and distinct):
+            continue
+        if _is_correlated(tokens, sub_b, sub_e, columns):
+            continue
+
+        expr = _text(sql, tokens, a, ref_end)
+        item = _text(sql, tokens, item_b, item_e)
+        group = sub.get("GROUP BY")
+        # 按选择列本身分组时结果已唯一，不需要DISTINCT
+        unique = group is not None and _text(sql, tokens, group[1], group[2]) == item
+        alias = _free_alias(sql)
+        derived = (f"SELECT {'' if unique else 'DISTINCT '}{item} AS {KEY_COLUMN} "
+                   f"{sql[tokens[sub['FROM'][0]].start:tokens[sub_e - 1].end]}")
+        from_text = _text(sql, tokens, from_b, from_e)
+        if any(t.kind == "comma" and _depth_zero(tokens, from_b, i)
+               for i, t in enumerate(tokens[from_b:from_e], from_b)):
+            from_text = f"({from_text})"
+        on = f"{expr} = {alias}.{KEY_COLUMN}"
+        remaining = [_text(sql, tokens, b, e) for n, (b, e) in enumerate(conjuncts) if n != index]
+        guards = 0
+        if negated:
+            rule = "not_in_to_anti_join"
+            new_from = f"{from_text} LEFT JOIN ({derived}) AS {alias} ON {on}"
+            replacement = [f"{alias}.{KEY_COLUMN} IS NULL"]
+            ref_names = [unquote(t) for t in tokens[a:ref_end] if t.kind != "dot"]
+            sub_refs, _ = table_refs(tokens, sub["FROM"][0], sub_e, top_only=True)
+            item_end = column_ref_end(tokens, item_b, item_e)
+            item_nullable = item_end != item_e or _nullable(
+                [unquote(t) for t in tokens[item_b:item_e] if t.kind != "dot"], sub_refs, columns)
+            if _nullable(ref_names, outer_refs, columns):
+                replacement.append(f"({expr} IS NOT NULL OR NOT EXISTS (SELECT 1 FROM ({derived}) AS {alias}e))")
+            if item_nullable:
+                replacement.append(f"NOT EXISTS (SELECT 1 FROM ({derived}) AS {alias}n "
+                                   f"WHERE {alias}n.{KEY_COLUMN} IS NULL)")
+            guards = len(replacement) - 1
+            remaining.insert(index, " AND ".join(replacement))
+        else:
+            rule = "in_subquery_to_join"
+            new_from = f"{from_text} JOIN ({derived}) AS {alias} ON {on}"
+        new_where = " AND ".join(remaining)
+        tail = tokens[where_e].start if where_e < end else tokens[end - 1].end
+        replaced = new_from + (f" WHERE {new_where}" if new_where else "") + (" " if where_e < end else "")
+        rewritten = sql[:tokens[from_b].start] + replaced + sql[tail:]
+        return rewritten, {"rule": rule, "alias": alias, "original": _text(sql, tokens, a, z),
+                           "null_guards": guards}
+    return None
+
+
+def _depth_zero(tokens: List[Token], b: int, i: int) -> bool:
+    depth = 0
+    for tok in tokens[b:i]:
+        depth += tok.kind == "lparen"
+        depth -= tok.kind == "rparen"
+    return depth == 0
+
+
+def rewrite_sql(sql: str, schema: Dict[str, Any] = None, log: bool = True) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    改写已知的慢写法，返回 (改写后的SQL, 应用的改写列表)；没有可改写的部分时原样返回。
+    schema 为 /schema 返回的表结构，用于判断列是否可为NULL以及子查询是否相关。
+    """
+    columns = _schema_columns(schema)
+    applied = []
+    current = sql
+    try:
+        while len(applied) < MAX_REWRITES:
+            result = _rewrite_once(current, columns)
+            if result is None:
+                break
+            current, info = result
+            applied.append(info)
+    except Exception as e:
+        # 改写只是优化，解析失败时按原SQL执行
+        logger.warning(f"SQL rewrite skipped: {e}")
+        return sql, []
+    if applied and log:
+        log_rewrites(sql, current, applied)
+    return current, applied
+
+
+def log_rewrites(original: str, rewritten: str, applied: List[Dict[str, Any]]):
+    rules = ", ".join(info["rule"] for info in applied)
+    logger.info(f"Rewrote SQL ({rules}): {original} -> {rewritten}")
+    with open(REWRITE_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - REWRITE [{rules}]: "
+                f"{' '.join(original.split())} => {' '.join(rewritten.split())}\n")
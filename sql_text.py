@@ -0,0 +1,101 @@
+"""
+SQL文本规范化：去掉注释、合并空白、去掉结尾分号，字符串和反引号标识符内的内容保持不变。
+
+规范化后的文本用于判断两条SQL是否相同（合并并发查询、缓存键等），
+不改变关键字和标识符大小写，因此不会把语义不同的查询当成同一条。
+fingerprint_sql 进一步把字面量替换为 ?，用于把只有参数不同的查询归为一类（日志统计、索引建议等），
+literal_values 按顺序返回被替换掉的字面量，指纹相同时用它区分参数不同的查询。
+paginate_sql 为SQL追加分页（服务端分页接口和GUI一次取回有限行数时共用）。
+"""
+import hashlib
+import re
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|(`(?:[^`]|``)*`)|(?<![\w$@.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    out = []
+    i = 0
+    n = len(sql)
+    pending_space = False
+    while i < n:
+        ch = sql[i]
+        # 字符串和带引号的标识符原样保留
+        if ch in ("'", '"', "`"):
+            j = i + 1
+            while j < n:
+                if sql[j] == "\\" and ch != "`":
+                    j += 2
+                    continue
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            if pending_space and out:
+                out.append(" ")
+            pending_space = False
+            out.append(sql[i:j + 1])
+            i = j + 1
+            continue
+        if ch == "-" and sql.startswith("--", i) or ch == "#":
+            end = sql.find("\n", i)
+            i = n if end == -1 else end
+            pending_space = True
+            continue
+        if ch == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+            continue
+        if ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(ch)
+        i += 1
+    return "".join(out).rstrip(" ;")
+
+
+def sql_digest(sql: str) -> str:
+    """规范化SQL的短摘要，适合作为字典键或日志标识"""
+    return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint_sql(sql: str) -> str:
+    """规范化SQL并把字符串、数字字面量替换为 ?，IN列表合并为 (?)"""
+    text = _LITERAL_RE.sub(lambda m: m.group(1) or "?", normalize_sql(sql))
+    return _IN_LIST_RE.sub("(?)", text)
+
+
+def literal_values(sql: str) -> list:
+    """规范化SQL中的字符串和数字字面量原文（按出现顺序，与 fingerprint_sql 替换的位置一一对应）"""
+    return [m.group(0) for m in _LITERAL_RE.finditer(normalize_sql(sql)) if not m.group(1)]
+
+
+def has_top_level_limit(sql: str) -> bool:
+    """判断SQL最外层是否已经带有LIMIT（忽略字符串和括号内的子查询）"""
+    text = re.sub(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`", "''", sql)
+    depth = 0
+    for m in re.finditer(r"\(|\)|\blimit\b", text, re.IGNORECASE):
+        token = m.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            return True
+    return False
+
+
+def paginate_sql(sql: str, offset: int, limit: int) -> str:
+    """为SQL追加分页；已有LIMIT的查询包成派生表后再分页"""
+    body = sql.strip().rstrip(";").strip()
+    if has_top_level_limit(body):
+        return f"SELECT * FROM ({body}) AS _page LIMIT {int(offset)}, {int(limit)}"
+    return f"{body} LIMIT {int(offset)}, {int(limit)}"
@@ -0,0 +1,284 @@
+"""
+执行前的SQL校验：按缓存的表结构解析SQL中的表、别名和列，不访问数据库。
+
+返回结构化错误列表，每项为
+    {"type": "unknown_table" | "unknown_alias" | "unknown_column" | "ambiguous_column",
+     "name": 出错的引用, "table": 相关的表（可为None）, "suggestions": [相近的名称], "message": 说明}
+子查询按作用域解析，可以引用外层查询的表；UNION的各部分分别解析。
+派生表的列、与关键字同名的列、无法识别的结构一律放行：宁可漏报也不误报，最终以数据库的报错为准。
+"""
+import difflib
+from typing import Any, Dict, List, Optional, Set
+
+from sql_rewrite import (column_ref_end, index_hint_end, is_name, match_paren, split_select, strip_alias, table_refs,
+                         tokenize, unquote, Token)
+
+_INDEX_CACHE_SIZE = 8
+_index_cache = {}
+
+
+def build_index(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """表结构转换为按小写名称查找的索引；兼容 /schema 返回的两种格式"""
+    tables = schema.get("tables") if isinstance(schema.get("tables"), dict) else schema
+    index = {"tables": {}, "columns": {}}
+    for table, columns in tables.items():
+        if not isinstance(columns, list):
+            continue
+        index["tables"][table.lower()] = table
+        index["columns"][table.lower()] = {
+            str(col.get("name") or col.get("Field")).lower(): str(col.get("name") or col.get("Field"))
+            for col in columns if isinstance(col, dict)
+        }
+    return index
+
+
+def _index_for(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """同一个表结构对象只建一次索引（缓存中保留对象本身，避免id被复用）"""
+    cached = _index_cache.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    index = build_index(schema)
+    if len(_index_cache) >= _INDEX_CACHE_SIZE:
+        _index_cache.pop(next(iter(_index_cache)))
+    _index_cache[id(schema)] = (schema, index)
+    return index
+
+
+def _suggest(name: str, candidates: List[str]) -> List[str]:
+    lowered = {c.lower(): c for c in candidates}
+    return [lowered[m] for m in difflib.get_close_matches(name.lower(), list(lowered), n=3, cutoff=0.6)]
+
+
+def _error(kind: str, name: str, table: Optional[str], suggestions: List[str], message: str) -> Dict[str, Any]:
+    return {"type": kind, "name": name, "table": table, "suggestions": suggestions, "message": message}
+
+
+def _is_kw(tok: Token, *words: str) -> bool:
+    return tok.kind == "word" and tok.text.upper() in words
+
+
+def _not_a_column(tokens: List[Token], k: int) -> bool:
+    """不是列引用的名称：字符集和排序规则名、字符串前缀、TRIM和全文检索的修饰词、SOUNDS LIKE"""
+    prev = tokens[k - 1] if k > 0 else None
+    word = tokens[k].text.upper()
+    nxt = tokens[k + 1] if k + 1 < len(tokens) else None
+    # N'x'、_utf8mb4'x'、X'0A'、B'01'：字符串的字符集或进制前缀
+    if nxt is not None and nxt.kind == "str" and tokens[k].kind == "word" \
+            and (word.startswith("_") or word in ("N", "X", "B") and nxt.start == tokens[k].end):
+        return True
+    if word == "SOUNDS" and nxt is not None and _is_kw(nxt, "LIKE"):
+        return True
+    if prev is None:
+        return False
+    # x COLLATE utf8mb4_bin、CONVERT(x USING gbk)、CHARSET/CHARACTER SET utf8mb4
+    if _is_kw(prev, "COLLATE", "CHARSET") or prev.kind == "word" and prev.text.upper() == "SET" \
+            and k > 1 and _is_kw(tokens[k - 2], "CHARACTER"):
+        return True
+    if _is_kw(prev, "USING") and not (k + 1 < len(tokens) and tokens[k + 1].kind == "lparen") \
+            and tokens[k].kind == "word":
+        return True
+    if word == "CHARACTER" and k + 1 < len(tokens) and tokens[k + 1].text.upper() == "SET":
+        return True
+    if word == "SET" and _is_kw(prev, "CHARACTER"):
+        return True
+    # TRIM(BOTH|LEADING|TRAILING ... FROM x)
+    if word in ("BOTH", "LEADING", "TRAILING") and prev.kind == "lparen" and k > 1 \
+            and _is_kw(tokens[k - 2], "TRIM"):
+        return True
+    # AGAINST(... IN BOOLEAN MODE / IN NATURAL LANGUAGE MODE / WITH QUERY EXPANSION)
+    return (word == "BOOLEAN" and _is_kw(prev, "IN") or word == "LANGUAGE" and _is_kw(prev, "NATURAL")
+            or word == "QUERY" and _is_kw(prev, "WITH") or word == "EXPANSION" and _is_kw(prev, "QUERY"))
+
+
+def _union_parts(tokens: List[Token], b: int, e: int) -> List[tuple]:
+    parts = []
+    depth = 0
+    start = b
+    for k in range(b, e):
+        if tokens[k].kind == "lparen":
+            depth += 1
+        elif tokens[k].kind == "rparen":
+            depth -= 1
+        elif depth == 0 and _is_kw(tokens[k], "UNION", "INTERSECT", "EXCEPT"):
+            parts.append((start, k))
+            start = k + 2 if k + 1 < e and _is_kw(tokens[k + 1], "ALL", "DISTINCT") else k + 1
+    parts.append((start, e))
+    return parts
+
+
+def _select_items(tokens: List[Token], b: int, e: int) -> List[tuple]:
+    items = []
+    depth = 0
+    start = b
+    for k in range(b, e):
+        if tokens[k].kind == "lparen":
+            depth += 1
+        elif tokens[k].kind == "rparen":
+            depth -= 1
+        elif depth == 0 and tokens[k].kind == "comma":
+            items.append((start, k))
+            start = k + 1
+    items.append((start, e))
+    return items
+
+
+class _Validator:
+    def __init__(self, tokens: List[Token], index: Dict[str, Any]):
+        self.tokens = tokens
+        self.index = index
+        self.errors = []
+
+    def statement(self, b: int, e: int, scopes: List[Dict[str, Any]]):
+        tokens = self.tokens
+        parts = []
+        for part_b, part_e in _union_parts(tokens, b, e):
+            while part_b < part_e and tokens[part_b].kind == "lparen" and match_paren(tokens, part_b) == part_e - 1:
+                part_b, part_e = part_b + 1, part_e - 1
+            parts.append((part_b, part_e))
+        # UNION末尾的ORDER BY引用的是第一部分的输出列名
+        shared_outputs = None
+        for part_b, part_e in parts:
+            outputs = self.select(part_b, part_e, scopes, shared_outputs if len(parts) > 1 else None)
+            if shared_outputs is None:
+                shared_outputs = outputs
+
+    def select(self, b: int, e: int, scopes: List[Dict[str, Any]], extra_outputs: Optional[Set[str]]) -> Set[str]:
+        tokens = self.tokens
+        clauses = split_select(tokens, b, e)
+        if clauses is None:
+            return set()
+        refs, consumed = {}, set()
+        using = False
+        if "FROM" in clauses:
+            from_kw, _, from_e = clauses["FROM"]
+            refs, consumed = table_refs(tokens, from_kw, from_e, top_only=True)
+            using = any(_is_kw(tokens[k], "USING", "NATURAL") for k in range(from_kw, from_e))
+            for alias, table in refs.items():
+                if table is not None and table not in self.index["columns"]:
+                    self.errors.append(_error("unknown_table", table, None,
+                                              _suggest(table, list(self.index["tables"].values())),
+                                              f"Unknown table '{table}'"))
+
+        # 选择项别名可以在GROUP BY/HAVING/ORDER BY中引用；输出列名只提供给UNION的后续部分
+        outputs = set(extra_outputs or ())
+        column_names = set()
+        alias_positions = set()
+        _, select_b, select_e = clauses["SELECT"]
+        for item_b, item_e in _select_items(tokens, select_b, select_e):
+            if item_b >= item_e:
+                continue
+            if strip_alias(tokens, item_b, item_e) < item_e:
+                outputs.add(unquote(tokens[item_e - 1]).lower())
+                alias_positions.add(item_e - 1)
+            elif column_ref_end(tokens, item_b, item_e) == item_e:
+                column_names.add(unquote(tokens[item_e - 1]).lower())
+
+        scope = {"refs": refs, "using": using, "outputs": outputs,
+                 "loose": any(t is None or t not in self.index["columns"] for t in refs.values())}
+        chain = [scope] + scopes
+        k = b
+        while k < e:
+            tok = tokens[k]
+            # USE INDEX (PRIMARY) 等索引提示中是索引名
+            hint = index_hint_end(tokens, k, e)
+            if hint is not None:
+                k = hint
+                continue
+            if tok.kind == "lparen":
+                close = match_paren(tokens, k)
+                inner = k + 1
+                while inner < close and tokens[inner].kind == "lparen":
+                    inner += 1
+                if close > k and inner < close and _is_kw(tokens[inner], "SELECT"):
+                    self.statement(k + 1, close, chain)
+                    k = close + 1
+                    continue
+                k += 1
+                continue
+            if (k in consumed or k in alias_positions or not is_name(tok) or tok.text.startswith("@")
+                    or k > b and (tokens[k - 1].kind == "dot" or _is_kw(tokens[k - 1], "AS"))
+                    or _not_a_column(tokens, k)):
+                k += 1
+                continue
+            end = column_ref_end(tokens, k, e)
+            if end < e and tokens[end].kind == "lparen":
+                k = end
+                continue
+            if end + 1 < e and tokens[end].kind == "dot" and tokens[end + 1].text == "*":
+                self.qualifier(unquote(tokens[end - 1]), unquote(tokens[end - 1]) + ".*", chain)
+                k = end + 2
+                continue
+            self.column([unquote(t) for t in tokens[k:end] if t.kind != "dot"], chain)
+            k = end
+        return outputs | column_names
+
+    def qualifier(self, name: str, ref: str, chain: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """找到别名所在的作用域；找不到时记录错误"""
+        for scope in chain:
+            if name.lower() in scope["refs"]:
+                return scope
+        known = [alias for scope in chain for alias in scope["refs"]]
+        self.errors.append(_error("unknown_alias", ref, None, _suggest(name, known),
+                                  f"Unknown table or alias '{name}' in '{ref}'"))
+        return None
+
+    def column(self, names: List[str], chain: List[Dict[str, Any]]):
+        columns = self.index["columns"]
+        column = names[-1].lower()
+        ref = ".".join(names)
+        if len(names) > 2:
+            return
+        if len(names) == 2:
+            scope = self.qualifier(names[0], ref, chain)
+            table = scope["refs"][names[0].lower()] if scope else None
+            if table in columns and column not in columns[table]:
+                self.errors.append(_error(
+                    "unknown_column", ref, self.index["tables"][table],
+                    [f"{names[0]}.{c}" for c in _suggest(column, list(columns[table].values()))],
+                    f"Unknown column '{ref}' in table '{self.index['tables'][table]}'"))
+            return
+
+        if not chain or column in chain[0]["outputs"]:
+            return
+        for scope in chain:
+            matches = [(alias, t) for alias, t in scope["refs"].items() if t in columns and column in columns[t]]
+            if len(matches) > 1 and not scope["using"]:
+                self.errors.append(_error(
+                    "ambiguous_column", ref, None, [f"{alias}.{names[0]}" for alias, _ in matches],
+                    f"Column '{ref}' is ambiguous (in tables {', '.join(self.index['tables'][t] for _, t in matches)})"))
+                return
+            if matches or scope["loose"]:
+                return
+        tables = [t for t in chain[0]["refs"].values() if t in columns]
+        if not tables:
+            return
+        suggestions = _suggest(column, [c for t in tables for c in columns[t].values()])
+        if not suggestions:
+            suggestions = [f"{self.index['tables'][t]}.{c}" for t in columns for c in columns[t].values()
+                           if c.lower() == column][:3]
+        table = self.index["tables"][tables[0]] if len(tables) == 1 else None
+        self.errors.append(_error("unknown_column", ref, table, suggestions,
+                                  f"Unknown column '{ref}'" + (f" in table '{table}'" if table else "")))
+
+
+def validate_sql(sql: str, schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """校验SQL中的表、别名和列，返回错误列表（为空表示通过）；没有表结构时不做校验"""
+    if not schema:
+        return []
+    tokens = tokenize(sql)
+    end = len(tokens)
+    while end and tokens[end - 1].text == ";":
+        end -= 1
+    validator = _Validator(tokens, _index_for(schema))
+    validator.statement(0, end, [])
+    unique = []
+    for error in validator.errors:
+        if error not in unique:
+            unique.append(error)
+    return unique
+
+
+def format_errors(errors: List[Dict[str, Any]]) -> str:
+    """错误列表转换为一行说明，带上相近名称的建议"""
+    return "; ".join(error["message"] + (f" (did you mean: {', '.join(error['suggestions'])})"
+                                         if error["suggestions"] else "") for error in errors)
@@ -0,0 +1,401 @@
+"""
+本地替身数据库：用sqlite3实现MySQLdb连接/游标的常用接口，
+用于在没有MySQL服务器的环境下跑基准测试和功能验证。
+
+支持main.py用到的语句：SHOW TABLES、SHOW REPLICA/SLAVE STATUS（按独立实例返回空结果）、DESCRIBE、EXPLAIN、SET ...
+（SET @变量 = %s 会保存变量值）、PREPARE/EXECUTE ... USING/DEALLOCATE PREPARE（按连接保存语句）、
+START TRANSACTION/COMMIT/ROLLBACK、KILL QUERY <thread_id>，其余SELECT直接交给sqlite执行。
+数据来自 fixtures/<db>.sql，首次连接时加载到临时sqlite文件中，进程内共享。
+"""
+import itertools
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class Error(Exception):
+    pass
+
+
+class OperationalError(Error):
+    pass
+
+
+class ProgrammingError(Error):
+    pass
+
+
+_db_files: Dict[str, str] = {}
+_db_lock = threading.Lock()
+_connections: Dict[int, "Connection"] = {}
+_connections_lock = threading.Lock()
+_thread_ids = itertools.count(1)
+
+
+def prepare_database(db: str) -> str:
+    """把fixture SQL加载为sqlite文件，同一进程内每个库只加载一次"""
+    if db.endswith((".db", ".sqlite", ".sqlite3")) and os.path.exists(db):
+        return db
+    with _db_lock:
+        if db in _db_files:
+            return _db_files[db]
+        sql_path = db if db.endswith(".sql") else os.path.join(FIXTURE_DIR, f"{db}.sql")
+        if not os.path.exists(sql_path):
+            raise OperationalError(1049, f"Unknown database '{db}'")
+        name = os.path.splitext(os.path.basename(sql_path))[0]
+        fd, path = tempfile.mkstemp(prefix=f"standin_{name}_", suffix=".db")
+        os.close(fd)
+        conn = sqlite3.connect(path)
+        try:
+            with open(sql_path, "r", encoding="utf-8") as f:
+                conn.executescript(f.read())
+            conn.commit()
+        finally:
+            conn.close()
+        _db_files[db] = path
+        return path
+
+
+def connect(db: str = "college", **kwargs) -> "Connection":
+    """与MySQLdb.connect参数兼容，host/user/passwd/port等参数被忽略"""
+    db = kwargs.pop("database", None) or db
+    return Connection(prepare_database(db), os.path.splitext(os.path.basename(db))[0])
+
+
+def _translate_error(e: sqlite3.Error) -> Error:
+    """把sqlite错误转换成MySQL风格的(错误码, 消息)"""
+    message = str(e)
+    if message == "interrupted":
+        return OperationalError(1317, "Query execution was interrupted")
+    m = re.match(r"no such column: (\S+)", message)
+    if m:
+        return OperationalError(1054, f"Unknown column '{m.group(1)}' in 'field list'")
+    m = re.match(r"no such table: (\S+)", message)
+    if m:
+        return ProgrammingError(1146, f"Table '{m.group(1)}' doesn't exist")
+    if "syntax error" in message:
+        return ProgrammingError(1064, f"You have an error in your SQL syntax: {message}")
+    return OperationalError(1105, message)
+
+
+def _concat(*args):
+    if any(arg is None for arg in args):
+        return None
+    return "".join(str(arg) for arg in args)
+
+
+def _crc32(value):
+    if value is None:
+        return None
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+def _if(condition, a, b):
+    return a if condition else b
+
+
+class Connection:
+    def __init__(self, path: str, db_name: str):
+        self.db_name = db_name
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._thread_id = next(_thread_ids)
+        self.open = True
+        self.variables: Dict[str, Any] = {}
+        self.prepared: Dict[str, str] = {}
+        self._conn.create_function("CONNECTION_ID", 0, lambda: self._thread_id)
+        self._conn.create_function("CONCAT", -1, _concat)
+        self._conn.create_function("CRC32", 1, _crc32)
+        self._conn.create_function("IF", 3, _if)
+        self._conn.create_function("RAND", 0, random.random)
+        self._conn.create_function("NOW", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        with _connections_lock:
+            _connections[self._thread_id] = self
+
+    def thread_id(self) -> int:
+        return self._thread_id
+
+    def cursor(self, cursorclass=None) -> "Cursor":
+        if not self.open:
+            raise OperationalError(2006, "MySQL server has gone away")
+        # DictCursor/SSDictCursor返回字典行，Cursor/SSCursor返回元组行
+        as_dict = cursorclass is None or "Dict" in getattr(cursorclass, "__name__", "")
+        return Cursor(self, as_dict)
+
+    def begin(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def ping(self, reconnect: bool = False):
+        if not self.open:
+            raise OperationalError(2006, "MySQL server has gone away")
+
+    def interrupt(self):
+        self._conn.interrupt()
+
+    def close(self):
+        if not self.open:
+            return
+        self.open = False
+        with _connections_lock:
+            _connections.pop(self._thread_id, None)
+        self._conn.close()
+
+
+class Cursor:
+    def __init__(self, connection: Connection, as_dict: bool = True):
+        self.connection = connection
+        self.as_dict = as_dict
+        self.description = None
+        self.rowcount = -1
+        self._rows: List[Dict[str, Any]] = []
+        self._sqlite_cursor = None
+        self._columns: List[str] = []
+
+    def _set_rows(self, rows: List[Dict[str, Any]]):
+        self._sqlite_cursor = None
+        keys = list(rows[0].keys()) if rows else []
+        self._rows = rows if self.as_dict else [tuple(row.values()) for row in rows]
+        self.rowcount = len(rows)
+        self.description = [(k, None, None, None, None, None, None) for k in keys] or None
+
+    def execute(self, query: str, args=None) -> int:
+        statement = query.strip().rstrip(";").strip()
+        upper = statement.upper()
+        try:
+            if upper.startswith("SET @") and args is not None:
+                names = re.findall(r"@(\w+)\s*=\s*%s", statement)
+                self.connection.variables.update(zip((n.lower() for n in names), args))
+                self._set_rows([])
+            elif upper.startswith("SET "):
+                self._set_rows([])
+            elif re.match(r"^PREPARE\s+\w+\s+FROM\s", upper):
+                self._prepare(statement, args)
+            elif re.match(r"^EXECUTE\s+\w+", upper):
+                self._execute_prepared(statement)
+            elif re.match(r"^(DEALLOCATE|DROP)\s+PREPARE\s+\w+$", upper):
+                name = statement.split()[-1].lower()
+                if self.connection.prepared.pop(name, None) is None:
+                    raise OperationalError(1243, f"Unknown prepared statement handler ({name}) given to DEALLOCATE PREPARE")
+                self._set_rows([])
+            elif upper in ("START TRANSACTION", "BEGIN"):
+                self.connection.begin()
+                self._set_rows([])
+            elif upper == "COMMIT":
+                self.connection.commit()
+                self._set_rows([])
+            elif upper == "ROLLBACK":
+                self.connection.rollback()
+                self._set_rows([])
+            elif upper == "SHOW TABLES":
+                self._set_rows(self._show_tables())
+            elif upper in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+                self._set_rows([])
+            elif re.match(r"^(DESCRIBE|DESC)\s+", upper):
+                table = re.sub(r"^(DESCRIBE|DESC)\s+", "", statement, flags=re.IGNORECASE).strip("`\" ")
+                self._set_rows(self._describe(table))
+            elif upper.startswith("EXPLAIN "):
+                self._set_rows(self._explain(statement[len("EXPLAIN "):]))
+            elif re.match(r"^KILL\s+(QUERY\s+)?\d+$", upper):
+                self._kill(int(upper.split()[-1]))
+                self._set_rows([])
+            else:
+                self._run(statement, args)
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        return self.rowcount
+
+    def _run(self, statement: str, args, placeholders: str = "%s"):
+        params = ()
+        if args is not None:
+            # MySQLdb风格的%s占位符转换为sqlite的?
+            if placeholders == "%s":
+                statement = re.sub(r"%s", "?", statement)
+            params = tuple(args)
+        cur = self.connection._conn.execute(statement, params)
+        self._rows = []
+        if cur.description is None:
+            self._sqlite_cursor = None
+            self.description = None
+            self.rowcount = cur.rowcount
+            return
+        self._sqlite_cursor = cur
+        self._columns = [d[0] for d in cur.description]
+        self.description = cur.description
+        self.rowcount = -1
+
+    def _prepare(self, statement: str, args):
+        name = statement.split()[1].lower()
+        if args is not None:
+            text = args[0]
+        else:
+            text = re.sub(r"^PREPARE\s+\w+\s+FROM\s+", "", statement, flags=re.IGNORECASE).strip()[1:-1]
+        # 与MySQL一样在PREPARE时检查语法
+        placeholders = len(re.findall(r"\?", re.sub(r"'(?:[^']|'')*'", "", text)))
+        self.connection._conn.execute(f"EXPLAIN {text.strip().rstrip(';')}", (None,) * placeholders)
+        self.connection.prepared[name] = text.strip().rstrip(";")
+        self._set_rows([])
+
+    def _execute_prepared(self, statement: str):
+        m = re.match(r"^EXECUTE\s+(\w+)(?:\s+USING\s+(.+))?$", statement, re.IGNORECASE | re.S)
+        name = m.group(1).lower()
+        text = self.connection.prepared.get(name)
+        if text is None:
+            raise OperationalError(1243, f"Unknown prepared statement handler ({name}) given to EXECUTE")
+        variables = re.findall(r"@(\w+)", m.group(2) or "")
+        self._run(text, tuple(self.connection.variables.get(v.lower()) for v in variables), placeholders="?")
+
+    def _show_tables(self) -> List[Dict[str, Any]]:
+        cur = self.connection._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        key = f"Tables_in_{self.connection.db_name}"
+        return [{key: row[0]} for row in cur.fetchall()]
+
+    def _describe(self, table: str) -> List[Dict[str, Any]]:
+        conn = self.connection._conn
+        columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        if not columns:
+            raise ProgrammingError(1146, f"Table '{self.connection.db_name}.{table}' doesn't exist")
+        leading = {}
+        for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            info = conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+            if info and index[3] != "pk":
+                leading.setdefault(info[0][2], "UNI" if index[2] and len(info) == 1 else "MUL")
+        for fk in conn.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+            if fk[3] not in leading and fk[1] == 0:
+                leading[fk[3]] = "MUL"
+        rows = []
+        for _, name, col_type, notnull, default, pk in columns:
+            col_type = col_type.lower().replace("numeric", "decimal").replace(" ", "")
+            rows.append({
+                "Field": name,
+                "Type": col_type,
+                "Null": "NO" if notnull or pk else "YES",
+                "Key": "PRI" if pk else leading.get(name, ""),
+                "Default": default,
+                "Extra": "",
+            })
+        return rows
+
+    def _explain(self, statement: str) -> List[Dict[str, Any]]:
+        """把sqlite的EXPLAIN QUERY PLAN转换为MySQL传统EXPLAIN格式的近似结果"""
+        conn = self.connection._conn
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        aliases = {}
+        for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+`?(\w+)`?\s+(?:AS\s+)?`?(\w+)`?", statement, re.IGNORECASE):
+            if table in tables:
+                aliases[alias] = table
+        counts = {}
+
+        def table_rows(name):
+            table = name if name in tables else aliases.get(name)
+            if not table:
+                return 1
+            if table not in counts:
+                counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            return counts[table]
+
+        select_ids = {0: 1}
+        seen_in_select = {}
+        rows = []
+        next_id = 2
+        for node_id, parent, _, detail in plan:
+            select_id = select_ids.get(parent, 1)
+            if "SUBQUERY" in detail or detail.startswith(("MATERIALIZE", "CO-ROUTINE")):
+                select_ids[node_id] = next_id
+                next_id += 1
+                continue
+            select_ids[node_id] = select_id
+            m = re.match(r"(SCAN|SEARCH) (\S+)(.*)", detail)
+            if not m:
+                continue
+            op, name, rest = m.groups()
+            total = table_rows(name)
+            first = select_id not in seen_in_select
+            seen_in_select[select_id] = True
+            if op == "SCAN":
+                access, key, row_estimate = "ALL", None, total
+                extra = "" if first else "Using join buffer (hash join)"
+            else:
+                key_match = re.search(r"USING (?:COVERING |AUTOMATIC COVERING |AUTOMATIC )?(INDEX (\S+)|INTEGER PRIMARY KEY|PRIMARY KEY)", rest)
+                key = key_match.group(2) if key_match and key_match.group(2) else "PRIMARY"
+                unique = "PRIMARY KEY" in rest and "=" in rest
+                access = "eq_ref" if unique else "ref"
+                row_estimate = 1 if unique else max(1, total // 10)
+                extra = "Using index" if "COVERING" in rest else ""
+            rows.append({
+                "id": select_id,
+                "select_type": "SIMPLE" if select_id == 1 else "SUBQUERY",
+                "table": name,
+                "partitions": None,
+                "type": access,
+                "possible_keys": key,
+                "key": key,
+                "key_len": None,
+                "ref": None,
+                "rows": row_estimate,
+                "filtered": 100.0,
+                "Extra": extra,
+            })
+        return rows
+
+    def _kill(self, thread_id: int):
+        with _connections_lock:
+            target = _connections.get(thread_id)
+        if target is None:
+            raise OperationalError(1094, f"Unknown thread id: {thread_id}")
+        target.interrupt()
+
+    def _row(self, values):
+        return dict(zip(self._columns, values)) if self.as_dict else tuple(values)
+
+    def fetchone(self):
+        if self._sqlite_cursor is not None:
+            try:
+                values = self._sqlite_cursor.fetchone()
+            except sqlite3.Error as e:
+                raise _translate_error(e) from e
+            return self._row(values) if values is not None else None
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size: int = 1000) -> List[Dict[str, Any]]:
+        if self._sqlite_cursor is not None:
+            try:
+                return [self._row(values) for values in self._sqlite_cursor.fetchmany(size)]
+            except sqlite3.Error as e:
+                raise _translate_error(e) from e
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self) -> List[Dict[str, Any]]:
+        if self._sqlite_cursor is not None:
+            try:
+                rows = [self._row(values) for values in self._sqlite_cursor.fetchall()]
+            except sqlite3.Error as e:
+                raise _translate_error(e) from e
+            self._sqlite_cursor = None
+            self.rowcount = len(rows)
+            return rows
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._sqlite_cursor = None
+        self._rows = []
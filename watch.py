@@ -0,0 +1,310 @@
+"""
+持续监视查询：按间隔在服务端重新执行同一查询，只向订阅者推送与上一次结果相比新增、修改、删除的行。
+
+- 共享：相同的 (目标库, 规范化SQL, 间隔, 行键) 只注册一个监视，由一个后台线程执行，所有订阅者共享结果；
+- 行键：注册时指定的key列；未指定时，若结果包含查询中某张表的全部主键列则用主键，
+  否则用结果中出现的GROUP BY列（分组统计的计数变化表现为修改）；
+  都没有或行键在结果中不唯一时以整行作为行键，此时修改表现为删除+新增；
+- 增量：只在结果变化时版本号加一，保留最近 history 个增量，订阅者按版本号取增量，
+  第一次订阅或落后超过保留范围时改为取完整快照；
+- 清理：无人订阅（也没有按版本号拉取）超过 idle_seconds 的监视自动停止并删除。
+"""
+import collections
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sql_rewrite import is_name, split_select, tokenize, unquote
+from sql_text import normalize_sql
+
+logger = logging.getLogger("mysql-mcp-server")
+
+
+class WatchLimit(Exception):
+    pass
+
+
+def detect_key(sql: str, tables: Dict[str, Any], columns: List[str]) -> Optional[List[str]]:
+    """查询中引用的表里，第一个全部主键列都出现在结果列中的表的主键；没有时用结果中的GROUP BY列"""
+    present = {c.lower(): c for c in columns}
+    seen = set()
+    tokens = tokenize(sql.strip().rstrip(";"))
+    for tok in tokens:
+        if not is_name(tok):
+            continue
+        name = unquote(tok)
+        cols = tables.get(name)
+        if name in seen or not isinstance(cols, list):
+            continue
+        seen.add(name)
+        pk = [col["name"] for col in cols if col.get("key") == "PRI"]
+        if pk and all(c.lower() in present for c in pk):
+            return [present[c.lower()] for c in pk]
+    clauses = split_select(tokens, 0, len(tokens))
+    if not clauses or "GROUP BY" not in clauses:
+        return None
+    _, b, e = clauses["GROUP BY"]
+    key = []
+    for item in _split_items(tokens, b, e):
+        # 只接受 列 或 表.列 形式的分组项
+        names = [t for t in item if t.kind != "dot"]
+        if not names or len(item) != 2 * len(names) - 1 or len(names) > 2 or not all(is_name(t) for t in names):
+            return None
+        name = unquote(names[-1]).lower()
+        if name not in present:
+            return None
+        key.append(present[name])
+    return key or None
+
+
+def _split_items(tokens, b: int, e: int) -> List[list]:
+    items = [[]]
+    depth = 0
+    for tok in tokens[b:e]:
+        depth += tok.kind == "lparen"
+        depth -= tok.kind == "rparen"
+        if depth == 0 and tok.kind == "comma":
+            items.append([])
+        else:
+            items[-1].append(tok)
+    return items
+
+
+def _row_identity(row: Dict[str, Any]) -> str:
+    return json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def index_rows(rows: List[Dict[str, Any]], key: Optional[List[str]]) -> Tuple[Dict[tuple, Dict[str, Any]], bool]:
+    """按行键建立 {行键: 行}（保持结果顺序），返回 (索引, 是否按key列)；key不唯一时退回整行作为行键"""
+    if key:
+        index = {}
+        for row in rows:
+            k = tuple(row.get(c) for c in key)
+            if k in index:
+                break
+            index[k] = row
+        else:
+            return index, True
+    # 整行作为行键，重复的行按出现次序区分
+    counts = collections.Counter()
+    index = {}
+    for row in rows:
+        identity = _row_identity(row)
+        index[(identity, counts[identity])] = row
+        counts[identity] += 1
+    return index, False
+
+
+def diff_rows(old: Dict[tuple, Dict[str, Any]], new: Dict[tuple, Dict[str, Any]]) -> Tuple[list, list, list]:
+    """返回 (新增的行, 修改后的行, 被删除的行键)"""
+    inserted = [row for k, row in new.items() if k not in old]
+    updated = [row for k, row in new.items() if k in old and old[k] != row]
+    deleted = [k for k in old if k not in new]
+    return inserted, updated, deleted
+
+
+def apply_delta(rows: List[Dict[str, Any]], delta: Dict[str, Any], key: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """客户端把一个增量应用到本地保存的结果上（key为监视信息中的key，为空时deleted中是整行）"""
+    if key:
+        deleted = {tuple(d.get(c) for c in key) for d in delta["deleted"]}
+        updated = {tuple(r.get(c) for c in key): r for r in delta["updated"]}
+        out = []
+        for row in rows:
+            k = tuple(row.get(c) for c in key)
+            if k not in deleted:
+                out.append(updated.get(k, row))
+    else:
+        remaining = collections.Counter(_row_identity(r) for r in delta["deleted"])
+        out = []
+        for row in rows:
+            identity = _row_identity(row)
+            if remaining[identity]:
+                remaining[identity] -= 1
+            else:
+                out.append(row)
+    return out + list(delta["inserted"])
+
+
+class Watch:
+    def __init__(self, manager: "WatchManager", watch_id: str, sql: str, database: Optional[str], interval: float,
+                 key: Optional[List[str]], max_rows_examined: Optional[int]):
+        self.manager = manager
+        self.id = watch_id
+        self.sql = sql
+        self.database = database
+        self.interval = interval
+        self.requested_key = key
+        self.max_rows_examined = max_rows_examined
+        self.key: Optional[List[str]] = key
+        self.keyed = bool(key)
+        self.version = 0
+        self.rows: Dict[tuple, Dict[str, Any]] = {}
+        self.columns: List[str] = []
+        self.deltas = collections.deque(maxlen=manager.history)
+        self.refreshes = 0
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.refreshed_at: Optional[str] = None
+        self.subscribers = 0
+        self.last_access = time.monotonic()
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"watch-{watch_id}")
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"id": self.id, "sql": self.sql, "database": self.database, "interval": self.interval,
+                    "key": self.key if self.keyed else None, "version": self.version, "row_count": len(self.rows),
+                    "columns": self.columns, "refreshes": self.refreshes, "error": self.error,
+                    "created_at": self.created_at, "refreshed_at": self.refreshed_at,
+                    "subscribers": self.subscribers}
+
+    def touch(self, delta: int = 0):
+        with self._lock:
+            self.subscribers += delta
+            self.last_access = time.monotonic()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return self.subscribers <= 0 and time.monotonic() - self.last_access > self.manager.idle_seconds
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            self.refresh()
+            if self.stopped.wait(self.interval):
+                break
+            if self.idle():
+                logger.info(f"Watch {self.id} has no subscribers, stopping")
+                self.manager.remove(self.id)
+
+    def refresh(self):
+        """执行一次查询并与上一次结果比较，有变化时记录增量"""
+        try:
+            result = self.manager.run(self.sql, self.database, self.max_rows_examined)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if result.get("success") and len(result["results"]) > self.manager.max_rows:
+            result = {"success": False, "error": f"Result has more than {self.manager.max_rows} rows"}
+        if not result.get("success"):
+            with self._lock:
+                self.refreshes += 1
+                self.refreshed_at = now
+                self.error = result.get("error")
+            return
+        rows = result["results"]
+        columns = list(rows[0].keys()) if rows else self.columns
+        key = self.requested_key
+        if key is None and columns:
+            key = detect_key(self.sql, self.manager.schema(self.database), columns)
+        index, keyed = index_rows(rows, key)
+        with self._lock:
+            first = self.version == 0
+            self.refreshes += 1
+            self.refreshed_at = now
+            self.error = None
+            self.columns = columns
+            if first or keyed != self.keyed or keyed and key != self.key:
+                # 第一次执行，或行键方式变化（如主键在结果中不再唯一）：丢弃旧增量，订阅者改取完整快照
+                self.key, self.keyed = key, keyed
+                self.rows = index
+                self.version += 1
+                self.deltas.clear()
+                return
+            inserted, updated, deleted = diff_rows(self.rows, index)
+            if not (inserted or updated or deleted):
+                self.rows = index
+                return
+            deleted = [dict(zip(key, k)) if keyed else self.rows[k] for k in deleted]
+            self.rows = index
+            self.version += 1
+            self.deltas.append({"version": self.version, "refreshed_at": now, "inserted": inserted,
+                                "updated": updated, "deleted": deleted})
+
+    def changes_since(self, since: Optional[int]) -> Dict[str, Any]:
+        """since之后的增量；since为空、落后超过保留范围或行键方式变化时返回完整快照"""
+        with self._lock:
+            head = {"id": self.id, "version": self.version, "key": self.key if self.keyed else None,
+                    "columns": self.columns, "refreshed_at": self.refreshed_at, "error": self.error}
+            if since is not None and since == self.version:
+                return dict(head, deltas=[])
+            if since is not None and 0 < since < self.version and self.deltas \
+                    and self.deltas[0]["version"] <= since + 1:
+                return dict(head, deltas=[d for d in self.deltas if d["version"] > since])
+            return dict(head, snapshot=list(self.rows.values()))
+
+
+class WatchManager:
+    """注册、共享和清理监视；run(sql, database, max_rows_examined) 执行查询，schema(database) 返回表结构"""
+
+    def __init__(self, run: Callable[[str, Optional[str], Optional[int]], Dict[str, Any]],
+                 schema: Callable[[Optional[str]], Dict[str, Any]], max_watches: int = 50,
+                 min_interval: float = 5, idle_seconds: float = 300, max_rows: int = 10000, history: int = 100):
+        self.run = run
+        self.schema = schema
+        self.max_watches = max_watches
+        self.min_interval = min_interval
+        self.idle_seconds = idle_seconds
+        self.max_rows = max_rows
+        self.history = max(history, 1)
+        self._watches: Dict[str, Watch] = {}
+        self._by_key: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._shared = 0
+
+    def register(self, sql: str, database: Optional[str], interval: float, key: Optional[List[str]] = None,
+                 max_rows_examined: Optional[int] = None) -> Tuple[Watch, bool]:
+        """返回 (监视, 是否新建)；相同的查询已在监视时直接共享"""
+        interval = max(float(interval), self.min_interval)
+        share_key = (database, normalize_sql(sql), interval, tuple(key) if key else None, max_rows_examined)
+        with self._lock:
+            watch_id = self._by_key.get(share_key)
+            if watch_id in self._watches:
+                watch = self._watches[watch_id]
+                watch.touch()
+                self._shared += 1
+                return watch, False
+            if len(self._watches) >= self.max_watches:
+                raise WatchLimit(f"Too many watches (limit {self.max_watches})")
+            watch = Watch(self, uuid.uuid4().hex[:12], sql, database, interval, key, max_rows_examined)
+            self._watches[watch.id] = watch
+            self._by_key[share_key] = watch.id
+        watch._thread.start()
+        return watch, True
+
+    def get(self, watch_id: str) -> Optional[Watch]:
+        with self._lock:
+            return self._watches.get(watch_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            watches = list(self._watches.values())
+        return [w.info() for w in watches]
+
+    def remove(self, watch_id: str) -> bool:
+        with self._lock:
+            watch = self._watches.pop(watch_id, None)
+            self._by_key = {k: v for k, v in self._by_key.items() if v != watch_id}
+        if watch is None:
+            return False
+        watch.stopped.set()
+        return True
+
+    def stop(self):
+        with self._lock:
+            watches = list(self._watches.values())
+            self._watches.clear()
+            self._by_key.clear()
+        for watch in watches:
+            watch.stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            watches = list(self._watches.values())
+            shared = self._shared
+        return {"active": len(watches), "subscribers": sum(w.subscribers for w in watches),
+                "shared_registrations": shared}